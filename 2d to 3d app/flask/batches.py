@@ -0,0 +1,334 @@
+import os
+import json
+import shutil
+import time
+import uuid
+import queue
+import hashlib
+import zlib
+import zipfile
+import threading
+
+import config
+from file_locks import write_atomic
+from workspace import is_valid_job_id
+
+# Files picked up from zip archives and directories
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Batch:
+    """Many images reconstructed as one unit, with its progress kept on disk.
+
+    items.json lists the unique inputs (identical files are one item with
+    several names) and is written once. Every status change is appended to
+    progress.jsonl, so saving stays cheap for thousands of items and a
+    restart replays the log instead of redoing finished work. manifest.json
+    is written once every item is done or failed. Images found later in the
+    batch's directory are added with add_items(), which rewrites items.json.
+    """
+
+    def __init__(self, batch_dir, batch_id):
+        self.id = batch_id
+        self.dir = os.path.join(batch_dir, batch_id)
+        self.lock = threading.Lock()
+
+        with open(os.path.join(self.dir, "items.json")) as f:
+            data = json.load(f)
+        self.created_at = data['created_at']
+        self.items = {item['sha256']: dict(item, status='pending') for item in data['items']}
+
+        progress_path = os.path.join(self.dir, "progress.jsonl")
+        if os.path.exists(progress_path):
+            with open(progress_path) as f:
+                for line in f:
+                    try:
+                        update = json.loads(line)
+                    except ValueError:
+                        # Half-written last line from a crash
+                        continue
+                    if update['sha256'] in self.items:
+                        self.items[update['sha256']].update(update)
+
+    @classmethod
+    def create(cls, batch_dir, batch_id, items):
+        # items: {sha256: {'names': [...], 'path': ...}}
+        path = os.path.join(batch_dir, batch_id)
+        os.makedirs(path, exist_ok=True)
+        write_items(path, time.time(), items)
+        return cls(batch_dir, batch_id)
+
+    def add_items(self, items):
+        """Adds images that are not in the batch yet (items as for create()),
+        returns the number of new names. A finished batch runs again for them."""
+        added = 0
+        with self.lock:
+            for sha256, item in items.items():
+                if sha256 not in self.items:
+                    self.items[sha256] = dict(item, sha256=sha256, names=[], status='pending')
+                known = self.items[sha256]['names']
+                new_names = [name for name in item['names'] if name not in known]
+                known.extend(new_names)
+                added += len(new_names)
+            if added:
+                write_items(self.dir, self.created_at, self.items)
+        if added and os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+        return added
+
+    def names(self):
+        with self.lock:
+            return {name for item in self.items.values() for name in item['names']}
+
+    def update(self, sha256, **changes):
+        with self.lock:
+            self.items[sha256].update(changes)
+            with open(os.path.join(self.dir, "progress.jsonl"), "a") as f:
+                f.write(json.dumps(dict(changes, sha256=sha256)) + "\n")
+
+    def with_status(self, status):
+        with self.lock:
+            return [dict(item) for item in self.items.values() if item['status'] == status]
+
+    def counts(self):
+        with self.lock:
+            counts = {'pending': 0, 'running': 0, 'done': 0, 'failed': 0}
+            for item in self.items.values():
+                counts[item['status']] += 1
+            return counts
+
+    @property
+    def finished(self):
+        counts = self.counts()
+        return counts['pending'] == 0 and counts['running'] == 0
+
+    def manifest(self):
+        with self.lock:
+            return [
+                {key: item.get(key) for key in ('names', 'sha256', 'status', 'job_id', 'vertices', 'faces',
+                                                 'cached', 'mesh_url', 'glb_url', 'error')}
+                for item in self.items.values()
+            ]
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.dir, "manifest.json")
+
+    def write_manifest(self):
+        path = self.manifest_path
+        write_atomic(path, json.dumps({'batch_id': self.id, 'counts': self.counts(), 'items': self.manifest()}, indent=2))
+        return path
+
+    def to_dict(self):
+        counts = self.counts()
+        return {
+            'batch_id': self.id,
+            'created_at': self.created_at,
+            'status': 'done' if self.finished else 'running',
+            'items': len(self.items),
+            'names': sum(len(item['names']) for item in self.items.values()),
+            'counts': counts,
+            'progress': (counts['done'] + counts['failed']) / len(self.items) if self.items else 1.0
+        }
+
+
+def write_items(batch_path, created_at, items):
+    # items.json: the inputs only, their progress is in progress.jsonl
+    data = {
+        'created_at': created_at,
+        'items': [{'sha256': sha256, 'names': item['names'], 'path': item['path']} for sha256, item in items.items()]
+    }
+    write_atomic(os.path.join(batch_path, "items.json"), json.dumps(data))
+
+
+class BatchStore:
+    """Batches on disk under batch_dir/<batch_id>, plus the ones loaded in memory."""
+
+    def __init__(self, batch_dir=config.BATCH_DIR):
+        self.batch_dir = batch_dir
+        self.batches = {}
+        self.lock = threading.Lock()
+        os.makedirs(self.batch_dir, exist_ok=True)
+
+    def create_from_uploads(self, files, max_file_bytes=config.MAX_UPLOAD_BYTES):
+        """files: (name, data) pairs. Inputs are stored by content hash, duplicates are merged."""
+        batch_id = uuid.uuid4().hex
+        input_dir = os.path.join(self.batch_dir, batch_id, "inputs")
+        os.makedirs(input_dir)
+
+        items = {}
+        try:
+            for name, data in files:
+                if len(data) > max_file_bytes:
+                    raise ValueError(f"{name} is larger than {max_file_bytes} bytes")
+                sha256 = hashlib.sha256(data).hexdigest()
+                if sha256 not in items:
+                    path = os.path.join(input_dir, sha256 + os.path.splitext(name)[1].lower())
+                    with open(path, "wb") as f:
+                        f.write(data)
+                    items[sha256] = {'names': [], 'path': path}
+                items[sha256]['names'].append(name)
+            if not items:
+                raise ValueError("No images in the upload")
+            return self.add(Batch.create(self.batch_dir, batch_id, items))
+        except Exception:
+            shutil.rmtree(os.path.join(self.batch_dir, batch_id), ignore_errors=True)
+            raise
+
+    def create_from_directory(self, directory):
+        """Every image under directory, read in place. The batch ID comes from the path,
+        so running the same directory again resumes the same batch, with the
+        images added to the directory since then."""
+        directory = os.path.abspath(directory)
+        batch_id = hashlib.sha256(directory.encode()).hexdigest()[:32]
+        existing = self.get(batch_id)
+        # Files the batch already has are not hashed again
+        known = existing.names() if existing is not None else set()
+
+        items = {}
+        for root, _, file_names in os.walk(directory):
+            for file_name in sorted(file_names):
+                if not file_name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                path = os.path.join(root, file_name)
+                name = os.path.relpath(path, directory)
+                if name in known:
+                    continue
+                items.setdefault(file_sha256(path), {'names': [], 'path': path})['names'].append(name)
+
+        if existing is not None:
+            added = existing.add_items(items)
+            if added:
+                print(f"Batch {batch_id}: {added} new images in {directory}")
+            return existing
+        if not items:
+            raise ValueError(f"No images found in {directory}")
+        return self.add(Batch.create(self.batch_dir, batch_id, items))
+
+    def add(self, batch):
+        with self.lock:
+            self.batches[batch.id] = batch
+        return batch
+
+    def get(self, batch_id):
+        if not is_valid_job_id(batch_id):
+            return None
+        with self.lock:
+            if batch_id in self.batches:
+                return self.batches[batch_id]
+        if not os.path.exists(os.path.join(self.batch_dir, batch_id, "items.json")):
+            return None
+        return self.add(Batch(self.batch_dir, batch_id))
+
+    def load_unfinished(self):
+        # After a restart: pick up every batch that has no manifest yet
+        for entry in os.scandir(self.batch_dir):
+            if entry.is_dir() and is_valid_job_id(entry.name) and not os.path.exists(os.path.join(entry.path, "manifest.json")):
+                try:
+                    self.get(entry.name)
+                except (OSError, ValueError) as e:
+                    print(f"Skipping broken batch {entry.name}: {e}")
+
+    def active(self):
+        with self.lock:
+            return [batch for batch in self.batches.values() if not os.path.exists(batch.manifest_path)]
+
+
+def zip_images(archive, max_file_bytes=config.MAX_UPLOAD_BYTES):
+    # (name, data) for every image in a zip archive. Only the file name is
+    # used, and sizes are checked before anything is decompressed.
+    with zipfile.ZipFile(archive) as zf:
+        for info in zf.infolist():
+            if info.is_dir() or not info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            if info.file_size > max_file_bytes:
+                raise ValueError(f"{info.filename} is larger than {max_file_bytes} bytes")
+            if info.flag_bits & 0x1:
+                raise ValueError(f"{info.filename} is encrypted")
+            try:
+                data = zf.read(info)
+            except (NotImplementedError, RuntimeError, zlib.error) as e:
+                # Unsupported compression method or damaged data
+                raise ValueError(f"Could not extract {info.filename}: {e}")
+            yield info.filename, data
+
+
+class BatchScheduler:
+    """Feeds batch items into the worker pool as queue slots free up, at most
+    max_in_flight jobs per batch at a time.
+
+    start_job(data) starts a job like an upload would (and may raise
+    queue.Full), job_state(job_id) returns (status, details) for a job, or
+    None when the job is unknown.
+    """
+
+    def __init__(self, store, start_job, job_state, max_in_flight=config.BATCH_MAX_IN_FLIGHT, interval=0.5):
+        self.store = store
+        self.start_job = start_job
+        self.job_state = job_state
+        # Leaves the rest of the queue to interactive uploads
+        self.max_in_flight = max_in_flight
+        self.interval = interval
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def start(self, resume=True):
+        # resume=False only runs the batches added to the store, not the
+        # unfinished ones on disk (bulk.py: those belong to the server)
+        if resume:
+            self.store.load_unfinished()
+        self.thread = threading.Thread(target=self.run, name="batch-scheduler", daemon=True)
+        self.thread.start()
+
+    def notify(self):
+        self.wakeup.set()
+
+    def run(self):
+        while True:
+            for batch in self.store.active():
+                try:
+                    self.step(batch)
+                except Exception as e:
+                    print(f"Batch {batch.id} failed to advance: {e}")
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+
+    def step(self, batch):
+        # Collect finished jobs first, they free queue slots
+        for item in batch.with_status('running'):
+            state = self.job_state(item['job_id'])
+            if state is None:
+                # Job lost in a restart before it finished: run it again
+                batch.update(item['sha256'], status='pending', job_id=None)
+            elif state[0] in ('done', 'failed'):
+                batch.update(item['sha256'], status=state[0], **state[1])
+
+        in_flight = len(batch.with_status('running'))
+        for item in batch.with_status('pending'):
+            if in_flight >= self.max_in_flight:
+                break
+            try:
+                with open(item['path'], "rb") as f:
+                    data = f.read()
+                job = self.start_job(data)
+            except queue.Full:
+                # Queue is full, try again on the next round
+                break
+            except Exception as e:
+                batch.update(item['sha256'], status='failed', error=str(e))
+                continue
+            batch.update(item['sha256'], status='running', job_id=job.id)
+            in_flight += 1
+
+        if batch.finished:
+            path = batch.write_manifest()
+            counts = batch.counts()
+            print(f"Batch {batch.id} finished: {counts['done']} done, {counts['failed']} failed, manifest {path}")
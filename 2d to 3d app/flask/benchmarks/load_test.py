@@ -0,0 +1,391 @@
+"""Load test for the reconstruction server.
+
+Starts serve.py locally with the stub CPU model, replays sample images
+against /process_image at a given concurrency, fetches every result from
+/get_model and /Tviewer, and reports p50/p95/p99 latency, throughput and the
+server's peak RSS for each configuration:
+
+    python benchmarks/load_test.py                                # all scenarios
+    python benchmarks/load_test.py --scenarios persistent subprocess --requests 40 --concurrency 4
+    python benchmarks/load_test.py --json results.json            # save the numbers
+    python benchmarks/load_test.py --baseline results.json        # exit 1 on a p95 regression
+
+Every scenario gets a fresh server and an empty output/cache directory. The
+viewer files are built into flask/assets first if they are missing (pass
+--three-tarball when the server has no internet, or --asset-dir for a build
+elsewhere). Any response other than 2xx (after 429 retries) fails the run.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import signal
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+FLASK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_ASSET_DIR = os.path.join(FLASK_DIR, "assets")
+
+# Server settings per scenario, on top of the stub backend
+SCENARIOS = {
+    'persistent': {'env': {'RECON_MODE': 'persistent', 'MESH_CACHE_ENABLED': '0'}, 'format': 'glb'},
+    'subprocess': {'env': {'RECON_MODE': 'subprocess', 'MESH_CACHE_ENABLED': '0'}, 'format': 'glb'},
+    'cache': {'env': {'RECON_MODE': 'persistent', 'MESH_CACHE_ENABLED': '1'}, 'format': 'glb'},
+    'obj': {'env': {'RECON_MODE': 'persistent', 'MESH_CACHE_ENABLED': '0'}, 'format': 'obj'},
+}
+
+ENDPOINTS = ('process_image', 'get_model', 'Tviewer')
+
+# psutil is optional, /proc is read directly on Linux without it
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def sample_images(directory, count, size=(1024, 768), seed=0):
+    # Deterministic photos-ish images: smooth colour gradients plus noise
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:1:size[1] * 1j, 0:1:size[0] * 1j]
+    paths = []
+    for i in range(count):
+        phase = rng.uniform(0, 2 * np.pi, 3)
+        rgb = np.stack([np.sin(3 * x + 2 * y + p) for p in phase], axis=-1) * 0.4 + 0.5
+        rgb += rng.normal(0, 0.05, rgb.shape)
+        path = os.path.join(directory, f"sample_{i}.jpg")
+        Image.fromarray((np.clip(rgb, 0, 1) * 255).astype(np.uint8)).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_tree_rss(pid):
+    # RSS of the server plus its children (subprocess mode runs the model in a child)
+    if psutil is not None:
+        try:
+            process = psutil.Process(pid)
+            return sum(p.memory_info().rss for p in [process] + process.children(recursive=True))
+        except psutil.Error:
+            return None
+    if not os.path.exists("/proc"):
+        return None
+
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return total
+
+
+class RssMonitor:
+    """Samples the RSS of a process tree in the background and keeps the peak."""
+
+    def __init__(self, pid, interval=0.05):
+        self.pid = pid
+        self.interval = interval
+        self.peak = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stopped.is_set():
+            rss = process_tree_rss(self.pid)
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+            self.stopped.wait(self.interval)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+
+
+class Server:
+    """serve.py in a child process with its own output and cache directories."""
+
+    def __init__(self, env, workdir, port, asset_dir):
+        self.url = f"http://127.0.0.1:{port}"
+        self.env = dict(os.environ, **env,
+                        RECON_BACKEND="stub",
+                        TRIPOSR_PATH=workdir,
+                        ASSET_DIR=asset_dir,
+                        SERVER_HOST="127.0.0.1",
+                        SERVER_PORT=str(port),
+                        # Plain HTTP even when cert.pem/key.pem exist
+                        TLS_CERT_FILE=os.path.join(workdir, "no-cert.pem"),
+                        PYTHONUNBUFFERED="1")
+        self.log_path = os.path.join(workdir, "server.log")
+        self.process = None
+
+    def __enter__(self):
+        self.log = open(self.log_path, "w")
+        self.process = subprocess.Popen([sys.executable, "serve.py"], cwd=FLASK_DIR, env=self.env,
+                                        stdout=self.log, stderr=subprocess.STDOUT)
+        deadline = time.time() + 120
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited during startup, see {self.log_path}")
+            try:
+                with urllib.request.urlopen(self.url + "/worker/stats", timeout=1) as response:
+                    if json.load(response)['ready']:
+                        return self
+            except (OSError, ValueError):
+                pass
+            time.sleep(0.2)
+        raise RuntimeError("Server did not start within 120 s")
+
+    def __exit__(self, *exc):
+        if os.name == "nt":
+            self.process.terminate()
+        else:
+            self.process.send_signal(signal.SIGTERM)
+        try:
+            self.process.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.log.close()
+
+
+def build_assets(asset_dir, three_tarball=None):
+    # serve.py doesn't build the viewer files, without them /Tviewer is a 503
+    if os.path.exists(os.path.join(asset_dir, "manifest.json")):
+        return
+    command = [sys.executable, "build_assets.py", "--asset-dir", asset_dir]
+    if three_tarball:
+        command += ["--three-tarball", three_tarball]
+    subprocess.run(command, cwd=FLASK_DIR, check=True)
+
+
+def multipart_body(path):
+    boundary = uuid.uuid4().hex
+    with open(path, "rb") as f:
+        data = f.read()
+    body = (f"--{boundary}\r\n"
+            f"Content-Disposition: form-data; name=\"image\"; filename=\"{os.path.basename(path)}\"\r\n"
+            f"Content-Type: image/jpeg\r\n\r\n").encode() + data + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def timed_request(request, timeout=600):
+    # (seconds, status, body); 4xx/5xx come back as a status instead of an exception
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            body = response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        body = e.read()
+        status = e.code
+        if status == 429:
+            e.retry_after = int(e.headers.get("Retry-After", "1"))
+            raise
+    return time.perf_counter() - start, status, body
+
+
+def run_one(server_url, image_path, mesh_format, latencies, counters, lock):
+    body, content_type = multipart_body(image_path)
+
+    # Uploads turned away with 429 are retried after Retry-After, like the app does
+    while True:
+        request = urllib.request.Request(server_url + "/process_image", data=body,
+                                         headers={'Content-Type': content_type})
+        try:
+            seconds, status, response = timed_request(request)
+            break
+        except urllib.error.HTTPError as e:
+            with lock:
+                counters['rejected'] += 1
+            time.sleep(e.retry_after)
+
+    with lock:
+        latencies['process_image'].append(seconds)
+    if not 200 <= status < 300:
+        record_error(counters, lock, 'process_image', status, response)
+        return
+    job_id = json.loads(response)['job_id']
+
+    for endpoint, url in [('get_model', f"/get_model?job={job_id}&format={mesh_format}"),
+                          ('Tviewer', f"/Tviewer?job={job_id}")]:
+        seconds, status, response = timed_request(urllib.request.Request(server_url + url))
+        if not 200 <= status < 300:
+            record_error(counters, lock, endpoint, status, response)
+        with lock:
+            latencies[endpoint].append(seconds)
+            if endpoint == 'get_model':
+                counters['mesh_bytes'] += len(response)
+
+
+def record_error(counters, lock, endpoint, status, body):
+    # Counted, and the first few kept so the report says what went wrong
+    with lock:
+        counters['errors'] += 1
+        if len(counters['failures']) < 5:
+            counters['failures'].append(f"{endpoint}: HTTP {status} {' '.join(body[:200].decode('utf-8', 'replace').split())}")
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) * 1000 if values else None
+
+
+def run_scenario(name, images, requests, concurrency, warmup, asset_dir):
+    scenario = SCENARIOS[name]
+    workdir = tempfile.mkdtemp(prefix=f"load_test_{name}_")
+    try:
+        with Server(scenario['env'], workdir, free_port(), asset_dir) as server:
+            latencies = {endpoint: [] for endpoint in ENDPOINTS}
+            counters = {'errors': 0, 'rejected': 0, 'mesh_bytes': 0, 'failures': []}
+            lock = threading.Lock()
+
+            # Not measured: first requests pay for imports, page templates, etc.
+            warmup_counters = {'errors': 0, 'rejected': 0, 'mesh_bytes': 0, 'failures': []}
+            for i in range(warmup):
+                run_one(server.url, images[i % len(images)], scenario['format'],
+                        {endpoint: [] for endpoint in ENDPOINTS}, warmup_counters, lock)
+            if warmup_counters['errors']:
+                raise RuntimeError(f"Scenario {name} failed during warmup: {warmup_counters['failures'][0]}")
+
+            with RssMonitor(server.process.pid) as rss:
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                    futures = [
+                        executor.submit(run_one, server.url, images[i % len(images)], scenario['format'],
+                                        latencies, counters, lock)
+                        for i in range(requests)
+                    ]
+                    for future in futures:
+                        future.result()
+                wall_seconds = time.perf_counter() - start
+
+            return {
+                'scenario': name,
+                'requests': requests,
+                'concurrency': concurrency,
+                'wall_seconds': wall_seconds,
+                'throughput_rps': requests / wall_seconds,
+                'peak_rss_mb': rss.peak / 1024 ** 2 if rss.peak else None,
+                'errors': counters['errors'],
+                'failures': counters['failures'],
+                'rejected': counters['rejected'],
+                'mean_mesh_kb': counters['mesh_bytes'] / max(len(latencies['get_model']), 1) / 1024,
+                'latency_ms': {
+                    endpoint: {'p50': percentile(values, 50), 'p95': percentile(values, 95), 'p99': percentile(values, 99)}
+                    for endpoint, values in latencies.items()
+                }
+            }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_report(results):
+    print(f"\n{'scenario':<12} {'endpoint':<14} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+          f" {'req/s':>7} {'peak RSS MB':>12} {'mesh KB':>9} {'errors':>7} {'429s':>5}")
+    for result in results:
+        for n, endpoint in enumerate(ENDPOINTS):
+            latency = result['latency_ms'][endpoint]
+            line = f"{result['scenario'] if n == 0 else '':<12} {endpoint:<14}"
+            line += "".join(f" {latency[q]:>9.1f}" if latency[q] is not None else f" {'-':>9}" for q in ('p50', 'p95', 'p99'))
+            if n == 0:
+                rss = f"{result['peak_rss_mb']:.0f}" if result['peak_rss_mb'] else "-"
+                line += (f" {result['throughput_rps']:>7.2f} {rss:>12} {result['mean_mesh_kb']:>9.0f}"
+                         f" {result['errors']:>7} {result['rejected']:>5}")
+            print(line)
+
+
+def compare(results, baseline_path, max_regression):
+    # A scenario regressed when any endpoint's p95 got slower by more than max_regression
+    with open(baseline_path) as f:
+        baseline = {result['scenario']: result for result in json.load(f)}
+
+    regressions = []
+    for result in results:
+        before = baseline.get(result['scenario'])
+        if before is None:
+            continue
+        for endpoint in ENDPOINTS:
+            old = before['latency_ms'][endpoint]['p95']
+            new = result['latency_ms'][endpoint]['p95']
+            if old and new and new > old * (1 + max_regression):
+                regressions.append(f"{result['scenario']} {endpoint}: p95 {old:.1f} ms -> {new:.1f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--images", nargs="*", help="images to upload (default: generated samples)")
+    parser.add_argument("--sample-count", type=int, default=8, help="number of generated sample images")
+    parser.add_argument("--requests", type=int, default=24)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed p95 slowdown, 0.2 = 20%%")
+    parser.add_argument("--asset-dir", default=DEFAULT_ASSET_DIR, help="built viewer files (built here if missing)")
+    parser.add_argument("--three-tarball", help="three.js npm tarball for building the viewer files offline")
+    args = parser.parse_args()
+
+    asset_dir = os.path.abspath(args.asset_dir)
+    build_assets(asset_dir, args.three_tarball)
+
+    sample_dir = tempfile.mkdtemp(prefix="load_test_images_")
+    try:
+        images = args.images or sample_images(sample_dir, args.sample_count)
+        results = []
+        for name in args.scenarios:
+            print(f"Running scenario {name}: {args.requests} uploads, concurrency {args.concurrency}")
+            results.append(run_scenario(name, images, args.requests, args.concurrency, args.warmup, asset_dir))
+    finally:
+        shutil.rmtree(sample_dir, ignore_errors=True)
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    # Latencies of failed requests mean nothing, so errors fail the run
+    failed = False
+    for result in results:
+        for failure in result['failures']:
+            print(f"ERROR {result['scenario']} {failure}")
+        failed = failed or result['errors'] > 0
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        failed = failed or bool(regressions)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Time to load a reconstructed mesh from its OBJ text vs. from the mesh store.
+
+Writes stub relief meshes at several grid resolutions to a temporary folder
+in both formats and loads each one back, as every export or analysis step does.
+
+    python benchmarks/mesh_io_benchmark.py --resolutions 256 512 1024 --repeat 3
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mesh_io import read_obj, write_obj, read_mesh_store, write_mesh_store
+from simplify_benchmark import test_mesh
+
+
+def best_of(repeat, function):
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+    return min(seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--resolutions", type=int, nargs="+", default=[128, 256, 512, 1024])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'faces':>10} {'OBJ MB':>8} {'OBJ ms':>9} {'store MB':>9} {'store ms':>9} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for resolution in args.resolutions:
+            mesh = test_mesh(resolution)
+            obj_path = os.path.join(tmp_dir, f"{resolution}.obj")
+            store_path = os.path.join(tmp_dir, f"{resolution}.npmesh")
+            write_obj(mesh, obj_path)
+            write_mesh_store(mesh, store_path)
+
+            obj_seconds = best_of(args.repeat, lambda: read_obj(obj_path))
+
+            # Touch every value, otherwise only the header of the memory map is read
+            def load_store():
+                stored = read_mesh_store(store_path)
+                return float(stored.vertices.sum()) + int(stored.faces.sum()) + int(stored.colors.sum())
+            store_seconds = best_of(args.repeat, load_store)
+
+            print(f"{mesh.face_count:>10} {os.path.getsize(obj_path) / 1e6:>8.1f} {obj_seconds * 1000:>9.1f} "
+                  f"{os.path.getsize(store_path) / 1e6:>9.1f} {store_seconds * 1000:>9.1f} {obj_seconds / store_seconds:>7.0f}x")
+
+
+if __name__ == '__main__':
+    main()
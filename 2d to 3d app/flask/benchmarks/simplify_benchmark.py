@@ -0,0 +1,57 @@
+"""CPU time of the LOD simplification against the size of the input mesh.
+
+Builds stub relief meshes at several grid resolutions (the same kind of
+meshes RECON_BACKEND=stub produces) and simplifies each one to the LOD
+budgets from config.py.
+
+    python benchmarks/simplify_benchmark.py --resolutions 128 256 512 --repeat 3
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from reconstruction import relief_mesh
+from simplify import simplify
+
+
+def test_mesh(resolution, seed=0):
+    # Smooth waves plus some noise, roughly as hard as a real reconstruction
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:1:resolution * 1j, 0:1:resolution * 1j]
+    height = np.sin(6 * x) * np.cos(5 * y) * 0.3 + 0.01 * rng.standard_normal((resolution, resolution))
+    return relief_mesh(height, np.dstack([x, y, 1 - x]))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--resolutions", type=int, nargs="+", default=[64, 128, 256, 384, 512])
+    parser.add_argument("--budgets", type=int, nargs="+", default=sorted(config.LOD_FACE_BUDGETS.values()))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'input faces':>12} {'budget':>8} {'output faces':>13} {'best ms':>9} {'mean ms':>9} {'Mfaces/s':>9}")
+    for resolution in args.resolutions:
+        mesh = test_mesh(resolution)
+        for budget in args.budgets:
+            seconds = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                simplified = simplify(mesh, budget)
+                seconds.append(time.perf_counter() - start)
+
+            # Meshes already under the budget are returned untouched
+            if simplified is mesh:
+                print(f"{mesh.face_count:>12} {budget:>8} {'(as is)':>13}")
+                continue
+            best = min(seconds)
+            print(f"{mesh.face_count:>12} {budget:>8} {simplified.face_count:>13} "
+                  f"{best * 1000:>9.1f} {np.mean(seconds) * 1000:>9.1f} {mesh.face_count / best / 1e6:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""Builds the 3D viewer's static files into ASSET_DIR.
+
+viewer/viewer.js and viewer/viewer.css are copied with a hash of their content
+in the file name, and three.js (the module build plus the addons the viewer
+imports) is vendored from its npm package, so the viewer page loads nothing
+from other sites and every file can be cached for a year. gzip (and brotli)
+copies are made here too. Run it after changing the viewer or THREE_VERSION:
+
+    python build_assets.py [--three-tarball three-0.157.0.tgz]
+
+ASSET_DIR/manifest.json maps the names used in templates/viewer.html to the
+built files. Builds are kept side by side, pages rendered before a rebuild
+still find their files.
+"""
+import io
+import os
+import re
+import sys
+import gzip
+import json
+import hashlib
+import tarfile
+import argparse
+import posixpath
+import urllib.request
+
+import config
+from file_locks import write_atomic
+
+# Brotli is optional, without it only gzip copies are made
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+THREE_VERSION = "0.157.0"
+THREE_TARBALL_URL = f"https://registry.npmjs.org/three/-/three-{THREE_VERSION}.tgz"
+THREE_MODULE = "build/three.module.min.js"
+
+VIEWER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "viewer")
+MANIFEST_NAME = "manifest.json"
+ASSET_URL_PREFIX = "/assets/"
+
+# Addons the viewer imports, and the relative imports inside the addons
+ADDON_IMPORT = re.compile(r"""from\s+['"]three/addons/([^'"]+)['"]""")
+RELATIVE_IMPORT = re.compile(r"""(?:from|import)\s*['"](\.{1,2}/[^'"]+)['"]""")
+
+
+def content_hash(*blobs):
+    digest = hashlib.sha256()
+    for blob in blobs:
+        digest.update(blob)
+    return digest.hexdigest()[:12]
+
+
+def read_three(tarball_path=None):
+    # {path inside the npm package: bytes} of the files the viewer could need
+    if tarball_path is None:
+        print(f"Downloading {THREE_TARBALL_URL}")
+        with urllib.request.urlopen(THREE_TARBALL_URL, timeout=60) as response:
+            data = response.read()
+    else:
+        with open(tarball_path, "rb") as f:
+            data = f.read()
+
+    package = {}
+    with tarfile.open(fileobj=io.BytesIO(data), mode="r:gz") as tar:
+        for member in tar:
+            name = member.name.split("/", 1)[-1]
+            if member.isfile() and (name == THREE_MODULE or name.startswith("examples/jsm/")):
+                package[name] = tar.extractfile(member).read()
+    return package
+
+
+def three_files(package, viewer_js):
+    # three.module.min.js, the addons viewer.js imports and everything they import
+    files = set()
+    pending = [THREE_MODULE] + [f"examples/jsm/{name}" for name in ADDON_IMPORT.findall(viewer_js)]
+    while pending:
+        path = pending.pop()
+        if path in files:
+            continue
+        if path not in package:
+            raise ValueError(f"{path} is not in three {THREE_VERSION}")
+        files.add(path)
+        for relative in RELATIVE_IMPORT.findall(package[path].decode("utf-8")):
+            pending.append(posixpath.normpath(posixpath.join(posixpath.dirname(path), relative)))
+    return sorted(files)
+
+
+def write_asset(asset_dir, name, data):
+    path = os.path.join(asset_dir, *name.split("/"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    copies = [(path, data), (path + ".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        copies.append((path + ".br", brotli.compress(data, quality=11)))
+
+    # Same name means same content, so files from an earlier build are kept
+    for copy_path, copy_data in copies:
+        if not os.path.exists(copy_path):
+            write_atomic(copy_path, copy_data)
+
+
+def build(asset_dir=config.ASSET_DIR, three_tarball=None):
+    """Writes the viewer files and three.js to asset_dir, returns the manifest."""
+    with open(os.path.join(VIEWER_DIR, "viewer.js"), "rb") as f:
+        viewer_js = f.read()
+    with open(os.path.join(VIEWER_DIR, "viewer.css"), "rb") as f:
+        viewer_css = f.read()
+
+    package = read_three(three_tarball)
+    files = three_files(package, viewer_js.decode("utf-8"))
+
+    # One folder per three.js build, so the addons' relative imports still work
+    three_dir = f"three-{THREE_VERSION}-{content_hash(*(package[name] for name in files))}"
+    for name in files:
+        write_asset(asset_dir, f"{three_dir}/{name}", package[name])
+
+    js_name = f"viewer.{content_hash(viewer_js)}.js"
+    css_name = f"viewer.{content_hash(viewer_css)}.css"
+    write_asset(asset_dir, js_name, viewer_js)
+    write_asset(asset_dir, css_name, viewer_css)
+
+    manifest = {
+        'viewer.js': ASSET_URL_PREFIX + js_name,
+        'viewer.css': ASSET_URL_PREFIX + css_name,
+        'three': f"{ASSET_URL_PREFIX}{three_dir}/{THREE_MODULE}",
+        'three/addons/': f"{ASSET_URL_PREFIX}{three_dir}/examples/jsm/",
+        # Every module of the page, fetched in parallel instead of one import at a time
+        'modulepreload': [f"{ASSET_URL_PREFIX}{three_dir}/{name}" for name in files] + [ASSET_URL_PREFIX + js_name]
+    }
+
+    # The manifest goes last, a server never sees one whose files are missing
+    write_atomic(os.path.join(asset_dir, MANIFEST_NAME), json.dumps(manifest, indent=2))
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--three-tarball", help=f"three-{THREE_VERSION}.tgz from npm, instead of downloading it")
+    parser.add_argument("--asset-dir", default=config.ASSET_DIR)
+    args = parser.parse_args()
+
+    try:
+        manifest = build(args.asset_dir, args.three_tarball)
+    except (OSError, ValueError, tarfile.TarError) as e:
+        print(f"Building the viewer assets failed: {e}")
+        sys.exit(1)
+    print(f"Viewer assets written to {args.asset_dir}:")
+    for name, url in manifest.items():
+        if name != 'modulepreload':
+            print(f"  {name} -> {url}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Reconstruct every image in a directory, without going through HTTP.
+
+    python bulk.py photos/ [--manifest results.json]
+
+Runs the same pipeline as the server: one worker pool, the result cache and a
+job folder under OUTPUT_DIR per image. Identical files are reconstructed once.
+Progress is kept in BATCH_DIR, so running the same command again after a
+crash or Ctrl+C skips every image that already finished, and picks up images
+added to the directory since. Only this directory's batch is run, unfinished
+batches of a server sharing BATCH_DIR are left to the server.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+
+import server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("directory")
+    parser.add_argument("--manifest", help="copy the finished manifest to this file")
+    args = parser.parse_args()
+
+    batch = server.batch_store.create_from_directory(args.directory)
+    data = batch.to_dict()
+    print(f"Batch {batch.id}: {data['names']} images, {data['items']} unique, {data['counts']['done']} already done")
+
+    pool = server.get_pool(resume_batches=False)
+    pool.ready.wait()
+    if pool.load_error is not None:
+        sys.exit(1)
+    server.batch_scheduler.notify()
+
+    # The scheduler writes the manifest once every image is done or failed
+    manifest_path = batch.manifest_path
+    while not os.path.exists(manifest_path):
+        time.sleep(2)
+        counts = batch.counts()
+        print(f"done {counts['done']}, failed {counts['failed']}, running {counts['running']}, pending {counts['pending']}")
+
+    if args.manifest:
+        shutil.copyfile(manifest_path, args.manifest)
+        manifest_path = args.manifest
+    print(f"Manifest written to {manifest_path}")
+    sys.exit(1 if batch.counts()['failed'] else 0)
+
+
+if __name__ == '__main__':
+    main()
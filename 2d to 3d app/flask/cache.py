@@ -0,0 +1,177 @@
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+from PIL import Image
+
+import config
+
+
+def cache_key(data, params):
+    # Same bytes + same reconstruction parameters = same result
+    digest = hashlib.sha256(data)
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def image_key(image, params):
+    # Hash of the decoded pixels, so it doesn't matter how the image was encoded
+    digest = hashlib.sha256(f"{image.mode} {image.size}".encode())
+    digest.update(image.tobytes())
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def link_or_copy(src, dst):
+    # Hard links are free and cached files are never modified in place
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+class DiskCache:
+    """On-disk LRU cache. Each entry is a directory of files plus a small JSON record.
+
+    Recency is kept in memory and mirrored in the entry's mtime, so the LRU
+    order survives a restart. Entries are evicted oldest first once the total
+    size goes over max_bytes.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        found = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_dir():
+                continue
+            if entry.name.startswith("tmp-"):
+                shutil.rmtree(entry.path, ignore_errors=True)
+                continue
+            size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+            found.append((entry.stat().st_mtime, entry.name, size))
+        for _, key, size in sorted(found):
+            self.entries[key] = size
+            self.total_bytes += size
+
+        # The budget may have been lowered since the last run
+        self.remove(self.evict())
+
+    def get(self, key, dest_dir):
+        # Links the cached files into dest_dir and returns the stored record,
+        # or None on a miss
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+
+        entry_path = os.path.join(self.cache_dir, key)
+        try:
+            with open(os.path.join(entry_path, "entry.json")) as f:
+                record = json.load(f)
+            for name in record['files']:
+                link_or_copy(os.path.join(entry_path, name), os.path.join(dest_dir, name))
+            os.utime(entry_path)
+        except OSError:
+            # Evicted by another thread in the meantime
+            with self.lock:
+                self.hits -= 1
+                self.misses += 1
+            return None
+        return record
+
+    def put(self, key, src_dir, files, record):
+        with self.lock:
+            if key in self.entries:
+                return
+
+        # Build the entry under a temporary name and move it into place
+        tmp_path = os.path.join(self.cache_dir, f"tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp_path)
+        size = 0
+        for name in files:
+            link_or_copy(os.path.join(src_dir, name), os.path.join(tmp_path, name))
+            size += os.path.getsize(os.path.join(tmp_path, name))
+        with open(os.path.join(tmp_path, "entry.json"), "w") as f:
+            json.dump(dict(record, files=list(files)), f)
+        size += os.path.getsize(os.path.join(tmp_path, "entry.json"))
+
+        try:
+            os.replace(tmp_path, os.path.join(self.cache_dir, key))
+        except OSError:
+            # Another job stored the same key first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return
+
+        with self.lock:
+            self.entries[key] = size
+            self.total_bytes += size
+        self.remove(self.evict())
+
+    def evict(self):
+        # Drop least recently used entries until the cache fits its budget,
+        # the newest entry is always kept
+        evicted = []
+        with self.lock:
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                old_key, old_size = self.entries.popitem(last=False)
+                self.total_bytes -= old_size
+                evicted.append(old_key)
+        return evicted
+
+    def remove(self, keys):
+        for key in keys:
+            shutil.rmtree(os.path.join(self.cache_dir, key), ignore_errors=True)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes
+            }
+
+
+class MeshCache(DiskCache):
+    """Finished reconstruction outputs keyed on the uploaded bytes and the reconstruction parameters."""
+
+    def __init__(self, cache_dir=config.MESH_CACHE_DIR, max_bytes=config.MESH_CACHE_MAX_BYTES):
+        super().__init__(cache_dir, max_bytes)
+
+
+class ForegroundCache(DiskCache):
+    """Background removal output (the cropped RGBA image), keyed with image_key()."""
+
+    # Kept in the job folder too; the input_ prefix keeps it out of the result cache
+    file_name = "input_foreground.png"
+
+    def __init__(self, cache_dir=config.FOREGROUND_CACHE_DIR, max_bytes=config.FOREGROUND_CACHE_MAX_BYTES):
+        super().__init__(cache_dir, max_bytes)
+
+    def get_image(self, key, dest_dir):
+        if self.get(key, dest_dir) is None:
+            return None
+        image = Image.open(os.path.join(dest_dir, self.file_name))
+        image.load()
+        return image
+
+    def put_image(self, key, image, dest_dir):
+        # Fast PNG compression: this is on the job's critical path
+        image.save(os.path.join(dest_dir, self.file_name), compress_level=1)
+        self.put(key, dest_dir, [self.file_name], {'size': list(image.size), 'mode': image.mode})
@@ -0,0 +1,157 @@
+import os
+
+# Server settings. Every value can be overridden with an environment variable
+# so the same code runs on the dev PC, in benchmarks and in production.
+
+# Where the server listens (serve.py, gunicorn.conf.py and server.py)
+SERVER_HOST = os.environ.get("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.environ.get("SERVER_PORT", "5000"))
+
+# Production serving (serve.py / gunicorn.conf.py): threads answering HTTP
+# requests per process, and the number of processes. Every process runs its
+# own model (on the CPU the weights are shared, see SHARE_WEIGHTS) and keeps
+# its own table of running jobs (finished ones are in the shared
+# REGISTRY_PATH), so only use more than one process behind a load balancer
+# with sticky sessions.
+SERVER_THREADS = int(os.environ.get("SERVER_THREADS", "16"))
+SERVER_PROCESSES = int(os.environ.get("SERVER_PROCESSES", "1"))
+
+# Idle keep-alive connections are closed after this many seconds
+KEEPALIVE_SECONDS = int(os.environ.get("KEEPALIVE_SECONDS", "5"))
+
+# On shutdown, queued and running jobs get this long to finish
+SHUTDOWN_TIMEOUT_SECONDS = int(os.environ.get("SHUTDOWN_TIMEOUT_SECONDS", "300"))
+
+# HTTPS is used when both files exist. Generate them with:
+# openssl req -x509 -newkey rsa:4096 -keyout key.pem -out cert.pem -days 365 -nodes
+TLS_CERT_FILE = os.environ.get("TLS_CERT_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cert.pem"))
+TLS_KEY_FILE = os.environ.get("TLS_KEY_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "key.pem"))
+TLS_ENABLED = os.path.exists(TLS_CERT_FILE) and os.path.exists(TLS_KEY_FILE)
+
+# Viewer JavaScript, CSS and three.js as built by build_assets.py, served
+# under /assets with names that change with their content
+ASSET_DIR = os.environ.get("ASSET_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets"))
+
+# Flask debugger for `python server.py`. Never turn it on for a server other
+# devices can reach, it allows running code from the browser.
+DEBUG = os.environ.get("FLASK_DEBUG", "0") == "1"
+
+# Path to TripoSR directory
+TRIPOSR_PATH = os.environ.get("TRIPOSR_PATH", r"C:\project\app15\flask\TripoSR")
+
+# Finished jobs live in OUTPUT_DIR/<job_id>. Running jobs write to
+# STAGING_DIR/<job_id> first, both must be on the same drive so the final
+# move is atomic.
+OUTPUT_DIR = os.environ.get("OUTPUT_DIR", os.path.join(TRIPOSR_PATH, "output"))
+STAGING_DIR = os.environ.get("STAGING_DIR", os.path.join(TRIPOSR_PATH, "temp"))
+
+# Old job directories are removed once they are older than this, or when all
+# of them together take more space than WORKSPACE_MAX_BYTES
+WORKSPACE_MAX_AGE_SECONDS = int(os.environ.get("WORKSPACE_MAX_AGE_SECONDS", str(24 * 3600)))
+WORKSPACE_MAX_BYTES = int(os.environ.get("WORKSPACE_MAX_BYTES", str(5 * 1024 ** 3)))
+CLEANUP_INTERVAL_SECONDS = int(os.environ.get("CLEANUP_INTERVAL_SECONDS", "600"))
+
+# SQLite index of jobs and their output files: job history (GET /jobs),
+# lookups of finished jobs and the cleanup above run from it instead of
+# listing OUTPUT_DIR. Shared by all server processes.
+REGISTRY_PATH = os.environ.get("REGISTRY_PATH", os.path.join(TRIPOSR_PATH, "jobs.sqlite3"))
+
+# Largest accepted upload (the whole request body). Bigger uploads get a 413.
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(25 * 1024 ** 2)))
+
+# Bulk reconstruction (POST /batches and bulk.py): progress and manifests are
+# kept in BATCH_DIR so a restart resumes unfinished batches. A batch keeps at
+# most BATCH_MAX_IN_FLIGHT jobs in the queue, leaving room for single uploads.
+BATCH_DIR = os.environ.get("BATCH_DIR", os.path.join(TRIPOSR_PATH, "batches"))
+MAX_BATCH_UPLOAD_BYTES = int(os.environ.get("MAX_BATCH_UPLOAD_BYTES", str(2 * 1024 ** 3)))
+BATCH_MAX_IN_FLIGHT = int(os.environ.get("BATCH_MAX_IN_FLIGHT", "8"))
+
+# Results are cached by a hash of the uploaded bytes and the reconstruction
+# parameters, so re-uploading the same photo skips the model entirely
+MESH_CACHE_ENABLED = os.environ.get("MESH_CACHE_ENABLED", "1") != "0"
+MESH_CACHE_DIR = os.environ.get("MESH_CACHE_DIR", os.path.join(TRIPOSR_PATH, "cache", "meshes"))
+MESH_CACHE_MAX_BYTES = int(os.environ.get("MESH_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+# Background removal + foreground cropping is cached separately, keyed on the
+# decoded input image, so re-running an image with other mesh settings starts
+# straight from inference
+FOREGROUND_CACHE_ENABLED = os.environ.get("FOREGROUND_CACHE_ENABLED", "1") != "0"
+FOREGROUND_CACHE_DIR = os.environ.get("FOREGROUND_CACHE_DIR", os.path.join(TRIPOSR_PATH, "cache", "foregrounds"))
+FOREGROUND_CACHE_MAX_BYTES = int(os.environ.get("FOREGROUND_CACHE_MAX_BYTES", str(512 * 1024 ** 2)))
+
+# How reconstructions are run:
+#   "persistent" - load the model once at server start and keep it in memory
+#   "subprocess" - start a fresh interpreter (and model load) for every job
+RECON_MODE = os.environ.get("RECON_MODE", "persistent")
+
+# Which model does the work: "triposr" or "stub" (a small CPU-only model
+# that produces a relief mesh, used for testing and benchmarks)
+RECON_BACKEND = os.environ.get("RECON_BACKEND", "triposr")
+
+# Device for TripoSR, falls back to CPU when CUDA is not available
+RECON_DEVICE = os.environ.get("RECON_DEVICE", "cuda:0")
+
+# Model weights are memory-mapped read-only from their file instead of being
+# copied into every process, so all server processes share one copy in the
+# page cache and each extra process only costs its working memory. Helps on
+# the CPU only, on CUDA every process still has its own copy on the GPU.
+# The stub model's weights are written to WEIGHTS_DIR the first time.
+SHARE_WEIGHTS = os.environ.get("SHARE_WEIGHTS", "1") != "0"
+WEIGHTS_DIR = os.environ.get("WEIGHTS_DIR", os.path.join(TRIPOSR_PATH, "weights"))
+
+# TripoSR options (same defaults as TripoSR's run.py)
+MC_RESOLUTION = int(os.environ.get("MC_RESOLUTION", "256"))
+CHUNK_SIZE = int(os.environ.get("CHUNK_SIZE", "8192"))
+FOREGROUND_RATIO = float(os.environ.get("FOREGROUND_RATIO", "0.85"))
+REMOVE_BACKGROUND = os.environ.get("REMOVE_BACKGROUND", "1") != "0"
+
+# Quality presets a job can ask for (form field "quality"), cheapest first.
+# "standard" uses MC_RESOLUTION / CHUNK_SIZE from above. The chunk size only
+# changes speed and memory use of mesh extraction, not the mesh.
+QUALITY_PRESETS = {
+    'preview': {
+        'mc_resolution': int(os.environ.get("PREVIEW_MC_RESOLUTION", "128")),
+        'chunk_size': int(os.environ.get("PREVIEW_CHUNK_SIZE", str(CHUNK_SIZE)))
+    },
+    'standard': {
+        'mc_resolution': MC_RESOLUTION,
+        'chunk_size': CHUNK_SIZE
+    },
+    'high': {
+        'mc_resolution': int(os.environ.get("HIGH_MC_RESOLUTION", "384")),
+        'chunk_size': int(os.environ.get("HIGH_CHUNK_SIZE", str(CHUNK_SIZE)))
+    }
+}
+DEFAULT_QUALITY = os.environ.get("DEFAULT_QUALITY", "standard")
+
+# Levels of detail written next to every mesh, as the largest number of
+# triangles for each level ("high" is always the full mesh). Clients pick one
+# with ?lod=low|medium|high.
+LOD_FACE_BUDGETS = {
+    'low': int(os.environ.get("LOD_LOW_FACES", "10000")),
+    'medium': int(os.environ.get("LOD_MEDIUM_FACES", "50000"))
+}
+
+# Preview images rendered on the CPU after every job (GET /jobs/<id>/thumbnail
+# and GET /gallery): THUMBNAIL_FRAMES views around the model, each
+# THUMBNAIL_SIZE pixels square, as webp or png
+THUMBNAIL_SIZE = int(os.environ.get("THUMBNAIL_SIZE", "256"))
+THUMBNAIL_FRAMES = int(os.environ.get("THUMBNAIL_FRAMES", "4"))
+THUMBNAIL_FORMAT = os.environ.get("THUMBNAIL_FORMAT", "webp")
+
+# Number of reconstruction threads sharing the loaded model. Each running job
+# needs its own working memory on top of the weights, keep this low on GPUs.
+WORKER_COUNT = int(os.environ.get("WORKER_COUNT", "1"))
+
+# Maximum number of jobs waiting for a worker, uploads beyond this get a 429
+QUEUE_SIZE = int(os.environ.get("QUEUE_SIZE", "16"))
+
+# Micro-batching: a worker runs up to MAX_BATCH_SIZE queued images through one
+# forward pass, waiting at most MAX_BATCH_WAIT_MS for a batch to fill up.
+# MAX_BATCH_SIZE=1 turns batching off.
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "4"))
+MAX_BATCH_WAIT_MS = float(os.environ.get("MAX_BATCH_WAIT_MS", "20"))
+
+# Size of the stub model's fake weights, so its load time and memory use
+# behave a little like a real model
+STUB_WEIGHTS_MB = int(os.environ.get("STUB_WEIGHTS_MB", "64"))
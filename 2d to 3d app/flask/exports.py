@@ -0,0 +1,68 @@
+import os
+import shutil
+
+from mesh_io import (read_obj, write_obj, write_glb, write_stl, write_ply,
+                     read_mesh_store, write_mesh_store, MESH_STORE_EXTENSION)
+from file_locks import atomic_path, write_once
+from simplify import lod_file_name
+
+# Download formats. OBJ and GLB are written with every job, the others are
+# converted on first request and kept next to them.
+WRITERS = {
+    'obj': write_obj,
+    'glb': write_glb,
+    'stl': write_stl,
+    'ply': write_ply
+}
+
+# Levels of detail in a progressive mesh, coarsest first
+PROGRESSIVE_LODS = ('low', 'medium', 'high')
+PROGRESSIVE_EXTENSION = "glbs"
+
+
+def load_mesh(job_dir, lod='high'):
+    """The job's mesh as read-only arrays mapped from its mesh store.
+
+    Jobs from before the mesh store get one written from their OBJ first.
+    """
+    store_path = os.path.join(job_dir, lod_file_name(lod, MESH_STORE_EXTENSION))
+    if not os.path.exists(store_path):
+        mesh = read_obj(os.path.join(job_dir, lod_file_name(lod, "obj")))
+        with atomic_path(store_path) as tmp_path:
+            write_mesh_store(mesh, tmp_path)
+    return read_mesh_store(store_path)
+
+
+def export_mesh(job_dir, extension, lod='high', on_written=None):
+    """Path of the job's mesh as .<extension>, converted from the mesh store if needed.
+
+    Concurrent requests for the same file wait for one conversion, which calls
+    on_written(path) once the file is in place.
+    """
+    target = os.path.join(job_dir, lod_file_name(lod, extension))
+    return write_once(target, lambda tmp_path: WRITERS[extension](load_mesh(job_dir, lod), tmp_path), on_written)
+
+
+def progressive_mesh(job_dir, on_written=None):
+    """Path of the job's progressive mesh, written from its GLB files if needed.
+
+    The file is the levels of detail as GLB files one after another, coarsest
+    first. Every GLB header holds its length, so a client can show each level
+    as soon as its last byte has arrived and replace it with the next one.
+    """
+    def write(tmp_path):
+        lods = [lod for lod in PROGRESSIVE_LODS if os.path.exists(os.path.join(job_dir, lod_file_name(lod, "obj")))]
+        face_counts = {lod: load_mesh(job_dir, lod).face_count for lod in lods}
+        # A level that is no smaller than the next one (the mesh was already
+        # under its budget) would only cost time
+        levels = []
+        for lod in reversed(lods):
+            if not levels or face_counts[lod] < face_counts[levels[0]]:
+                levels.insert(0, lod)
+
+        with open(tmp_path, "wb") as out:
+            for lod in levels:
+                with open(export_mesh(job_dir, "glb", lod), "rb") as f:
+                    shutil.copyfileobj(f, out)
+
+    return write_once(os.path.join(job_dir, f"mesh.{PROGRESSIVE_EXTENSION}"), write, on_written)
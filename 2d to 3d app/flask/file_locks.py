@@ -0,0 +1,63 @@
+import os
+import uuid
+import threading
+from contextlib import contextmanager
+
+# path -> [lock, threads holding or waiting for it]
+path_locks = {}
+path_locks_lock = threading.Lock()
+
+
+@contextmanager
+def path_lock(path):
+    """Lets one thread at a time work on path, e.g. write a file that is made
+    on first request. The lock is dropped once no thread uses it any more,
+    also when the work raised."""
+    with path_locks_lock:
+        entry = path_locks.setdefault(path, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with path_locks_lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del path_locks[path]
+
+
+@contextmanager
+def atomic_path(path):
+    """Temporary name to write path under. It replaces path in one
+    os.replace() when the block ends and is deleted when the block raised,
+    so readers (and other processes) never see a partial file."""
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def write_atomic(path, data):
+    # data is bytes or text
+    with atomic_path(path) as tmp_path:
+        with open(tmp_path, "wb" if isinstance(data, bytes) else "w") as f:
+            f.write(data)
+
+
+def write_once(target, write, on_written=None):
+    """Runs write(tmp_path) and moves the result to target, unless target
+    already exists. Concurrent calls for the same target wait for one write,
+    which calls on_written(target) once the file is in place."""
+    if os.path.exists(target):
+        return target
+
+    with path_lock(target):
+        if not os.path.exists(target):
+            with atomic_path(target) as tmp_path:
+                write(tmp_path)
+            if on_written is not None:
+                on_written(target)
+    return target
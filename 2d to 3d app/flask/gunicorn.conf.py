@@ -0,0 +1,66 @@
+# gunicorn settings for Linux production (gunicorn does not run on Windows,
+# use serve.py there):
+#
+#     gunicorn -c gunicorn.conf.py server:app
+#
+# Every value comes from config.py, so the same environment variables work here.
+# Not "import config": gunicorn would read a module called config as its own setting
+import config as app_config
+
+bind = f"{app_config.SERVER_HOST}:{app_config.SERVER_PORT}"
+workers = app_config.SERVER_PROCESSES
+
+# Threads keep answering status polls and mesh downloads while a
+# /process_image request waits for its reconstruction
+worker_class = "gthread"
+threads = app_config.SERVER_THREADS
+keepalive = app_config.KEEPALIVE_SECONDS
+
+# Each worker imports the app after the fork and loads its own model there
+# (CUDA does not survive a fork). On the CPU the workers still share one copy
+# of the weights: they memory-map the same file (SHARE_WEIGHTS in config.py).
+preload_app = False
+
+# Time a stopping worker gets to finish its requests and queued jobs
+graceful_timeout = app_config.SHUTDOWN_TIMEOUT_SECONDS
+
+if app_config.TLS_ENABLED:
+    certfile = app_config.TLS_CERT_FILE
+    keyfile = app_config.TLS_KEY_FILE
+
+
+def on_starting(server):
+    # Write (stub) or download (TripoSR) the weight files once, here in the
+    # arbiter, instead of every worker doing it at the same time
+    if app_config.SHARE_WEIGHTS:
+        from reconstruction import create_reconstructor
+
+        create_reconstructor().prepare_weights()
+
+
+def post_worker_init(worker):
+    # Load the model before this worker takes requests. Loading can take longer
+    # than gunicorn's worker timeout, so keep telling the arbiter we are alive.
+    import server
+
+    pool = server.get_pool()
+    while not pool.ready.wait(1):
+        worker.notify()
+    if pool.load_error is not None:
+        raise SystemExit(1)
+
+    # What another worker would cost: its unique memory, the shared weights are already paid for
+    from weights import memory_usage
+
+    usage = memory_usage()
+    if usage is not None:
+        print(f"Worker {worker.pid}: {usage['uss'] / 1024 ** 2:.0f} MB unique, "
+              f"{usage['shared'] / 1024 ** 2:.0f} MB shared with other processes")
+
+
+def worker_exit(arbiter, worker):
+    # Let jobs that were accepted (e.g. via POST /jobs) finish before exiting
+    import server
+
+    if server.worker_pool is not None:
+        server.worker_pool.shutdown(app_config.SHUTDOWN_TIMEOUT_SECONDS)
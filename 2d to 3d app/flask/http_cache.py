@@ -0,0 +1,158 @@
+import io
+import os
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from flask import request, send_file
+from werkzeug.wsgi import wrap_file
+
+from file_locks import write_once
+
+# Brotli is optional, without it clients get gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content types worth compressing (binary meshes shrink too, just less than
+# OBJ text; STL repeats every vertex for each of its triangles)
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'model/gltf-binary', 'model/x-glb-sequence', 'model/stl',
+                      'application/x-ply')
+
+# Job-scoped URLs never change content, "latest" URLs must be revalidated
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+# Read size when the server can't use sendfile (TLS, werkzeug, cheroot)
+STREAM_BLOCK_SIZE = 256 * 1024
+
+# ETags of the most recently served file versions, least recently used
+# dropped first: replaced files and deleted job directories age out
+ETAG_CACHE_SIZE = 4096
+etags = OrderedDict()
+etag_lock = threading.Lock()
+
+
+def file_etag(path):
+    # Strong ETag from the file content, hashed once per file version
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with etag_lock:
+        if key in etags:
+            etags.move_to_end(key)
+            return etags[key]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    etag = digest.hexdigest()[:32]
+
+    with etag_lock:
+        etags[key] = etag
+        while len(etags) > ETAG_CACHE_SIZE:
+            etags.popitem(last=False)
+    return etag
+
+
+def compressed_copy(path, encoding, on_written=None):
+    # mesh.obj -> mesh.obj.gz / mesh.obj.br, made on first request and reused.
+    # on_written(target) is called when the copy is new.
+    suffix = {'gzip': '.gz', 'br': '.br'}[encoding]
+
+    def write(tmp_path):
+        with open(path, "rb") as f:
+            data = f.read()
+        if encoding == 'br':
+            data = brotli.compress(data, quality=9)
+        else:
+            data = gzip.compress(data, compresslevel=6)
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+
+    return write_once(path + suffix, write, on_written)
+
+
+class FileRange(io.RawIOBase):
+    """length bytes of a file, starting at start.
+
+    The underlying file is positioned at start and fileno() is passed through,
+    so gunicorn sends the range with sendfile() (it sends Content-Length bytes
+    from the current position). Other servers read it block by block.
+    """
+
+    def __init__(self, path, start, length):
+        self.file = open(path, "rb")
+        self.file.seek(start)
+        self.remaining = length
+
+    def readable(self):
+        return True
+
+    def fileno(self):
+        return self.file.fileno()
+
+    # socket.sendfile() moves the file position to the end of what it sent
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self.file.seek(offset, whence)
+
+    def tell(self):
+        return self.file.tell()
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+def send_cached_file(path, mimetype, immutable=False, on_written=None):
+    """send_file() with a content ETag, Cache-Control and precompressed variants.
+
+    Conditional requests (If-None-Match -> 304) and byte ranges (Range,
+    If-Range -> 206) are handled by send_file. A range is of the file that is
+    sent, so the compressed copy if the client accepts one; browsers ask for
+    identity when they send a Range header. on_written(path) is called for
+    every compressed copy written next to the file.
+    """
+    etag = file_etag(path)
+    file_path = path
+    encoding = None
+
+    if mimetype.startswith(COMPRESSIBLE_TYPES):
+        offered = (['br'] if brotli is not None else []) + ['gzip']
+        encoding = request.accept_encodings.best_match(offered)
+        if encoding is not None:
+            file_path = compressed_copy(path, encoding, on_written)
+            etag = f"{etag}-{encoding}"
+
+    response = send_file(file_path, mimetype=mimetype, etag=etag, conditional=True, max_age=None)
+    if response.status_code == 206:
+        # send_file wraps the whole file in an iterator that skips to the
+        # range, which rules out sendfile(); hand the server the range itself
+        response.response.close()
+        content_range = response.content_range
+        response.response = wrap_file(request.environ, FileRange(file_path, content_range.start,
+                                                                 content_range.stop - content_range.start),
+                                      STREAM_BLOCK_SIZE)
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def conditional_page(response, immutable=False):
+    # ETag for rendered pages such as the viewer, so a revalidation is a 304
+    response.add_etag()
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+    return response.make_conditional(request)
@@ -0,0 +1,141 @@
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+# Rough share of the work done when each stage starts, used for progress
+STAGE_PROGRESS = {
+    'queued': 0.0,
+    'background_removal': 0.05,
+    'preprocess': 0.15,
+    'inference': 0.3,
+    'mesh_extraction': 0.7,
+    'simplify': 0.8,
+    'export': 0.9,
+    'thumbnails': 0.95,
+    'done': 1.0
+}
+
+
+class Job:
+    """State of one reconstruction job, as reported by GET /jobs/<id>."""
+
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = 'queued'
+        self.stage = 'queued'
+        self.progress = 0.0
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        # Quality preset the job runs at, and the expected seconds to finish
+        # when it was picked (None before the server had timings)
+        self.quality = None
+        self.estimated_seconds = None
+        self.input_bytes = None
+        self.finished_event = threading.Event()
+
+        # Wall-clock seconds spent in each finished stage, 'queued' included
+        self.stage_started_at = self.created_at
+        self.stage_timings = {}
+
+        # Bumped on every change, GET /jobs/<id>/events waits on it
+        self.version = 0
+        self.changed = threading.Condition()
+
+    def end_stage(self, now):
+        self.stage_timings[self.stage] = self.stage_timings.get(self.stage, 0.0) + now - self.stage_started_at
+        self.stage_started_at = now
+
+    def set_stage(self, stage):
+        now = time.time()
+        with self.changed:
+            if self.status == 'queued':
+                self.status = 'running'
+                self.started_at = now
+            self.end_stage(now)
+            self.stage = stage
+            self.progress = STAGE_PROGRESS.get(stage, self.progress)
+            self.version += 1
+            self.changed.notify_all()
+
+    def finish(self, result=None, error=None):
+        with self.changed:
+            self.finished_at = time.time()
+            self.end_stage(self.finished_at)
+            if error is not None:
+                self.status = 'failed'
+                self.error = str(error)
+            else:
+                self.status = 'done'
+                self.stage = 'done'
+                self.progress = 1.0
+                self.result = result
+            self.version += 1
+            self.changed.notify_all()
+        self.finished_event.set()
+
+    def wait(self, timeout=None):
+        return self.finished_event.wait(timeout)
+
+    def wait_for_change(self, version, timeout=None):
+        # Blocks until the job is past the given version (or timeout), returns the current version
+        with self.changed:
+            self.changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def to_dict(self):
+        data = {
+            'job_id': self.id,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': self.progress,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'stage_timings': dict(self.stage_timings),
+            'quality': self.quality,
+            'estimated_seconds': self.estimated_seconds
+        }
+        if self.error is not None:
+            data['error'] = self.error
+        if self.result is not None:
+            data['vertices'] = self.result['vertices']
+            data['faces'] = self.result['faces']
+            data['lods'] = self.result.get('lods')
+            data['timings'] = self.result['timings']
+            data['cached'] = self.result.get('cached', False)
+            data['foreground_cached'] = self.result.get('foreground_cached', False)
+        return data
+
+
+class JobStore:
+    """In-memory table of jobs. Old finished jobs are forgotten once max_jobs is reached."""
+
+    def __init__(self, max_jobs=1000):
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def create(self):
+        job = Job(uuid.uuid4().hex)
+        with self.lock:
+            self.jobs[job.id] = job
+            if len(self.jobs) > self.max_jobs:
+                for old_id in [j.id for j in self.jobs.values() if j.finished][:len(self.jobs) - self.max_jobs]:
+                    del self.jobs[old_id]
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def remove(self, job_id):
+        with self.lock:
+            self.jobs.pop(job_id, None)
@@ -0,0 +1,296 @@
+import os
+import re
+import json
+import struct
+import numpy as np
+
+
+class Mesh:
+    """Triangle mesh kept as NumPy arrays (vertices, faces and optional RGB vertex colors)."""
+
+    def __init__(self, vertices, faces, colors=None):
+        self.vertices = np.asarray(vertices, dtype=np.float32).reshape(-1, 3)
+        self.faces = np.asarray(faces, dtype=np.int32).reshape(-1, 3)
+        self.colors = None if colors is None else np.asarray(colors, dtype=np.uint8).reshape(-1, 3)
+
+    @property
+    def vertex_count(self):
+        return len(self.vertices)
+
+    @property
+    def face_count(self):
+        return len(self.faces)
+
+
+def write_obj(mesh, path):
+    # Format the whole array with one % operation instead of a Python loop per line
+    if mesh.colors is not None:
+        data = np.hstack([mesh.vertices, mesh.colors.astype(np.float32) / 255.0])
+        vertex_lines = ("v %.6f %.6f %.6f %.4f %.4f %.4f\n" * len(data)) % tuple(data.ravel())
+    else:
+        vertex_lines = ("v %.6f %.6f %.6f\n" * mesh.vertex_count) % tuple(mesh.vertices.ravel())
+
+    # OBJ indices are 1-based
+    face_lines = ("f %d %d %d\n" * mesh.face_count) % tuple((mesh.faces + 1).ravel())
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        f.write(vertex_lines)
+        f.write(face_lines)
+
+
+# Lines of an OBJ file picked out by the regex engine instead of a Python loop
+OBJ_VERTEX_LINES = re.compile(rb"^v[ \t]+([^\r\n]*)", re.M)
+OBJ_FACE_LINES = re.compile(rb"^f[ \t]+([^\r\n]*)", re.M)
+# "/2/3" in "f 1/2/3 ...": texture and normal indices
+OBJ_FACE_EXTRAS = re.compile(rb"/[^\s]*")
+
+
+def read_obj(path):
+    """Read vertices (with optional vertex colours) and faces from an OBJ file.
+
+    Every vertex and face line is parsed at once by np.fromstring. Files
+    NumPy can't take as one block (lines of different lengths, polygons)
+    fall back to parsing line by line. Polygons are split into triangle fans,
+    texture and normal indices are ignored.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    vertex_lines = OBJ_VERTEX_LINES.findall(data)
+    values = np.fromstring(b"\n".join(vertex_lines), dtype=np.float32, sep=" ")
+    colors = None
+    if len(values) == 6 * len(vertex_lines):
+        values = values.reshape(-1, 6)
+        vertices = values[:, :3]
+        colors = np.round(np.clip(values[:, 3:], 0, 1) * 255)
+    elif len(values) == 3 * len(vertex_lines):
+        vertices = values.reshape(-1, 3)
+    else:
+        rows = [line.split() for line in vertex_lines]
+        vertices = np.array([row[:3] for row in rows], dtype=np.float32)
+        if all(len(row) == 6 for row in rows):
+            colors = np.round(np.clip(np.array([row[3:6] for row in rows], dtype=np.float32), 0, 1) * 255)
+
+    face_lines = OBJ_FACE_LINES.findall(data)
+    block = b"\n".join(face_lines)
+    if b"/" in block:
+        block = OBJ_FACE_EXTRAS.sub(b"", block)
+    indices = np.fromstring(block, dtype=np.int64, sep=" ")
+    if len(indices) == 3 * len(face_lines):
+        faces = indices.reshape(-1, 3)
+    else:
+        faces = []
+        for line in block.split(b"\n"):
+            polygon = [int(token) for token in line.split()]
+            faces.extend((polygon[0], polygon[i], polygon[i + 1]) for i in range(1, len(polygon) - 1))
+        faces = np.array(faces, dtype=np.int64).reshape(-1, 3)
+
+    # OBJ indices are 1-based, negative ones count back from the last vertex
+    faces = np.where(faces < 0, faces + len(vertices), faces - 1)
+    return Mesh(vertices, faces, colors)
+
+
+def face_normals(mesh, normalize=False):
+    # Cross product of two edges, its length is twice the triangle's area
+    v0, v1, v2 = (mesh.vertices[mesh.faces[:, i]] for i in range(3))
+    normals = np.cross(v1 - v0, v2 - v0)
+    if normalize:
+        length = np.linalg.norm(normals, axis=1, keepdims=True)
+        normals /= np.where(length > 0, length, 1.0)
+    return normals
+
+
+def vertex_normals(mesh):
+    # Area-weighted average of the normals of the faces around each vertex
+    per_face = face_normals(mesh)
+    normals = np.zeros_like(mesh.vertices)
+    for i in range(3):
+        for axis in range(3):
+            normals[:, axis] += np.bincount(mesh.faces[:, i], weights=per_face[:, axis], minlength=mesh.vertex_count)
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    return normals / np.where(length > 0, length, 1.0)
+
+
+# glTF constants
+GLTF_ARRAY_BUFFER = 34962
+GLTF_ELEMENT_ARRAY_BUFFER = 34963
+GLTF_BYTE = 5120
+GLTF_UNSIGNED_BYTE = 5121
+GLTF_SHORT = 5122
+GLTF_UNSIGNED_SHORT = 5123
+GLTF_UNSIGNED_INT = 5125
+
+
+def write_glb(mesh, path):
+    """Write a binary glTF using KHR_mesh_quantization.
+
+    Per vertex: int16 position, int8 normal and uint8 colour, interleaved in
+    16 bytes (OBJ text needs around 60). The node transform maps the int16
+    positions back to the original coordinates.
+    """
+    vertices = mesh.vertices
+    lower = vertices.min(axis=0) if mesh.vertex_count else np.zeros(3, dtype=np.float32)
+    upper = vertices.max(axis=0) if mesh.vertex_count else np.zeros(3, dtype=np.float32)
+    center = (lower + upper) / 2
+    scale = max(float((upper - lower).max()) / 2, 1e-8) / 32767
+
+    # Attributes must start on 4-byte boundaries, hence the padding fields
+    layout = [('position', '<i2', 3), ('pad0', '<i2'), ('normal', 'i1', 3), ('pad1', 'i1'), ('color', 'u1', 3), ('pad2', 'u1')]
+    interleaved = np.zeros(mesh.vertex_count, dtype=np.dtype(layout))
+    interleaved['position'] = np.round((vertices - center) / scale).astype(np.int16)
+    interleaved['normal'] = np.round(vertex_normals(mesh) * 127).astype(np.int8)
+    if mesh.colors is not None:
+        interleaved['color'] = mesh.colors
+    vertex_bytes = interleaved.tobytes()
+
+    if mesh.vertex_count < 65536:
+        index_bytes, index_type = mesh.faces.astype('<u2').tobytes(), GLTF_UNSIGNED_SHORT
+    else:
+        index_bytes, index_type = mesh.faces.astype('<u4').tobytes(), GLTF_UNSIGNED_INT
+    index_padding = b"\0" * (-len(index_bytes) % 4)
+    binary = index_bytes + index_padding + vertex_bytes
+
+    attributes = {'POSITION': 1, 'NORMAL': 2}
+    accessors = [
+        {'bufferView': 0, 'componentType': index_type, 'count': mesh.face_count * 3, 'type': 'SCALAR'},
+        {'bufferView': 1, 'byteOffset': 0, 'componentType': GLTF_SHORT, 'count': mesh.vertex_count, 'type': 'VEC3',
+         'min': interleaved['position'].min(axis=0).tolist() if mesh.vertex_count else [0, 0, 0],
+         'max': interleaved['position'].max(axis=0).tolist() if mesh.vertex_count else [0, 0, 0]},
+        {'bufferView': 1, 'byteOffset': 8, 'componentType': GLTF_BYTE, 'normalized': True, 'count': mesh.vertex_count, 'type': 'VEC3'},
+    ]
+    if mesh.colors is not None:
+        attributes['COLOR_0'] = 3
+        accessors.append({'bufferView': 1, 'byteOffset': 12, 'componentType': GLTF_UNSIGNED_BYTE, 'normalized': True,
+                          'count': mesh.vertex_count, 'type': 'VEC3'})
+
+    gltf = {
+        'asset': {'version': '2.0', 'generator': 'TripoSR server'},
+        'extensionsUsed': ['KHR_mesh_quantization'],
+        'extensionsRequired': ['KHR_mesh_quantization'],
+        'scene': 0,
+        'scenes': [{'nodes': [0]}],
+        'nodes': [{'mesh': 0, 'translation': center.tolist(), 'scale': [scale] * 3}],
+        'meshes': [{'primitives': [{'attributes': attributes, 'indices': 0, 'material': 0}]}],
+        'materials': [{'pbrMetallicRoughness': {'metallicFactor': 0.1, 'roughnessFactor': 0.7}}],
+        'buffers': [{'byteLength': len(binary)}],
+        'bufferViews': [
+            {'buffer': 0, 'byteOffset': 0, 'byteLength': len(index_bytes), 'target': GLTF_ELEMENT_ARRAY_BUFFER},
+            {'buffer': 0, 'byteOffset': len(index_bytes) + len(index_padding), 'byteLength': len(vertex_bytes),
+             'byteStride': interleaved.dtype.itemsize, 'target': GLTF_ARRAY_BUFFER},
+        ],
+        'accessors': accessors
+    }
+
+    json_chunk = json.dumps(gltf, separators=(',', ':')).encode()
+    json_chunk += b" " * (-len(json_chunk) % 4)
+    total_length = 12 + 8 + len(json_chunk) + 8 + len(binary)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(struct.pack("<4sII", b"glTF", 2, total_length))
+        f.write(struct.pack("<I4s", len(json_chunk), b"JSON"))
+        f.write(json_chunk)
+        f.write(struct.pack("<I4s", len(binary), b"BIN\0"))
+        f.write(binary)
+
+
+def write_stl(mesh, path):
+    # Binary STL: one 50-byte record per triangle (normal, three corners,
+    # attribute count), filled as a whole array. STL has no vertex colours.
+    record = np.dtype([('normal', '<f4', 3), ('corners', '<f4', (3, 3)), ('attributes', '<u2')])
+    records = np.zeros(mesh.face_count, dtype=record)
+    records['normal'] = face_normals(mesh, normalize=True)
+    records['corners'] = mesh.vertices[mesh.faces]
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"TripoSR server".ljust(80, b"\0"))
+        f.write(struct.pack("<I", mesh.face_count))
+        f.write(records.tobytes())
+
+
+def write_ply(mesh, path):
+    # Binary little-endian PLY with uchar vertex colours
+    layout = [('position', '<f4', 3)]
+    properties = ["property float x", "property float y", "property float z"]
+    if mesh.colors is not None:
+        layout.append(('color', 'u1', 3))
+        properties += ["property uchar red", "property uchar green", "property uchar blue"]
+    vertices = np.zeros(mesh.vertex_count, dtype=np.dtype(layout))
+    vertices['position'] = mesh.vertices
+    if mesh.colors is not None:
+        vertices['color'] = mesh.colors
+
+    # Every face is "3 a b c": a uchar count followed by three ints
+    faces = np.zeros(mesh.face_count, dtype=np.dtype([('count', 'u1'), ('indices', '<i4', 3)]))
+    faces['count'] = 3
+    faces['indices'] = mesh.faces
+
+    header = "\n".join([
+        "ply",
+        "format binary_little_endian 1.0",
+        "comment TripoSR server",
+        f"element vertex {mesh.vertex_count}",
+        *properties,
+        f"element face {mesh.face_count}",
+        "property list uchar int vertex_indices",
+        "end_header"
+    ]) + "\n"
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(header.encode("ascii"))
+        f.write(vertices.tobytes())
+        f.write(faces.tobytes())
+
+
+# Mesh store: the Mesh arrays as they are in memory, in one file that
+# read_mesh_store() maps back without parsing or copying. Written next to
+# every OBJ, so conversions and analysis never have to read the OBJ text.
+MESH_STORE_EXTENSION = "npmesh"
+MESH_STORE_MAGIC = b"NPMESH01"
+MESH_STORE_ALIGNMENT = 64
+
+
+def write_mesh_store(mesh, path):
+    """Layout: magic, header length, JSON header (dtype, shape and offset of
+    each array), then the raw arrays, each starting on a 64-byte boundary."""
+    arrays = {'vertices': mesh.vertices, 'faces': mesh.faces}
+    if mesh.colors is not None:
+        arrays['colors'] = mesh.colors
+
+    # Offsets are relative to the end of the (padded) header
+    entries, offset = {}, 0
+    for name, array in arrays.items():
+        entries[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += array.nbytes + (-array.nbytes % MESH_STORE_ALIGNMENT)
+    header = json.dumps(entries, separators=(',', ':')).encode()
+    header += b" " * (-(16 + len(header)) % MESH_STORE_ALIGNMENT)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(struct.pack("<8sQ", MESH_STORE_MAGIC, len(header)))
+        f.write(header)
+        for array in arrays.values():
+            f.write(np.ascontiguousarray(array).tobytes())
+            f.write(b"\0" * (-array.nbytes % MESH_STORE_ALIGNMENT))
+
+
+def read_mesh_store(path):
+    # Read-only views into one memory map: pages are loaded as they are used
+    # and shared between processes that open the same file
+    with open(path, "rb") as f:
+        magic, header_length = struct.unpack("<8sQ", f.read(16))
+        if magic != MESH_STORE_MAGIC:
+            raise ValueError(f"{path} is not a mesh store")
+        entries = json.loads(f.read(header_length))
+
+    buffer = np.memmap(path, dtype=np.uint8, mode="r")
+    arrays = {}
+    for name, entry in entries.items():
+        dtype = np.dtype(entry['dtype'])
+        count = int(np.prod(entry['shape']))
+        arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count,
+                                     offset=16 + header_length + entry['offset']).reshape(entry['shape'])
+    return Mesh(arrays['vertices'], arrays['faces'], arrays.get('colors'))
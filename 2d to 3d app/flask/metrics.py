@@ -0,0 +1,183 @@
+import bisect
+import threading
+
+# Default buckets for durations in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class Histogram:
+    """Cumulative bucket counts plus sum and count, like a Prometheus histogram."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self.lock:
+            cumulative = []
+            total = 0
+            for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+                total += count
+                cumulative.append(("+Inf" if bound == float("inf") else bound, total))
+            return {
+                'count': self.count,
+                'sum': self.sum,
+                'mean': self.sum / self.count if self.count else None,
+                'buckets': cumulative
+            }
+
+
+# Buckets for sizes in bytes (1 KB .. 256 MB)
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(10))
+
+
+class Metric:
+    """A named metric for GET /metrics, optionally split by labels."""
+
+    type = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.children = {}
+        self.lock = threading.Lock()
+
+    def key(self, labels):
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def labels_of(self, key):
+        return dict(zip(self.label_names, key))
+
+    # (sample name, labels, value) for every exported line
+    def samples(self):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.children[key] = self.children.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            children = list(self.children.items())
+        for key, value in children:
+            yield self.name, self.labels_of(key), value
+
+
+class Callback(Metric):
+    """Value read when /metrics is scraped, for numbers other objects already keep.
+
+    function returns a number, or {label values: number} when there are labels.
+    None means "not known yet" and is left out.
+    """
+
+    def __init__(self, name, help, function, labels=(), type="gauge"):
+        super().__init__(name, help, labels)
+        self.function = function
+        self.type = type
+
+    def samples(self):
+        value = self.function()
+        if not self.label_names:
+            value = {(): value}
+        for key, number in value.items():
+            if number is not None:
+                yield self.name, self.labels_of(key), number
+
+
+class HistogramMetric(Metric):
+    """Histogram per label combination. An existing Histogram can be exported as the unlabelled child."""
+
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS, histogram=None):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+        if histogram is not None:
+            self.children[()] = histogram
+
+    def labels(self, **labels):
+        key = self.key(labels)
+        with self.lock:
+            if key not in self.children:
+                self.children[key] = Histogram(self.buckets)
+            return self.children[key]
+
+    def observe(self, value, **labels):
+        self.labels(**labels).observe(value)
+
+    def samples(self):
+        with self.lock:
+            children = list(self.children.items())
+        for key, histogram in children:
+            labels = self.labels_of(key)
+            snapshot = histogram.snapshot()
+            for bound, count in snapshot['buckets']:
+                yield self.name + "_bucket", dict(labels, le=bound), count
+            yield self.name + "_sum", labels, snapshot['sum']
+            yield self.name + "_count", labels, snapshot['count']
+
+
+def format_value(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n"))
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Registry:
+    """The metrics served by GET /metrics, in the Prometheus text format."""
+
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            try:
+                for name, labels, value in metric.samples():
+                    lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+            except Exception as e:
+                # One broken callback must not take the whole endpoint down
+                print(f"Failed to collect metric {metric.name}: {e}")
+        return "\n".join(lines) + "\n"
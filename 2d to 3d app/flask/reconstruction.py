@@ -0,0 +1,509 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+import numpy as np
+from PIL import Image
+
+import config
+from cache import ForegroundCache, image_key
+from exports import progressive_mesh
+from mesh_io import Mesh, write_obj, write_glb, write_mesh_store, MESH_STORE_EXTENSION
+from simplify import build_lods, lod_file_name
+from thumbnails import write_thumbnails
+from weights import shared_array, load_checkpoint
+
+
+class Reconstructor:
+    """Base class for the models that turn one image into a mesh.
+
+    load() is called once when the worker starts. A job then runs
+    remove_background -> preprocess -> forward -> extract_mesh, the same
+    stages as TripoSR's run.py.
+    """
+
+    name = "base"
+    # Largest batch forward() accepts, None for no limit
+    max_batch_size = None
+    # Uploads are downscaled to fit in a square of this size before they get
+    # to preprocess(), None keeps the full resolution
+    max_input_side = None
+    # ForegroundCache for the output of remove_background(), None to always run it
+    foreground_cache = None
+    # True once load() mapped the weights from a file other processes share
+    weights_shared = False
+
+    def prepare_weights(self):
+        # Writes or downloads the weight files, so that processes started
+        # afterwards only map them (gunicorn calls this before forking)
+        pass
+
+    def foreground_cache_stats(self):
+        # None when the foreground cache is turned off
+        return self.foreground_cache.stats() if self.foreground_cache is not None else None
+
+    def load(self):
+        pass
+
+    def remove_background(self, image):
+        return image
+
+    # Settings that change what remove_background() returns, or None when it
+    # does no work worth caching
+    def foreground_params(self):
+        return None
+
+    def preprocess(self, image):
+        return image.convert("RGB")
+
+    def forward(self, images):
+        raise NotImplementedError
+
+    # chunk_size None keeps the reconstructor's default
+    def extract_mesh(self, scene_codes, resolution, chunk_size=None):
+        raise NotImplementedError
+
+    # image is a file path or an already decoded PIL image. progress, if
+    # given, is called with the name of each stage as it starts.
+    def reconstruct(self, image, output_dir, mc_resolution=config.MC_RESOLUTION, progress=None, chunk_size=None):
+        result = self.reconstruct_batch([(image, output_dir, mc_resolution, chunk_size, progress)])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    # Returns the foreground image and whether it came from the cache
+    def cached_remove_background(self, image, output_dir):
+        params = self.foreground_params()
+        if self.foreground_cache is None or params is None:
+            return self.remove_background(image), False
+
+        key = image_key(image, dict(params, model=self.name))
+        foreground = self.foreground_cache.get_image(key, output_dir)
+        if foreground is not None:
+            return foreground, True
+        foreground = self.remove_background(image)
+        try:
+            self.foreground_cache.put_image(key, foreground, output_dir)
+        except Exception as e:
+            print(f"Failed to cache foreground: {e}")
+        return foreground, False
+
+    # Runs several jobs with a single forward pass. jobs is a list of
+    # (image, output_dir, mc_resolution, chunk_size, progress) tuples, the return
+    # value has one result dict or exception per job.
+    def reconstruct_batch(self, jobs):
+        results = [None] * len(jobs)
+        timings = [{} for _ in jobs]
+        report = [progress or (lambda stage: None) for _, _, _, _, progress in jobs]
+
+        images = []
+        foreground_hits = set()
+        for i, (image, output_dir, _, _, _) in enumerate(jobs):
+            try:
+                report[i]('background_removal')
+                start = time.perf_counter()
+                if not isinstance(image, Image.Image):
+                    image = Image.open(image)
+                image, cached = self.cached_remove_background(image, output_dir)
+                timings[i]['background_removal'] = time.perf_counter() - start
+                if cached:
+                    foreground_hits.add(i)
+
+                report[i]('preprocess')
+                start = time.perf_counter()
+                images.append((i, self.preprocess(image)))
+                timings[i]['preprocess'] = time.perf_counter() - start
+            except Exception as e:
+                results[i] = e
+
+        if not images:
+            return results
+
+        for i, _ in images:
+            report[i]('inference')
+        start = time.perf_counter()
+        try:
+            scene_codes = self.forward([image for _, image in images])
+        except Exception as e:
+            for i, _ in images:
+                results[i] = e
+            return results
+        inference_seconds = time.perf_counter() - start
+
+        for n, (i, _) in enumerate(images):
+            _, output_dir, mc_resolution, chunk_size, _ = jobs[i]
+            timings[i]['inference'] = inference_seconds
+            timings[i]['batch_size'] = len(images)
+            try:
+                report[i]('mesh_extraction')
+                start = time.perf_counter()
+                mesh = self.extract_mesh(scene_codes[n:n + 1], mc_resolution, chunk_size)[0]
+                timings[i]['mesh_extraction'] = time.perf_counter() - start
+
+                # Lighter versions of the mesh for slower devices
+                report[i]('simplify')
+                start = time.perf_counter()
+                lods = build_lods(mesh)
+                timings[i]['simplify'] = time.perf_counter() - start
+
+                report[i]('export')
+                start = time.perf_counter()
+                for lod, lod_mesh in lods.items():
+                    write_obj(lod_mesh, os.path.join(output_dir, lod_file_name(lod, "obj")))
+                    write_glb(lod_mesh, os.path.join(output_dir, lod_file_name(lod, "glb")))
+                    write_mesh_store(lod_mesh, os.path.join(output_dir, lod_file_name(lod, MESH_STORE_EXTENSION)))
+                # What the viewer loads: the GLB files again, coarsest first
+                progressive_mesh(output_dir)
+                mesh_path = os.path.join(output_dir, lod_file_name('high', "obj"))
+                timings[i]['export'] = time.perf_counter() - start
+            except Exception as e:
+                results[i] = e
+                continue
+
+            # Preview images from the lightest level of detail. The job is
+            # done without them, they are rendered on first request then.
+            report[i]('thumbnails')
+            start = time.perf_counter()
+            try:
+                write_thumbnails(min(lods.values(), key=lambda lod_mesh: lod_mesh.face_count), output_dir)
+            except Exception as e:
+                print(f"Failed to render thumbnails: {e}")
+            timings[i]['thumbnails'] = time.perf_counter() - start
+
+            results[i] = {
+                'mesh_path': mesh_path,
+                'vertices': mesh.vertex_count,
+                'faces': mesh.face_count,
+                'lods': {lod: lod_mesh.face_count for lod, lod_mesh in lods.items()},
+                'foreground_cached': i in foreground_hits,
+                'timings': timings[i]
+            }
+
+        return results
+
+
+class TripoSRReconstructor(Reconstructor):
+    name = "triposr"
+    repo_id = "stabilityai/TripoSR"
+    # The model itself sees 512x512, but resize_foreground() crops to the
+    # object first, so keep some resolution in hand for the crop
+    max_input_side = 1024
+
+    def __init__(self, triposr_path=config.TRIPOSR_PATH, device=config.RECON_DEVICE,
+                 chunk_size=config.CHUNK_SIZE, remove_bg=config.REMOVE_BACKGROUND,
+                 foreground_ratio=config.FOREGROUND_RATIO):
+        self.triposr_path = triposr_path
+        self.device = device
+        self.chunk_size = chunk_size
+        self.remove_bg = remove_bg
+        self.foreground_ratio = foreground_ratio
+
+    def load(self):
+        # TripoSR is a cloned repo, not an installed package
+        if self.triposr_path not in sys.path:
+            sys.path.insert(0, self.triposr_path)
+
+        import torch
+        from tsr.system import TSR
+
+        self.torch = torch
+        if not torch.cuda.is_available():
+            self.device = "cpu"
+
+        if config.SHARE_WEIGHTS and self.device == "cpu":
+            self.model = self.load_shared_model(TSR)
+        else:
+            self.model = TSR.from_pretrained(
+                self.repo_id,
+                config_name="config.yaml",
+                weight_name="model.ckpt",
+            )
+        self.model.renderer.set_chunk_size(self.chunk_size)
+        self.model.to(self.device)
+
+        self.rembg_session = None
+        if self.remove_bg:
+            import rembg
+            self.rembg_session = rembg.new_session()
+
+    def prepare_weights(self):
+        # Into the Hugging Face cache, where TSR.from_pretrained() looks too
+        from huggingface_hub import hf_hub_download
+
+        return (hf_hub_download(repo_id=self.repo_id, filename="config.yaml"),
+                hf_hub_download(repo_id=self.repo_id, filename="model.ckpt"))
+
+    def load_shared_model(self, TSR):
+        # Same as TSR.from_pretrained(), except that the parameters are the
+        # memory-mapped checkpoint instead of a copy of it
+        from omegaconf import OmegaConf
+
+        config_path, weight_path = self.prepare_weights()
+        cfg = OmegaConf.load(config_path)
+        OmegaConf.resolve(cfg)
+        model = TSR(cfg)
+        try:
+            state_dict = load_checkpoint(self.torch, weight_path)
+        except (TypeError, RuntimeError) as e:
+            # TypeError: torch older than 2.1 has no mmap argument.
+            # RuntimeError: the checkpoint is in the legacy (not zip) format.
+            print(f"Can't memory-map {weight_path} with torch {self.torch.__version__} ({e}), "
+                  "weights are not shared, every process loads its own copy")
+            state_dict = self.torch.load(weight_path, map_location="cpu")
+        else:
+            self.weights_shared = True
+        if self.weights_shared:
+            model.load_state_dict(state_dict, assign=True)
+        else:
+            # A private copy is copied into the parameters as usual, and torch
+            # older than 2.1 has no assign argument either
+            model.load_state_dict(state_dict)
+        return model
+
+    def remove_background(self, image):
+        from tsr.utils import remove_background, resize_foreground
+
+        if not self.remove_bg:
+            return image
+
+        # Same steps as TripoSR's run.py: cut out the object and recenter it
+        image = remove_background(image, self.rembg_session)
+        return resize_foreground(image, self.foreground_ratio)
+
+    def foreground_params(self):
+        if not self.remove_bg:
+            return None
+        return {'foreground_ratio': self.foreground_ratio}
+
+    def preprocess(self, image):
+        if not self.remove_bg:
+            return np.array(image.convert("RGB"))
+
+        # Composite the cut-out object on a grey background
+        image = np.array(image).astype(np.float32) / 255.0
+        image = image[:, :, :3] * image[:, :, 3:4] + (1 - image[:, :, 3:4]) * 0.5
+        return Image.fromarray((image * 255.0).astype(np.uint8))
+
+    def forward(self, images):
+        with self.torch.no_grad():
+            return self.model(images, device=self.device)
+
+    def extract_mesh(self, scene_codes, resolution, chunk_size=None):
+        # The model has one chunk size for everyone. It only changes speed and
+        # memory use, so another worker switching it in between is harmless.
+        self.model.renderer.set_chunk_size(chunk_size or self.chunk_size)
+        meshes = self.model.extract_mesh(scene_codes, True, resolution=resolution)
+        return [
+            Mesh(mesh.vertices, mesh.faces, mesh.visual.vertex_colors[:, :3])
+            for mesh in meshes
+        ]
+
+
+class StubReconstructor(Reconstructor):
+    """CPU-only stand-in for TripoSR.
+
+    It turns the image into a coloured relief mesh. The fake weights are
+    sized so that loading and a forward pass cost real time and memory.
+    """
+
+    name = "stub"
+    input_size = 512
+    max_input_side = input_size
+    code_size = 64
+
+    def __init__(self, weights_mb=config.STUB_WEIGHTS_MB):
+        self.weights_mb = weights_mb
+
+    def build_weights(self):
+        features = self.code_size * self.code_size
+        hidden = max(1, self.weights_mb * 1024 * 1024 // 4 // features)
+        rng = np.random.default_rng(0)
+        return rng.standard_normal((hidden, features), dtype=np.float32) / np.sqrt(features)
+
+    def prepare_weights(self):
+        if config.SHARE_WEIGHTS:
+            shared_array(f"stub-{self.weights_mb}mb", self.build_weights)
+
+    def load(self):
+        if config.SHARE_WEIGHTS:
+            self.weights = shared_array(f"stub-{self.weights_mb}mb", self.build_weights)
+            self.weights_shared = True
+        else:
+            self.weights = self.build_weights()
+
+    def preprocess(self, image):
+        return image.convert("RGB").resize((self.input_size, self.input_size), Image.BILINEAR)
+
+    def forward(self, images):
+        # Scene code per image: a code_size x code_size grid of height + RGB
+        size = (self.code_size, self.code_size)
+        rgb = np.stack([
+            np.asarray(image.resize(size, Image.BILINEAR), dtype=np.float32) / 255.0
+            for image in images
+        ])
+        luminance = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+        # A two-layer pass through the fake weights adds some detail to the relief
+        flat = luminance.reshape(len(images), -1)
+        hidden = np.tanh(flat @ self.weights.T)
+        detail = (hidden @ self.weights).reshape(luminance.shape)
+        height = luminance + 0.05 * np.tanh(detail)
+
+        return np.concatenate([height[:, None], rgb.transpose(0, 3, 1, 2)], axis=1)
+
+    def extract_mesh(self, scene_codes, resolution, chunk_size=None):
+        size = (resolution, resolution)
+        meshes = []
+        for code in scene_codes:
+            # Float ("F" mode) images so PIL can do the bilinear upsampling
+            grids = [
+                np.asarray(Image.fromarray(np.ascontiguousarray(channel)).resize(size, Image.BILINEAR))
+                for channel in code
+            ]
+            meshes.append(relief_mesh(grids[0], np.stack(grids[1:], axis=-1)))
+        return meshes
+
+
+def relief_mesh(height, rgb):
+    # Grid of vertices in the unit square (image top at +y), displaced along z
+    rows, cols = height.shape
+    y, x = np.meshgrid(np.linspace(0.5, -0.5, rows), np.linspace(-0.5, 0.5, cols), indexing="ij")
+    vertices = np.stack([x, y, height * 0.3], axis=-1).reshape(-1, 3)
+    colors = (np.clip(rgb, 0.0, 1.0) * 255).astype(np.uint8).reshape(-1, 3)
+
+    # Two triangles per grid cell
+    index = np.arange(rows * cols).reshape(rows, cols)
+    a = index[:-1, :-1].ravel()
+    b = index[:-1, 1:].ravel()
+    c = index[1:, :-1].ravel()
+    d = index[1:, 1:].ravel()
+    faces = np.concatenate([np.stack([a, c, b], axis=1), np.stack([b, c, d], axis=1)])
+
+    return Mesh(vertices, faces, colors)
+
+
+class SubprocessReconstructor(Reconstructor):
+    """Old behaviour: a new interpreter and a full model load for every job."""
+
+    max_batch_size = 1
+
+    def __init__(self, backend=config.RECON_BACKEND):
+        self.backend = backend
+        self.name = f"subprocess:{backend}"
+        self.max_input_side = create_reconstructor("persistent", backend).max_input_side
+
+        # The foreground cache is used by the child processes, they report its
+        # counters with every result and they are added up here
+        self.foreground_stats = None
+        if config.FOREGROUND_CACHE_ENABLED:
+            self.foreground_stats = {'hits': 0, 'misses': 0, 'hit_rate': None, 'entries': None, 'bytes': None,
+                                     'max_bytes': config.FOREGROUND_CACHE_MAX_BYTES}
+        self.stats_lock = threading.Lock()
+
+    def reconstruct_batch(self, jobs):
+        results = []
+        for image, output_dir, mc_resolution, chunk_size, progress in jobs:
+            try:
+                results.append(self.reconstruct(image, output_dir, mc_resolution, progress, chunk_size))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def reconstruct(self, image, output_dir, mc_resolution=config.MC_RESOLUTION, progress=None, chunk_size=None):
+        # The child process can't report its stages, the whole run counts as inference
+        if progress:
+            progress('inference')
+
+        # The child process needs the image as a file
+        if isinstance(image, Image.Image):
+            image_path = os.path.join(output_dir, "input.png")
+            image.save(image_path)
+        else:
+            image_path = image
+
+        cmd = [
+            sys.executable,
+            os.path.abspath(__file__),
+            image_path,
+            "--output-dir", output_dir,
+            "--backend", self.backend,
+            "--mc-resolution", str(mc_resolution),
+            "--chunk-size", str(chunk_size or config.CHUNK_SIZE)
+        ]
+
+        print(f"Executing command: {' '.join(cmd)}")
+
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"TripoSR execution failed: {result.stderr}")
+
+        # The last line of stdout is the JSON summary printed by main()
+        summary = json.loads(result.stdout.strip().splitlines()[-1])
+        self.add_foreground_stats(summary.pop('foreground_cache', None))
+        return summary
+
+    def add_foreground_stats(self, child_stats):
+        # One child's lookups, and the size of the cache after its job
+        if child_stats is None or self.foreground_stats is None:
+            return
+        with self.stats_lock:
+            stats = self.foreground_stats
+            stats['hits'] += child_stats['hits']
+            stats['misses'] += child_stats['misses']
+            lookups = stats['hits'] + stats['misses']
+            stats['hit_rate'] = stats['hits'] / lookups if lookups else None
+            for name in ('entries', 'bytes', 'max_bytes'):
+                stats[name] = child_stats[name]
+
+    def foreground_cache_stats(self):
+        with self.stats_lock:
+            return dict(self.foreground_stats) if self.foreground_stats is not None else None
+
+
+def create_reconstructor(mode=config.RECON_MODE, backend=config.RECON_BACKEND):
+    if mode == "subprocess":
+        return SubprocessReconstructor(backend)
+    if mode != "persistent":
+        raise ValueError(f"Unknown RECON_MODE: {mode}")
+
+    if backend == "triposr":
+        reconstructor = TripoSRReconstructor()
+    elif backend == "stub":
+        reconstructor = StubReconstructor()
+    else:
+        raise ValueError(f"Unknown RECON_BACKEND: {backend}")
+    if config.FOREGROUND_CACHE_ENABLED:
+        reconstructor.foreground_cache = ForegroundCache()
+    return reconstructor
+
+
+# Command line entry point, used by SubprocessReconstructor.
+# Accepts the same basic arguments as TripoSR's run.py.
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("image")
+    parser.add_argument("--output-dir", default="output")
+    parser.add_argument("--backend", default=config.RECON_BACKEND, choices=["triposr", "stub"])
+    parser.add_argument("--mc-resolution", type=int, default=config.MC_RESOLUTION)
+    parser.add_argument("--chunk-size", type=int, default=config.CHUNK_SIZE)
+    args = parser.parse_args()
+
+    reconstructor = create_reconstructor("persistent", args.backend)
+
+    start = time.perf_counter()
+    reconstructor.load()
+    load_seconds = time.perf_counter() - start
+
+    result = reconstructor.reconstruct(args.image, args.output_dir, args.mc_resolution, chunk_size=args.chunk_size)
+    result['timings']['model_load'] = load_seconds
+    # Passed on to the server, see SubprocessReconstructor.add_foreground_stats()
+    if reconstructor.foreground_cache is not None:
+        result['foreground_cache'] = reconstructor.foreground_cache.stats()
+    print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
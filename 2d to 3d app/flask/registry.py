@@ -0,0 +1,193 @@
+import os
+import json
+import sqlite3
+import threading
+
+import config
+from workspace import is_valid_job_id
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    quality TEXT,
+    cached INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL NOT NULL,
+    input_bytes INTEGER,
+    vertices INTEGER,
+    faces INTEGER,
+    output_bytes INTEGER NOT NULL DEFAULT 0,
+    timings TEXT,
+    stage_timings TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_by_created ON jobs (created_at, id);
+CREATE INDEX IF NOT EXISTS jobs_by_finished ON jobs (status, finished_at);
+CREATE INDEX IF NOT EXISTS jobs_by_finished_at ON jobs (finished_at);
+CREATE TABLE IF NOT EXISTS artifacts (
+    job_id TEXT NOT NULL REFERENCES jobs (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    PRIMARY KEY (job_id, name)
+) WITHOUT ROWID;
+"""
+
+# Columns of a job row in the order SELECT_JOB returns them
+JOB_COLUMNS = ('job_id', 'status', 'quality', 'cached', 'created_at', 'started_at', 'finished_at',
+               'input_bytes', 'vertices', 'faces', 'output_bytes', 'timings', 'stage_timings', 'error')
+SELECT_JOB = ("SELECT id, status, quality, cached, created_at, started_at, finished_at, input_bytes, "
+              "vertices, faces, output_bytes, timings, stage_timings, error FROM jobs")
+
+
+class JobRegistry:
+    """SQLite index of finished jobs and the files in their directories.
+
+    A job is written in one transaction when it finishes, so a lookup by ID,
+    the newest result, a page of the history or the jobs due for cleanup are
+    index queries, whatever the number of job directories. WAL mode lets
+    several server processes share the file.
+    """
+
+    def __init__(self, path=config.REGISTRY_PATH):
+        self.path = path
+        self.local = threading.local()
+        # True when this process made the file, see import_directories()
+        self.created = not os.path.exists(path)
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        connection = self.connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+
+    def connection(self):
+        # sqlite3 connections can't be shared between threads, each one gets its own
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA foreign_keys=ON")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def add(self, job, job_dir=None):
+        """Records a finished job (done or failed) with the files in job_dir."""
+        result = job.result or {}
+        artifacts = list_artifacts(job_dir) if job_dir is not None else []
+        with self.connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO jobs (id, status, quality, cached, created_at, started_at, finished_at, "
+                "input_bytes, vertices, faces, output_bytes, timings, stage_timings, error) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job.id, job.status, job.quality, int(result.get('cached', False)), job.created_at,
+                 job.started_at, job.finished_at, job.input_bytes, result.get('vertices'), result.get('faces'),
+                 sum(size for _, size in artifacts), json.dumps(result.get('timings')),
+                 json.dumps(job.stage_timings), job.error))
+            connection.execute("DELETE FROM artifacts WHERE job_id = ?", (job.id,))
+            connection.executemany("INSERT INTO artifacts (job_id, name, bytes) VALUES (?, ?, ?)",
+                                   [(job.id, name, size) for name, size in artifacts])
+
+    def add_artifact(self, job_id, path):
+        # A file written into a finished job's directory later (STL/PLY downloads)
+        with self.connection() as connection:
+            connection.execute("INSERT OR REPLACE INTO artifacts (job_id, name, bytes) VALUES (?, ?, ?)",
+                               (job_id, os.path.basename(path), os.path.getsize(path)))
+            connection.execute("UPDATE jobs SET output_bytes = (SELECT SUM(bytes) FROM artifacts WHERE job_id = ?) "
+                               "WHERE id = ?", (job_id, job_id))
+
+    def get(self, job_id):
+        row = self.connection().execute(f"{SELECT_JOB} WHERE id = ?", (job_id,)).fetchone()
+        return job_record(row) if row is not None else None
+
+    def artifacts(self, job_id):
+        rows = self.connection().execute("SELECT name FROM artifacts WHERE job_id = ? ORDER BY name", (job_id,))
+        return [name for name, in rows]
+
+    def latest_job_id(self):
+        row = self.connection().execute(
+            "SELECT id FROM jobs WHERE status = 'done' ORDER BY finished_at DESC LIMIT 1").fetchone()
+        return row[0] if row is not None else None
+
+    def list_jobs(self, limit=50, before=None, status=None):
+        """Newest jobs first, at most limit of them. before is the ID of the
+        last job of the previous page; unknown IDs give an empty page."""
+        conditions, params = [], []
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(status)
+        if before is not None:
+            # Keyset pagination: the page starts right after the given job,
+            # however deep into the history it is
+            conditions.append("(created_at, id) < (SELECT created_at, id FROM jobs WHERE id = ?)")
+            params.append(before)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.connection().execute(f"{SELECT_JOB}{where} ORDER BY created_at DESC, id DESC LIMIT ?",
+                                         params + [limit])
+        return [job_record(row) for row in rows]
+
+    def expired(self, max_age_seconds, max_total_bytes, now):
+        """IDs of the jobs to delete: the ones finished more than max_age_seconds
+        ago, then more, oldest first, until the rest fits in max_total_bytes."""
+        connection = self.connection()
+        expired = [job_id for job_id, in connection.execute(
+            "SELECT id FROM jobs WHERE finished_at < ? ORDER BY finished_at", (now - max_age_seconds,))]
+
+        total_bytes = connection.execute(
+            "SELECT COALESCE(SUM(output_bytes), 0) FROM jobs WHERE finished_at >= ?",
+            (now - max_age_seconds,)).fetchone()[0]
+        if total_bytes > max_total_bytes:
+            rows = connection.execute(
+                "SELECT id, output_bytes FROM jobs WHERE finished_at >= ? ORDER BY finished_at",
+                (now - max_age_seconds,))
+            for job_id, size in rows:
+                if total_bytes <= max_total_bytes:
+                    break
+                expired.append(job_id)
+                total_bytes -= size
+        return expired
+
+    def remove(self, job_ids):
+        with self.connection() as connection:
+            connection.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in job_ids])
+
+    def stats(self):
+        count, total_bytes = self.connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(output_bytes), 0) FROM jobs").fetchone()
+        return {'jobs': count, 'output_bytes': total_bytes}
+
+    def import_directories(self, output_dir):
+        """Adds job directories that are not in the registry yet, for results
+        written before it existed. Returns the number of jobs added."""
+        known = {job_id for job_id, in self.connection().execute("SELECT id FROM jobs")}
+        rows, artifact_rows = [], []
+        for entry in os.scandir(output_dir):
+            if not entry.is_dir() or not is_valid_job_id(entry.name) or entry.name in known:
+                continue
+            artifacts = list_artifacts(entry.path)
+            mtime = entry.stat().st_mtime
+            status = 'done' if any(name == "mesh.obj" for name, _ in artifacts) else 'failed'
+            rows.append((entry.name, status, mtime, mtime, sum(size for _, size in artifacts)))
+            artifact_rows.extend((entry.name, name, size) for name, size in artifacts)
+
+        with self.connection() as connection:
+            connection.executemany("INSERT OR IGNORE INTO jobs (id, status, created_at, finished_at, output_bytes) "
+                                   "VALUES (?, ?, ?, ?, ?)", rows)
+            connection.executemany("INSERT OR IGNORE INTO artifacts (job_id, name, bytes) VALUES (?, ?, ?)",
+                                   artifact_rows)
+        if rows:
+            print(f"Job registry: imported {len(rows)} existing job directories")
+        return len(rows)
+
+
+def list_artifacts(job_dir):
+    # (name, size) of the files in one job directory
+    return [(entry.name, entry.stat().st_size) for entry in os.scandir(job_dir) if entry.is_file()]
+
+
+def job_record(row):
+    record = dict(zip(JOB_COLUMNS, row))
+    record['cached'] = bool(record['cached'])
+    for name in ('timings', 'stage_timings'):
+        record[name] = json.loads(record[name]) if record[name] else None
+    return record
@@ -0,0 +1,118 @@
+"""Production entry point, works on Windows and Linux.
+
+    python serve.py [--host 0.0.0.0] [--port 5000] [--threads 16]
+
+Uses cheroot (pip install cheroot) when it is installed, otherwise werkzeug's
+threaded server without the debugger and reloader. On Linux,
+gunicorn -c gunicorn.conf.py server:app runs several processes instead.
+
+Ctrl+C / SIGTERM shuts down gracefully: new uploads get a 429, queued and
+running jobs finish (up to SHUTDOWN_TIMEOUT_SECONDS), then the server stops.
+"""
+import ssl
+import sys
+import signal
+import argparse
+import threading
+
+import config
+import server
+
+# cheroot is optional
+try:
+    from cheroot import wsgi as cheroot_wsgi
+    from cheroot.ssl.builtin import BuiltinSSLAdapter
+except ImportError:
+    cheroot_wsgi = None
+
+
+class CherootServer:
+    """Thread pool with keep-alive and TLS, the same on every OS."""
+
+    def __init__(self, host, port, threads):
+        self.httpd = cheroot_wsgi.Server((host, port), server.app, numthreads=threads,
+                                         timeout=config.KEEPALIVE_SECONDS,
+                                         shutdown_timeout=config.SHUTDOWN_TIMEOUT_SECONDS)
+        if config.TLS_ENABLED:
+            self.httpd.ssl_adapter = BuiltinSSLAdapter(config.TLS_CERT_FILE, config.TLS_KEY_FILE)
+
+    def serve(self):
+        self.httpd.safe_start()
+
+    def stop(self):
+        self.httpd.stop()
+
+
+class WerkzeugServer:
+    """Fallback: one thread per connection, HTTP/1.1 so connections are kept alive."""
+
+    def __init__(self, host, port, threads):
+        from werkzeug.serving import make_server, WSGIRequestHandler
+
+        class RequestHandler(WSGIRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Idle keep-alive connections time out instead of holding a thread
+            timeout = config.KEEPALIVE_SECONDS
+
+        context = None
+        if config.TLS_ENABLED:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(config.TLS_CERT_FILE, config.TLS_KEY_FILE)
+        self.httpd = make_server(host, port, server.app, threaded=True,
+                                 request_handler=RequestHandler, ssl_context=context)
+
+    def serve(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default=config.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVER_PORT)
+    parser.add_argument("--threads", type=int, default=config.SERVER_THREADS)
+    args = parser.parse_args()
+
+    # Load the model once, before the first request is accepted
+    pool = server.get_pool()
+    pool.ready.wait()
+    if pool.load_error is not None:
+        sys.exit(1)
+
+    if cheroot_wsgi is not None:
+        httpd = CherootServer(args.host, args.port, args.threads)
+    else:
+        print("cheroot is not installed, using werkzeug's threaded server")
+        httpd = WerkzeugServer(args.host, args.port, args.threads)
+
+    stopping = threading.Event()
+
+    def shutdown():
+        # Jobs first: clients waiting on /process_image or polling /jobs/<id>
+        # still get their answers while the queue drains
+        print("Shutting down, waiting for queued and running jobs")
+        if not pool.shutdown(config.SHUTDOWN_TIMEOUT_SECONDS):
+            print("Shutdown timeout reached, queued jobs failed and running ones are dropped")
+        httpd.stop()
+
+    def on_signal(signum, frame):
+        if not stopping.is_set():
+            stopping.set()
+            threading.Thread(target=shutdown, name="shutdown").start()
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+    if hasattr(signal, "SIGBREAK"):
+        # Ctrl+Break on Windows
+        signal.signal(signal.SIGBREAK, on_signal)
+
+    scheme = "https" if config.TLS_ENABLED else "http"
+    print(f"Serving on {scheme}://{args.host}:{args.port} with {args.threads} threads "
+          f"and {pool.worker_count} reconstruction workers")
+    httpd.serve()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,176 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory
-import sys
+from flask import Flask, request, jsonify, render_template, make_response, Response, g
 import os
-import subprocess
 import json
 import ssl
+import time
+import queue
+import zipfile
+import threading
 from flask_cors import CORS
+from werkzeug.security import safe_join
+
+import config
+from batches import BatchStore, BatchScheduler, zip_images
+from build_assets import build as build_assets, MANIFEST_NAME
+from cache import MeshCache, cache_key
+from exports import export_mesh, progressive_mesh
+from http_cache import send_cached_file, conditional_page
+from jobs import JobStore
+from metrics import Registry, Counter, Callback, HistogramMetric, SIZE_BUCKETS
+from reconstruction import create_reconstructor
+from registry import JobRegistry
+from simplify import lod_file_name
+from thumbnails import thumbnail_path, thumbnail_format, THUMBNAIL_TYPES
+from uploads import UploadRequest, decode_image
+from weights import memory_usage
+from worker import WorkerPool
+from workspace import Workspaces, is_valid_job_id
 
  
 app = Flask(__name__)
+# Uploads stay in memory and are capped at MAX_UPLOAD_BYTES
+app.request_class = UploadRequest
+app.config['MAX_CONTENT_LENGTH'] = config.MAX_UPLOAD_BYTES
 CORS(app) 
 # Path to TripoSR directory
-triposr_path = r"C:\project\app15\flask\TripoSR"
+triposr_path = config.TRIPOSR_PATH
+
+# The worker pool loads the model once and is shared by all requests
+worker_pool = None
+pool_lock = threading.Lock()
+
+def get_pool(resume_batches=True):
+    # resume_batches=False leaves unfinished batches on disk alone, see bulk.py
+    global worker_pool
+    with pool_lock:
+        if worker_pool is None:
+            worker_pool = WorkerPool(create_reconstructor())
+            worker_pool.start()
+            # Jobs whose directories are removed are forgotten as well
+            workspaces.start_cleanup_thread(on_removed=job_store.remove)
+            batch_scheduler.start(resume=resume_batches)
+            metrics.register(HistogramMetric('reconstruction_batch_size', 'Images per forward pass',
+                                             histogram=worker_pool.batch_sizes))
+            metrics.register(HistogramMetric('reconstruction_batch_seconds', 'Time to run one batch',
+                                             histogram=worker_pool.batch_latency))
+    return worker_pool
+
+def busy_response():
+    # Queue is full: tell the client when to come back instead of queueing more work
+    response = jsonify({'error': 'Server busy, try again later'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(get_pool().retry_after())
+    return response
+
+# Reconstruction jobs and their per-job directories. Running jobs are in
+# job_store, finished ones are indexed in job_registry (shared by all processes).
+job_store = JobStore()
+job_registry = JobRegistry()
+workspaces = Workspaces(job_registry)
+if job_registry.created:
+    job_registry.import_directories(workspaces.output_dir)
+latest_job_id = None
+
+# Finished results by content hash, None when caching is turned off
+mesh_cache = MeshCache() if config.MESH_CACHE_ENABLED else None
+
+def reconstruction_params(mc_resolution=config.MC_RESOLUTION):
+    # Everything that changes the mesh produced for a given image
+    return {
+        'backend': config.RECON_BACKEND,
+        'mc_resolution': mc_resolution,
+        'remove_background': config.REMOVE_BACKGROUND,
+        'foreground_ratio': config.FOREGROUND_RATIO
+    }
+
+# Metrics for GET /metrics, in the Prometheus text format
+metrics = Registry()
+http_requests = metrics.register(Counter('http_requests_total', 'HTTP requests', ['method', 'endpoint', 'status']))
+http_seconds = metrics.register(HistogramMetric('http_request_duration_seconds', 'Time to build the response', ['endpoint']))
+http_bytes = metrics.register(HistogramMetric('http_response_bytes', 'Response body size', ['endpoint'], buckets=SIZE_BUCKETS))
+upload_seconds = metrics.register(HistogramMetric('upload_seconds', 'Time to receive and read an uploaded image'))
+upload_bytes = metrics.register(HistogramMetric('upload_bytes', 'Size of uploaded images', buckets=SIZE_BUCKETS))
+jobs_finished = metrics.register(Counter('jobs_finished_total', 'Finished jobs', ['status', 'cached']))
+jobs_started = metrics.register(Counter('jobs_started_total', 'Started jobs by quality preset', ['quality', 'downgraded']))
+job_seconds = metrics.register(HistogramMetric('job_duration_seconds', 'Time from upload to finished job', ['cached']))
+stage_seconds = metrics.register(HistogramMetric('reconstruction_stage_seconds', 'Time spent in each reconstruction stage', ['stage']))
+mesh_bytes = metrics.register(HistogramMetric('mesh_file_bytes', 'Size of written mesh files', ['format', 'lod'], buckets=SIZE_BUCKETS))
+
+# Stage timings of a job that go into reconstruction_stage_seconds
+# (model_load is only there in subprocess mode)
+METRIC_STAGES = ('decode', 'queue_wait', 'model_load', 'background_removal', 'preprocess', 'inference',
+                 'mesh_extraction', 'simplify', 'export', 'thumbnails')
+
+def pool_stat(name):
+    # Worker pool numbers, None (not exported) until the pool exists
+    return worker_pool.stats()[name] if worker_pool is not None else None
+
+def cache_stat(name):
+    return mesh_cache.stats()[name] if mesh_cache is not None else None
+
+def foreground_cache_stats():
+    # Kept by the reconstructor (added up from the child processes in
+    # subprocess mode), None when the cache is off
+    return worker_pool.reconstructor.foreground_cache_stats() if worker_pool is not None else None
+
+def foreground_cache_stat(name):
+    stats = foreground_cache_stats()
+    return stats[name] if stats is not None else None
+
+for name, help, stat, kind in [
+    ('reconstruction_queue_depth', 'Jobs waiting for a worker', 'queued', 'gauge'),
+    ('reconstruction_queue_capacity', 'Jobs allowed to wait', 'queue_size', 'gauge'),
+    ('reconstruction_workers', 'Reconstruction worker threads', 'workers', 'gauge'),
+    ('reconstruction_workers_busy', 'Workers running a batch', 'busy', 'gauge'),
+    ('reconstruction_worker_utilisation', 'Share of workers running a batch', 'utilisation', 'gauge'),
+    ('reconstruction_model_load_seconds', 'Time the model took to load at startup', 'cold_start_seconds', 'gauge'),
+    ('reconstruction_jobs_completed_total', 'Jobs the model finished', 'jobs_completed', 'counter'),
+    ('reconstruction_jobs_failed_total', 'Jobs the model failed on', 'jobs_failed', 'counter'),
+]:
+    metrics.register(Callback(name, help, lambda stat=stat: pool_stat(stat), type=kind))
+
+def process_memory():
+    usage = memory_usage()
+    return {(kind,): size for kind, size in usage.items()} if usage is not None else {}
+
+metrics.register(Callback('process_memory_bytes', 'Resident memory of this process: only in it (uss), '
+                          'shared with other processes (shared), its share of the total (pss), all (rss)',
+                          process_memory, labels=['kind']))
+
+for name, help, stat, kind in [
+    ('mesh_cache_hits_total', 'Uploads answered from the result cache', 'hits', 'counter'),
+    ('mesh_cache_misses_total', 'Uploads that needed a reconstruction', 'misses', 'counter'),
+    ('mesh_cache_entries', 'Results in the cache', 'entries', 'gauge'),
+    ('mesh_cache_bytes', 'Disk space used by the cache', 'bytes', 'gauge'),
+]:
+    metrics.register(Callback(name, help, lambda stat=stat: cache_stat(stat), type=kind))
+
+for name, help, stat, kind in [
+    ('foreground_cache_hits_total', 'Jobs that skipped background removal', 'hits', 'counter'),
+    ('foreground_cache_misses_total', 'Jobs that ran background removal', 'misses', 'counter'),
+    ('foreground_cache_entries', 'Foreground images in the cache', 'entries', 'gauge'),
+    ('foreground_cache_bytes', 'Disk space used by the foreground cache', 'bytes', 'gauge'),
+]:
+    metrics.register(Callback(name, help, lambda stat=stat: foreground_cache_stat(stat), type=kind))
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    endpoint = request.endpoint or 'unmatched'
+    http_requests.inc(method=request.method, endpoint=endpoint, status=response.status_code)
+    if 'request_start' in g:
+        http_seconds.observe(time.perf_counter() - g.request_start, endpoint=endpoint)
+    # Streamed responses (event streams) have no length
+    if response.content_length is not None:
+        http_bytes.observe(response.content_length, endpoint=endpoint)
+    return response
+
+@app.route('/metrics')
+def get_metrics():
+    return Response(metrics.render(), content_type=metrics.content_type)
 
 # Create templates directory for HTML templates
 os.makedirs(os.path.join(os.path.dirname(__file__), "templates"), exist_ok=True)
@@ -23,6 +183,10 @@ def add_cors_headers(response):
     response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
     return response
 
+@app.errorhandler(413)
+def upload_too_large(e):
+    return jsonify({'error': f"Upload too large, the limit is {request.max_content_length // (1024 * 1024)} MB"}), 413
+
 @app.route('/process_image', methods=['POST', 'OPTIONS'])
 def process_image():
     # Handle preflight OPTIONS request
@@ -32,813 +196,619 @@ def process_image():
     if 'image' not in request.files:
         return jsonify({'error': 'No image provided'}), 400
         
-    file = request.files['image']
-    
-    # Save the uploaded image temporarily
-    temp_dir = os.path.join(triposr_path, "temp")
-    os.makedirs(temp_dir, exist_ok=True)
-    temp_path = os.path.join(temp_dir, "temp_image.jpg")
-    file.save(temp_path)
-    
-    # Create output directory
-    output_dir = os.path.join(triposr_path, "output")
-    os.makedirs(output_dir, exist_ok=True)
-    
     try:
-        # Run TripoSR as a subprocess using the command pattern
-        cmd = [
-            sys.executable,  # Python executable
-            os.path.join(triposr_path, "run.py"),  # Path to run.py
-            temp_path,  # Path to input image
-            "--output-dir", output_dir  # Output directory
-        ]
-        
-        print(f"Executing command: {' '.join(cmd)}")
-        
-        # Execute the command
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            cwd=triposr_path  # Set working directory to TripoSR path
-        )
-        
-        if result.returncode != 0:
-            print(f"Error running TripoSR: {result.stderr}")
-            return jsonify({'error': f"TripoSR execution failed: {result.stderr}"}), 500
-        
-        # Get the output file path (assuming it's the same filename in the output directory)
-        output_filename = os.path.basename(temp_path)
-        output_base = os.path.splitext(output_filename)[0]
+        job = submit_job(request.files['image'], *quality_request())
+    except queue.Full:
+        return busy_response()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Exception: {str(e)}")
+        return jsonify({'error': str(e)}), 500
         
-        # Look for output files in the output directory
-        output_files = []
-        for file in os.listdir(output_dir):
-            if file.startswith(output_base) or "temp_image" in file:
-                output_files.append(os.path.join(output_dir, file))
+    # Same job as POST /jobs, but wait for it in this request
+    job.wait()
+    if job.status != 'done':
+        return jsonify({'error': job.error}), 500
         
-        response_data = {
-            'success': True,
-            'message': result.stdout,
-            'output_files': output_files
-        }
+    timings = job.result['timings']
+    response_data = job_status(job)
+    response_data['success'] = True
+    response_data['message'] = (f"Mesh with {job.result['vertices']} vertices and {job.result['faces']} faces "
+                                f"generated in {timings['job']:.2f}s")
+    
+    return jsonify(response_data)
+
+# Asynchronous job API: POST /jobs returns a job ID straight away, the client
+# then polls GET /jobs/<id> and fetches GET /jobs/<id>/mesh when it is done
+@app.route('/jobs', methods=['POST', 'OPTIONS'])
+def create_job():
+    # Handle preflight OPTIONS request
+    if request.method == 'OPTIONS':
+        return '', 200
         
-        return jsonify(response_data)
+    if 'image' not in request.files:
+        return jsonify({'error': 'No image provided'}), 400
         
+    try:
+        job = submit_job(request.files['image'], *quality_request())
+    except queue.Full:
+        return busy_response()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Exception: {str(e)}")
         return jsonify({'error': str(e)}), 500
-    finally:
-        # Attempt to clean up the temporary file
+    
+    return jsonify(job_status(job)), 202
+
+def quality_request():
+    # "quality" and "max_latency_ms" from the form or the query string,
+    # raises ValueError for values that make no sense
+    quality = request.values.get('quality', config.DEFAULT_QUALITY)
+    if quality not in config.QUALITY_PRESETS:
+        raise ValueError(f"Unknown quality {quality!r}, use one of {', '.join(config.QUALITY_PRESETS)}")
+    max_latency_ms = request.values.get('max_latency_ms')
+    if max_latency_ms is not None:
         try:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-        except Exception as e:
-            print(f"Failed to remove temporary file: {e}")
+            max_latency_ms = float(max_latency_ms)
+        except ValueError:
+            raise ValueError("max_latency_ms must be a number")
+        if max_latency_ms <= 0:
+            raise ValueError("max_latency_ms must be positive")
+    return quality, max_latency_ms
 
-# Add static route to serve the obj file specifically
-@app.route('/get_model')
-def get_model():
-    obj_file_path = os.path.join(triposr_path, "output", "0", "mesh.obj")
-    print(f"Serving OBJ file from: {obj_file_path}")
-    
-    if not os.path.exists(obj_file_path):
-        print(f"ERROR: OBJ file not found at: {obj_file_path}")
-        return jsonify({'error': 'Model file not found'}), 404
-    
-    # Log that we're serving the file
-    print(f"Successfully serving OBJ file")
-    
-    # Return the actual file
-    return send_from_directory(os.path.join(triposr_path, "output", "0"), "mesh.obj")
+def choose_quality(quality, max_latency_ms):
+    # The asked-for preset, or with a latency budget the best one up to it
+    # that the queue lets finish in time (the cheapest if none does).
+    # Returns the preset name and its estimated seconds (None without data yet).
+    names = list(config.QUALITY_PRESETS)
+    estimate = None
+    for name in reversed(names[:names.index(quality) + 1]):
+        if worker_pool is not None:
+            estimate = worker_pool.estimate_latency(config.QUALITY_PRESETS[name]['mc_resolution'])
+        if max_latency_ms is None or estimate is None or estimate * 1000 <= max_latency_ms:
+            return name, estimate
+    return names[0], estimate
 
-# Add route for the 3D viewer
-@app.route('/Tviewer')
-def viewer():
-    obj_file_path = os.path.join(triposr_path, "output", "0", "mesh.obj")
-    
-    # Check if the file exists
-    if not os.path.exists(obj_file_path):
-        return "Model file not found at " + obj_file_path + ". Process an image first.", 404
-        
-    return render_template('viewer.html')
-
-# Create the viewer.html template
-with open(os.path.join(os.path.dirname(__file__), "templates", "viewer.html"), "w") as f:
-    f.write("""<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>3D OBJ Viewer</title>
-    <style>
-        body { margin: 0; padding: 0; overflow: hidden; background-color: #111; }
-        canvas { width: 100%; height: 100%; display: block; }
-        #info {
-            position: absolute;
-            top: 10px;
-            width: 100%;
-            text-align: center;
-            color: white;
-            font-family: Arial, sans-serif;
-            pointer-events: none;
-            z-index: 100;
-            font-size: 14px;
-        }
-        #debug {
-            position: absolute;
-            top: 40px;
-            width: 100%;
-            text-align: center;
-            color: #ff8800;
-            font-family: monospace;
-            pointer-events: none;
-            z-index: 100;
-            font-size: 12px;
-        }
-        #controls {
-            position: absolute;
-            bottom: 20px;
-            left: 20px;
-            background: rgba(0,0,0,0.7);
-            padding: 10px;
-            border-radius: 5px;
-            color: white;
-            font-family: Arial, sans-serif;
-            z-index: 100;
-        }
-        button {
-            margin: 5px;
-            padding: 5px 10px;
-            cursor: pointer;
-        }
-        input[type="range"] {
-            width: 100px;
-            margin: 0 10px;
-        }
-        .toggle-button {
-            background-color: #444;
-            color: white;
-            border: none;
-            border-radius: 3px;
-            padding: 5px 10px;
-            cursor: pointer;
-            transition: background-color 0.3s;
-        }
-        .toggle-button.active {
-            background-color: #4CAF50;
-        }
-        .control-group {
-            margin-bottom: 10px;
-        }
-        .fullscreen-button {
-            position: absolute;
-            top: 10px;
-            right: 10px;
-            background-color: rgba(0,0,0,0.7);
-            color: white;
-            border: none;
-            border-radius: 5px;
-            padding: 8px 12px;
-            cursor: pointer;
-            z-index: 200;
-        }
-        .export-button {
-            background-color: #4CAF50;
-            color: white;
-            border: none;
-            border-radius: 3px;
-            padding: 5px 10px;
-            cursor: pointer;
-            transition: background-color 0.3s;
-        }
-        .export-button:hover {
-            background-color: #45a049;
-        }
-        .dropdown {
-            position: relative;
-            display: inline-block;
-        }
-        .dropdown-content {
-            display: none;
-            position: absolute;
-            right: 0;
-            bottom: 100%;
-            background-color: rgba(0,0,0,0.9);
-            min-width: 160px;
-            box-shadow: 0px 8px 16px 0px rgba(0,0,0,0.5);
-            z-index: 201;
-            border-radius: 5px;
-            margin-bottom: 5px;
-        }
-        .dropdown-content a {
-            color: white;
-            padding: 8px 16px;
-            text-decoration: none;
-            display: block;
-            cursor: pointer;
-        }
-        .dropdown-content a:hover {
-            background-color: rgba(255,255,255,0.1);
-        }
-        .dropdown:hover .dropdown-content {
-            display: block;
-        }
-        .notification {
-            position: fixed;
-            top: 20px;
-            left: 50%;
-            transform: translateX(-50%);
-            background-color: rgba(0,0,0,0.8);
-            color: white;
-            padding: 10px 20px;
-            border-radius: 5px;
-            z-index: 300;
-            display: none;
-        }
-        .notification.success {
-            border-left: 4px solid #4CAF50;
-        }
-        .notification.error {
-            border-left: 4px solid #f44336;
-        }
-        .controls-buttons {
-            display: flex;
-            flex-wrap: wrap;
-            align-items: center;
-        }
-    </style>
-</head>
-<body>
-    <div id="info">Three.js OBJ Viewer</div>
-    <div id="debug"></div>
-    <div id="notification" class="notification"></div>
-    
-    <button id="fullscreenBtn" class="fullscreen-button">
-        <span id="fullscreenIcon">⛶</span>
-    </button>
+def submit_job(file, quality=config.DEFAULT_QUALITY, max_latency_ms=None):
+    data = file.read()
+    # From the start of the request, so it includes receiving and parsing the body
+    upload_seconds.observe(time.perf_counter() - g.request_start)
+    upload_bytes.observe(len(data))
+    return start_job(data, quality, max_latency_ms)
+
+# Raises queue.Full when the worker queue is full and ValueError for data
+# that isn't an image
+def start_job(data, quality=config.DEFAULT_QUALITY, max_latency_ms=None):
+    chosen, estimated_seconds = choose_quality(quality, max_latency_ms)
+    jobs_started.inc(quality=chosen, downgraded='true' if chosen != quality else 'false')
+    preset = config.QUALITY_PRESETS[chosen]
+    key = cache_key(data, reconstruction_params(preset['mc_resolution']))
+    job = job_store.create()
+    job.quality = chosen
+    job.estimated_seconds = estimated_seconds
+    job.input_bytes = len(data)
     
-    <div id="controls">
-        <div class="control-group">
-            <label>Scale: </label>
-            <input type="range" id="scale" min="0.1" max="2" step="0.1" value="1">
-            <span id="scaleValue">1.0</span>
-        </div>
-        <div class="control-group">
-            <label>View Mode: </label>
-            <button id="normalBtn" class="toggle-button active">Normal</button>
-            <button id="wireframeBtn" class="toggle-button">Wireframe</button>
-            <button id="hybridBtn" class="toggle-button">Hybrid</button>
-        </div>
-        <div class="control-group">
-            <label>Lighting: </label>
-            <button id="lightingBtn" class="toggle-button active">On</button>
-            <input type="range" id="lightIntensity" min="0" max="2" step="0.1" value="1">
-            <span id="lightValue">1.0</span>
-        </div>
-        <div class="control-group controls-buttons">
-            <button id="resetBtn">Reset View</button>
-            <div class="dropdown">
-                <button class="export-button">Export</button>
-                <div class="dropdown-content">
-                    <a id="exportOBJ">OBJ Format</a>
-                    <a id="exportSTL">STL Format</a>
-                    <a id="exportGLTF">GLTF Format</a>
-                    <a id="exportPLY">PLY Format</a>
-                    <a id="exportScreenshot">Screenshot (PNG)</a>
-                </div>
-            </div>
-        </div>
-    </div>
+    # Each job works in its own directory, nothing is shared between jobs
+    job_dir = workspaces.create(job.id)
+        
+    # The same image was reconstructed before: reuse its outputs
+    if mesh_cache is not None:
+        start = time.perf_counter()
+        record = mesh_cache.get(key, job_dir)
+        if record is not None:
+            lookup_seconds = time.perf_counter() - start
+            result = {
+                'mesh_path': os.path.join(job_dir, "mesh.obj"),
+                'vertices': record['vertices'],
+                'faces': record['faces'],
+                'lods': record.get('lods'),
+                'cached': True,
+                'timings': {'cache_lookup': lookup_seconds, 'queue_wait': 0.0, 'job': lookup_seconds}
+            }
+            finish_job(job, result=result)
+            return job
     
-    <!-- Import Three.js libraries using ES modules -->
-    <script type="importmap">
-    {
-        "imports": {
-            "three": "https://cdnjs.cloudflare.com/ajax/libs/three.js/0.157.0/three.module.min.js",
-            "three/addons/": "https://cdn.jsdelivr.net/npm/three@0.157.0/examples/jsm/"
-        }
-    }
-    </script>
+    try:
+        # Decode the upload once, already shrunk to what the model needs, and
+        # hand the image to the worker without writing it to disk
+        pool = get_pool()
+        start = time.perf_counter()
+        image = decode_image(data, pool.reconstructor.max_input_side)
+        decode_seconds = time.perf_counter() - start
+        future = pool.submit(image, job_dir, preset['mc_resolution'], progress=job.set_stage,
+                             chunk_size=preset['chunk_size'])
+    except Exception:
+        job_store.remove(job.id)
+        workspaces.discard(job.id)
+        raise
+        
+    future.add_done_callback(lambda f: job_done(job, f, key, decode_seconds))
+    return job
+
+def job_done(job, future, key, decode_seconds):
+    error = future.exception()
+    if error is not None:
+        finish_job(job, error=error)
+    else:
+        result = future.result()
+        result['timings']['decode'] = decode_seconds
+        finish_job(job, result=result, key=key)
+
+def finish_job(job, result=None, error=None, key=None):
+    global latest_job_id
     
-    <script type="module">
-        import * as THREE from 'three';
-        import { OrbitControls } from 'three/addons/controls/OrbitControls.js';
-        import { OBJLoader } from 'three/addons/loaders/OBJLoader.js';
-        import { OBJExporter } from 'three/addons/exporters/OBJExporter.js';
-        import { STLExporter } from 'three/addons/exporters/STLExporter.js';
-        import { GLTFExporter } from 'three/addons/exporters/GLTFExporter.js';
-        import { PLYExporter } from 'three/addons/exporters/PLYExporter.js';
-        
-        // Debug element
-        const debugElement = document.getElementById('debug');
-        const notificationElement = document.getElementById('notification');
-        
-        // Initialize Three.js scene
-        const scene = new THREE.Scene();
-        scene.background = new THREE.Color(0x111111);
-        
-        // Add ambient light
-        const ambientLight = new THREE.AmbientLight(0xffffff, 0.5);
-        scene.add(ambientLight);
-        
-        // Add directional lights
-        const directionalLight = new THREE.DirectionalLight(0xffffff, 0.8);
-        directionalLight.position.set(1, 1, 1);
-        scene.add(directionalLight);
-        
-        const directionalLight2 = new THREE.DirectionalLight(0xffffff, 0.5);
-        directionalLight2.position.set(-1, -1, -1);
-        scene.add(directionalLight2);
-        
-        // Add point lights for better illumination
-        const pointLight1 = new THREE.PointLight(0xffffff, 0.5);
-        pointLight1.position.set(5, 5, 5);
-        scene.add(pointLight1);
-        
-        const pointLight2 = new THREE.PointLight(0xffffff, 0.3);
-        pointLight2.position.set(-5, -3, 2);
-        scene.add(pointLight2);
-        
-        // Store all lights in an array for easy manipulation
-        const lights = [ambientLight, directionalLight, directionalLight2, pointLight1, pointLight2];
-        
-        // Set up camera
-        const camera = new THREE.PerspectiveCamera(75, window.innerWidth / window.innerHeight, 0.1, 1000);
-        camera.position.z = 5;
-        
-        // Set up renderer
-        const renderer = new THREE.WebGLRenderer({ antialias: true, preserveDrawingBuffer: true });
-        renderer.setSize(window.innerWidth, window.innerHeight);
-        renderer.setPixelRatio(window.devicePixelRatio);
-        document.body.appendChild(renderer.domElement);
-        
-        // Add orbit controls for rotation and zoom
-        const controls = new OrbitControls(camera, renderer.domElement);
-        controls.enableDamping = true;
-        controls.dampingFactor = 0.25;
-        controls.enableZoom = true;
-        
-        // Variable to store the loaded model
-        let model;
-        let modelMeshes = [];
-        
-        // Add a grid helper for reference
-        const gridHelper = new THREE.GridHelper(10, 10);
-        scene.add(gridHelper);
-        
-        // Add axes helper
-        const axesHelper = new THREE.AxesHelper(5);
-        scene.add(axesHelper);
-        
-        // OBJ file path
-        const objFilePath = '/get_model';
-        console.log(`Attempting to load model from: ${objFilePath}`);
-        debugElement.textContent = `Attempting to load model from: ${objFilePath}`;
-        
-        // Load OBJ file
-        const objLoader = new OBJLoader();
-        objLoader.load(objFilePath, 
-            // Success callback
-            function(object) {
-                console.log('Model loaded successfully');
-                debugElement.textContent = 'Model loaded successfully';
-                model = object;
-                
-                // Center the model
-                const box = new THREE.Box3().setFromObject(object);
-                const center = box.getCenter(new THREE.Vector3());
-                const size = box.getSize(new THREE.Vector3());
-                
-                console.log('Model dimensions:', size);
-                console.log('Model center:', center);
-                
-                // Set model position to center
-                object.position.x = -center.x;
-                object.position.y = -center.y;
-                object.position.z = -center.z;
-                
-                // Add a default material if none exists and store meshes
-                object.traverse(function(child) {
-                    if (child instanceof THREE.Mesh) {
-                        modelMeshes.push(child);
-                        
-                        if (!child.material) {
-                            child.material = new THREE.MeshStandardMaterial({
-                                color: 0xcccccc,
-                                metalness: 0.1,
-                                roughness: 0.7,
-                            });
-                        }
-                        
-                        // Store the original material for switching between view modes
-                        child.userData.originalMaterial = child.material.clone();
-                        
-                        console.log('Mesh found in model:', child);
-                    }
-                });
-                
-                // Add to scene
-                scene.add(object);
-                
-                // Adjust camera position based on model size
-                const maxDim = Math.max(size.x, size.y, size.z);
-                camera.position.z = maxDim * 2;
-                camera.lookAt(0, 0, 0);
-                
-                // Update controls
-                controls.update();
-                
-                // Enable export buttons
-                document.querySelectorAll('.export-button, .dropdown-content a').forEach(button => {
-                    button.classList.add('active');
-                });
-            }, 
-            // Progress callback
-            function(xhr) {
-                const percentComplete = xhr.loaded / xhr.total * 100;
-                console.log(`Loading: ${Math.round(percentComplete)}%`);
-                debugElement.textContent = `Loading: ${Math.round(percentComplete)}%`;
-            },
-            // Error callback
-            function(error) {
-                console.error('Error loading model:', error);
-                debugElement.textContent = `Error loading model: ${error.message || 'Unknown error'}`;
-                document.getElementById('info').textContent = 'Error loading model';
-                document.getElementById('info').style.color = 'red';
-            }
-        );
-        
-        // Handle window resize
-        window.addEventListener('resize', function() {
-            camera.aspect = window.innerWidth / window.innerHeight;
-            camera.updateProjectionMatrix();
-            renderer.setSize(window.innerWidth, window.innerHeight);
-        });
-        
-        // Handle scale control
-        const scaleSlider = document.getElementById('scale');
-        const scaleValue = document.getElementById('scaleValue');
-        
-        scaleSlider.addEventListener('input', function() {
-            const value = parseFloat(this.value);
-            scaleValue.textContent = value.toFixed(1);
-            
-            if (model) {
-                model.scale.set(value, value, value);
-            }
-        });
-        
-        // View mode control functions
-        function setNormalView() {
-            if (!modelMeshes.length) return;
-            
-            modelMeshes.forEach(mesh => {
-                mesh.material = mesh.userData.originalMaterial.clone();
-            });
-            
-            // Update buttons
-            document.getElementById('normalBtn').classList.add('active');
-            document.getElementById('wireframeBtn').classList.remove('active');
-            document.getElementById('hybridBtn').classList.remove('active');
-        }
-        
-        function setWireframeView() {
-            if (!modelMeshes.length) return;
-            
-            modelMeshes.forEach(mesh => {
-                mesh.material = new THREE.MeshBasicMaterial({
-                    color: 0x00ff00,
-                    wireframe: true
-                });
-            });
-            
-            // Update buttons
-            document.getElementById('normalBtn').classList.remove('active');
-            document.getElementById('wireframeBtn').classList.add('active');
-            document.getElementById('hybridBtn').classList.remove('active');
-        }
-        
-        function setHybridView() {
-            if (!modelMeshes.length) return;
-            
-            modelMeshes.forEach(mesh => {
-                // Clone the original material
-                const material = mesh.userData.originalMaterial.clone();
-                
-                // Create a wireframe material
-                const wireframeMaterial = new THREE.MeshBasicMaterial({
-                    color: 0x00ff00,
-                    wireframe: true,
-                    transparent: true,
-                    opacity: 0.3
-                });
-                
-                // Create a multi-material
-                mesh.material = [material, wireframeMaterial];
-            });
-            
-            // Update buttons
-            document.getElementById('normalBtn').classList.remove('active');
-            document.getElementById('wireframeBtn').classList.remove('active');
-            document.getElementById('hybridBtn').classList.add('active');
-        }
-        
-        // Add event listeners for view mode buttons
-        document.getElementById('normalBtn').addEventListener('click', setNormalView);
-        document.getElementById('wireframeBtn').addEventListener('click', setWireframeView);
-        document.getElementById('hybridBtn').addEventListener('click', setHybridView);
-        
-        // Lighting control
-        const lightingBtn = document.getElementById('lightingBtn');
-        const lightIntensity = document.getElementById('lightIntensity');
-        const lightValue = document.getElementById('lightValue');
-        
-        // Toggle lighting on/off
-        lightingBtn.addEventListener('click', function() {
-            const isActive = this.classList.contains('active');
-            
-            if (isActive) {
-                // Turn off lights
-                lights.forEach(light => {
-                    light.intensity = 0;
-                });
-                this.classList.remove('active');
-            } else {
-                // Turn on lights
-                const intensity = parseFloat(lightIntensity.value);
-                updateLightIntensity(intensity);
-                this.classList.add('active');
-            }
-        });
-        
-        // Update light intensity
-        function updateLightIntensity(value) {
-            lightValue.textContent = value.toFixed(1);
-            
-            if (lightingBtn.classList.contains('active')) {
-                ambientLight.intensity = value * 0.5;
-                directionalLight.intensity = value * 0.8;
-                directionalLight2.intensity = value * 0.5;
-                pointLight1.intensity = value * 0.5;
-                pointLight2.intensity = value * 0.3;
-            }
-        }
-        
-        lightIntensity.addEventListener('input', function() {
-            const value = parseFloat(this.value);
-            updateLightIntensity(value);
-        });
-        
-        // Reset button
-        document.getElementById('resetBtn').addEventListener('click', function() {
-            if (model) {
-                model.scale.set(1, 1, 1);
-                scaleSlider.value = 1;
-                scaleValue.textContent = "1.0";
-                
-                // Reset lighting
-                lightIntensity.value = 1;
-                updateLightIntensity(1);
-                lightingBtn.classList.add('active');
-                
-                // Reset to normal view
-                setNormalView();
-                
-                // Reset camera and controls
-                controls.reset();
-            }
-        });
-        
-        // Fullscreen handling
-        const fullscreenBtn = document.getElementById('fullscreenBtn');
-        const fullscreenIcon = document.getElementById('fullscreenIcon');
-        
-        fullscreenBtn.addEventListener('click', toggleFullScreen);
-        
-        function toggleFullScreen() {
-            if (!document.fullscreenElement) {
-                document.documentElement.requestFullscreen().catch(err => {
-                    console.error(`Error attempting to enable full-screen mode: ${err.message}`);
-                });
-                fullscreenIcon.textContent = '⛶';
-            } else {
-                if (document.exitFullscreen) {
-                    document.exitFullscreen();
-                    fullscreenIcon.textContent = '⛶';
-                }
-            }
-        }
-        
-        // Handle fullscreen change
-        document.addEventListener('fullscreenchange', function() {
-            if (document.fullscreenElement) {
-                fullscreenIcon.textContent = '✕';
-            } else {
-                fullscreenIcon.textContent = '⛶';
-            }
-        });
-        
-        // Show notification
-        function showNotification(message, type = 'success') {
-            const notification = document.getElementById('notification');
-            notification.textContent = message;
-            notification.className = `notification ${type}`;
-            notification.style.display = 'block';
-            
-            setTimeout(() => {
-                notification.style.display = 'none';
-            }, 3000);
-        }
-        
-        // Save file helper function
-        function saveFile(content, fileName, fileType) {
-            const blob = new Blob([content], { type: fileType });
-            const link = document.createElement('a');
-            link.href = URL.createObjectURL(blob);
-            link.download = fileName;
-            link.click();
-            URL.revokeObjectURL(link.href);
-        }
-        
-        // Export functions
-        function exportOBJ() {
-            if (!model) {
-                showNotification('No model loaded to export', 'error');
-                return;
-            }
-            
-            try {
-                const exporter = new OBJExporter();
-                const result = exporter.parse(model);
-                saveFile(result, 'model.obj', 'text/plain');
-                showNotification('OBJ file exported successfully');
-            } catch (error) {
-                console.error('Error exporting OBJ:', error);
-                showNotification('Error exporting OBJ: ' + error.message, 'error');
-            }
-        }
-        
-        function exportSTL() {
-            if (!model) {
-                showNotification('No model loaded to export', 'error');
-                return;
-            }
+    if error is None:
+        try:
+            # Move the finished outputs into place before anyone is told the job is done
+            job_dir = workspaces.commit(job.id)
+            result['mesh_path'] = os.path.join(job_dir, os.path.basename(result['mesh_path']))
+        except Exception as e:
+            error = e
             
-            try {
-                const exporter = new STLExporter();
-                const result = exporter.parse(model, { binary: true });
-                saveFile(result, 'model.stl', 'application/octet-stream');
-                showNotification('STL file exported successfully');
-            } catch (error) {
-                console.error('Error exporting STL:', error);
-                showNotification('Error exporting STL: ' + error.message, 'error');
-            }
-        }
-        
-        function exportGLTF() {
-            if (!model) {
-                showNotification('No model loaded to export', 'error');
-                return;
-            }
+    if error is not None:
+        print(f"Job {job.id} failed: {error}")
+        workspaces.discard(job.id)
+        job.finish(error=error)
+        register_job(job)
+        jobs_finished.inc(status='failed', cached='false')
+        return
+        
+    # Fresh results go into the cache (everything except the upload itself)
+    if mesh_cache is not None and key is not None:
+        try:
+            outputs = [name for name in os.listdir(job_dir) if not name.startswith("input")]
+            record = {'vertices': result['vertices'], 'faces': result['faces'], 'lods': result.get('lods')}
+            mesh_cache.put(key, job_dir, outputs, record)
+        except Exception as e:
+            print(f"Failed to cache result of job {job.id}: {e}")
+        
+    timings = result['timings']
+    print(f"Job {job.id} finished in {timings['job']:.2f}s (waited {timings['queue_wait']:.2f}s in queue)")
+    job.finish(result=result)
+    register_job(job, job_dir)
+    latest_job_id = job.id
+    record_job_metrics(job, job_dir)
+
+def register_job(job, job_dir=None):
+    # After job.finish() so the row has the final status and times. Until it
+    # is written, lookups of the job are still answered from job_store.
+    try:
+        job_registry.add(job, job_dir)
+    except Exception as e:
+        print(f"Failed to register job {job.id}: {e}")
+
+def record_job_metrics(job, job_dir):
+    cached = 'true' if job.result.get('cached') else 'false'
+    jobs_finished.inc(status='done', cached=cached)
+    job_seconds.observe(job.finished_at - job.created_at, cached=cached)
+    for stage in (METRIC_STAGES if cached == 'false' else ('cache_lookup',)):
+        if stage in job.result['timings']:
+            stage_seconds.observe(job.result['timings'][stage], stage=stage)
             
-            try {
-                const exporter = new GLTFExporter();
-                exporter.parse(
-                    model,
-                    function(result) {
-                        if (result instanceof ArrayBuffer) {
-                            saveFile(result, 'model.glb', 'application/octet-stream');
-                        } else {
-                            const output = JSON.stringify(result, null, 2);
-                            saveFile(output, 'model.gltf', 'application/json');
-                        }
-                        showNotification('GLTF file exported successfully');
-                    },
-                    function(error) {
-                        console.error('Error exporting GLTF:', error);
-                        showNotification('Error exporting GLTF: ' + error.message, 'error');
-                    },
-                    { binary: false }
-                );
-            } catch (error) {
-                console.error('Error exporting GLTF:', error);
-                showNotification('Error exporting GLTF: ' + error.message, 'error');
-            }
-        }
+    # Cache hits didn't write anything new
+    if cached == 'false':
+        for mesh_format, (extension, _) in MESH_FORMATS.items():
+            for lod in MESH_LODS:
+                path = os.path.join(job_dir, lod_file_name(lod, extension))
+                if os.path.exists(path):
+                    mesh_bytes.observe(os.path.getsize(path), format=mesh_format, lod=lod)
+
+def job_status(job):
+    data = job.to_dict()
+    if job.status == 'done':
+        job_dir = workspaces.job_dir(job.id)
+        try:
+            data['output_files'] = [os.path.join(job_dir, file) for file in os.listdir(job_dir)]
+        except FileNotFoundError:
+            # The workspace cleanup removed the outputs, there is nothing left to download
+            data['status'] = data['stage'] = 'expired'
+            data['error'] = 'Job outputs were removed by the workspace cleanup'
+    return job_urls(data)
+
+def job_urls(data):
+    # data is Job.to_dict() or a job_registry record
+    job_id = data['job_id']
+    data['status_url'] = f"/jobs/{job_id}"
+    data['events_url'] = f"/jobs/{job_id}/events"
+    if data['status'] == 'done':
+        data['mesh_url'] = f"/jobs/{job_id}/mesh"
+        data['glb_url'] = f"/jobs/{job_id}/mesh?format=glb"
+        data['lod_urls'] = {lod: f"/jobs/{job_id}/mesh?format=glb&lod={lod}" for lod in MESH_LODS}
+        data['download_urls'] = {mesh_format: f"/jobs/{job_id}/mesh?format={mesh_format}" for mesh_format in MESH_FORMATS}
+        data['progressive_url'] = f"/jobs/{job_id}/mesh?format=progressive"
+        data['viewer_url'] = f"/Tviewer?job={job_id}"
+        data['thumbnail_url'] = f"/jobs/{job_id}/thumbnail"
+    return data
+
+def registered_job_status(job_id):
+    # Finished jobs this process doesn't know (forgotten, from another
+    # process or from before a restart), None for unknown IDs
+    record = job_registry.get(job_id) if is_valid_job_id(job_id) else None
+    if record is None:
+        return None
+    job_dir = workspaces.job_dir(job_id)
+    record['stage'] = record['status']
+    record['progress'] = 1.0 if record['status'] == 'done' else 0.0
+    record['output_files'] = [os.path.join(job_dir, name) for name in job_registry.artifacts(job_id)]
+    return job_urls(record)
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    job = job_store.get(job_id)
+    if job is None:
+        data = registered_job_status(job_id)
+        if data is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(data)
+    return jsonify(job_status(job))
+
+# Job history from the registry, newest first:
+# GET /jobs?limit=50&status=done|failed, then follow next_url for older jobs
+JOB_PAGE_MAX = 200
+
+def page_request():
+    # ?limit= and ?before= of the job lists, raises ValueError for bad values
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), JOB_PAGE_MAX)
+    except ValueError:
+        raise ValueError("limit must be a number")
+    before = request.args.get('before')
+    if before is not None and not is_valid_job_id(before):
+        raise ValueError("Invalid job ID")
+    return limit, before
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    status = request.args.get('status')
+    if status not in (None, 'done', 'failed'):
+        return jsonify({'error': f"Unknown status {status!r}, use done or failed"}), 400
+    try:
+        limit, before = page_request()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+        
+    jobs = [job_urls(record) for record in job_registry.list_jobs(limit, before, status)]
+    next_url = None
+    if len(jobs) == limit:
+        next_url = f"/jobs?limit={limit}&before={jobs[-1]['job_id']}" + (f"&status={status}" if status else "")
+    return jsonify({'jobs': jobs, 'next_url': next_url})
+
+# Finished results with their preview images, newest first. Each entry is a
+# few hundred bytes and each thumbnail a few kilobytes, instead of loading
+# every mesh. Paginated like GET /jobs.
+@app.route('/gallery')
+def gallery():
+    try:
+        limit, before = page_request()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+        
+    items = []
+    for record in job_registry.list_jobs(limit, before, status='done'):
+        job_id = record['job_id']
+        items.append({
+            'job_id': job_id,
+            'finished_at': record['finished_at'],
+            'quality': record['quality'],
+            'vertices': record['vertices'],
+            'faces': record['faces'],
+            'thumbnail_url': f"/jobs/{job_id}/thumbnail",
+            'turntable_urls': [f"/jobs/{job_id}/thumbnail?frame={frame}" for frame in range(config.THUMBNAIL_FRAMES)],
+            'viewer_url': f"/Tviewer?job={job_id}",
+            'status_url': f"/jobs/{job_id}"
+        })
+    next_url = f"/gallery?limit={limit}&before={items[-1]['job_id']}" if len(items) == limit else None
+    return jsonify({'jobs': items, 'next_url': next_url})
+
+# Bulk reconstruction: POST /batches takes a zip archive (field "archive")
+# and/or many files (field "images"). Identical images are reconstructed once,
+# the batch scheduler feeds the jobs into the worker pool and GET /batches/<id>
+# reports progress and the manifest of results.
+batch_store = BatchStore()
+
+def batch_job_state(job_id):
+    job = job_store.get(job_id)
+    urls = {'mesh_url': f"/jobs/{job_id}/mesh", 'glb_url': f"/jobs/{job_id}/mesh?format=glb"}
+    if job is not None:
+        if not job.finished:
+            return 'running', {}
+        if job.status == 'failed':
+            return 'failed', {'error': job.error}
+        return 'done', dict(urls, vertices=job.result['vertices'], faces=job.result['faces'],
+                            cached=job.result.get('cached', False))
+        
+    # Forgotten by the job table (or a restart), but finished jobs are registered
+    record = job_registry.get(job_id)
+    if record is None:
+        return None
+    if record['status'] == 'failed':
+        return 'failed', {'error': record['error']}
+    return 'done', dict(urls, vertices=record['vertices'], faces=record['faces'], cached=record['cached'])
+
+batch_scheduler = BatchScheduler(batch_store, start_job, batch_job_state)
+
+@app.route('/batches', methods=['POST', 'OPTIONS'])
+def create_batch():
+    # Handle preflight OPTIONS request
+    if request.method == 'OPTIONS':
+        return '', 200
         
-        function exportPLY() {
-            if (!model) {
-                showNotification('No model loaded to export', 'error');
-                return;
-            }
+    # A batch can be much bigger than a single upload
+    request.max_content_length = config.MAX_BATCH_UPLOAD_BYTES
+    
+    def uploaded_images():
+        for archive in request.files.getlist('archive'):
+            yield from zip_images(archive.stream)
+        for file in request.files.getlist('images'):
+            yield file.filename or "image", file.read()
             
-            try {
-                const exporter = new PLYExporter();
-                exporter.parse(
-                    model,
-                    function(result) {
-                        saveFile(result, 'model.ply', 'application/octet-stream');
-                        showNotification('PLY file exported successfully');
-                    },
-                    { binary: true }
-                );
-            } catch (error) {
-                console.error('Error exporting PLY:', error);
-                showNotification('Error exporting PLY: ' + error.message, 'error');
-            }
-        }
-        
-        function exportScreenshot() {
-            try {
-                // Temporarily hide UI elements
-                const infoElement = document.getElementById('info');
-                const debugElement = document.getElementById('debug');
-                const controlsElement = document.getElementById('controls');
-                const fullscreenBtn = document.getElementById('fullscreenBtn');
-                
-                infoElement.style.display = 'none';
-                debugElement.style.display = 'none';
-                controlsElement.style.display = 'none';
-                fullscreenBtn.style.display = 'none';
-                
-                // Render the scene
-                renderer.render(scene, camera);
-                
-                // Create a screenshot
-                const dataURL = renderer.domElement.toDataURL('image/png');
-                
-                // Create a link and trigger download
-                const link = document.createElement('a');
-                link.href = dataURL;
-                link.download = 'screenshot.png';
-                link.click();
-                
-                // Show elements again
-                infoElement.style.display = 'block';
-                debugElement.style.display = 'block';
-                controlsElement.style.display = 'block';
-                fullscreenBtn.style.display = 'block';
-                
-                showNotification('Screenshot exported successfully');
-            } catch (error) {
-                console.error('Error exporting screenshot:', error);
-                showNotification('Error exporting screenshot: ' + error.message, 'error');
-            }
-        }
+    try:
+        batch = batch_store.create_from_uploads(uploaded_images())
+    except (ValueError, zipfile.BadZipFile) as e:
+        return jsonify({'error': str(e)}), 400
         
-        // Attach export event listeners
-        document.getElementById('exportOBJ').addEventListener('click', exportOBJ);
-        document.getElementById('exportSTL').addEventListener('click', exportSTL);
-        document.getElementById('exportGLTF').addEventListener('click', exportGLTF);
-        document.getElementById('exportPLY').addEventListener('click', exportPLY);
-        document.getElementById('exportScreenshot').addEventListener('click', exportScreenshot);
+    get_pool()
+    batch_scheduler.notify()
+    return jsonify(batch_status(batch)), 202
+
+def batch_status(batch):
+    data = batch.to_dict()
+    data['status_url'] = f"/batches/{batch.id}"
+    return data
+
+@app.route('/batches/<batch_id>')
+def get_batch(batch_id):
+    batch = batch_store.get(batch_id)
+    if batch is None:
+        return jsonify({'error': 'Batch not found'}), 404
+    data = batch_status(batch)
+    data['manifest'] = batch.manifest()
+    return jsonify(data)
+
+# Server-Sent Events: the job's status is pushed on every stage change, so
+# clients don't have to poll. The last event is 'done', 'failed' or 'expired'.
+SSE_KEEPALIVE_SECONDS = 15
+
+@app.route('/jobs/<job_id>/events')
+def get_job_events(job_id):
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return Response(job_events(job), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def job_events(job):
+    version = None
+    while True:
+        current = job.wait_for_change(version, timeout=SSE_KEEPALIVE_SECONDS)
+        if current == version:
+            # Comment line, stops proxies from closing an idle connection
+            yield ": keep-alive\n\n"
+            continue
+        version = current
+        
+        data = job_status(job)
+        event = data['status'] if job.finished else 'stage'
+        yield f"id: {version}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+        if job.finished:
+            return
+
+@app.route('/jobs/<job_id>/mesh')
+def get_job_mesh(job_id):
+    job = job_store.get(job_id)
+    if job is not None and job.status != 'done':
+        return jsonify({'error': f"Job is {job.status}", 'status': job.status}), 409
+    return send_job_mesh(job_id, immutable=True)
+
+# Preview image of a finished job, ?frame=1.. for the other turntable views.
+# Jobs from before thumbnails existed get theirs rendered on first request.
+@app.route('/jobs/<job_id>/thumbnail')
+def get_job_thumbnail(job_id):
+    job = job_store.get(job_id)
+    if job is not None and job.status != 'done':
+        return jsonify({'error': f"Job is {job.status}", 'status': job.status}), 409
+        
+    frame = request.args.get('frame', '0')
+    if not frame.isdigit() or int(frame) >= config.THUMBNAIL_FRAMES:
+        return jsonify({'error': f"frame must be between 0 and {config.THUMBNAIL_FRAMES - 1}"}), 400
+    if not is_valid_job_id(job_id) or not os.path.exists(workspaces.mesh_path(job_id)):
+        return jsonify({'error': 'Model file not found'}), 404
         
-        // Animation loop
-        function animate() {
-            requestAnimationFrame(animate);
-            controls.update();
-            renderer.render(scene, camera);
-        }
+    on_written = lambda written: register_artifact(job_id, written)
+    try:
+        path = thumbnail_path(workspaces.job_dir(job_id), int(frame), on_written=on_written)
+    except (OSError, ValueError) as e:
+        print(f"Failed to render thumbnails of job {job_id}: {e}")
+        return jsonify({'error': 'Could not render the thumbnail'}), 500
+    return send_cached_file(path, THUMBNAIL_TYPES[thumbnail_format()], immutable=True, on_written=on_written)
+
+# Mesh formats: format -> (file extension, content type). OBJ and GLB (the
+# compact binary version the viewer loads) are written for every job, STL and
+# PLY are converted on the first download and kept in the job folder.
+MESH_FORMATS = {
+    'obj': ('obj', 'text/plain'),
+    'glb': ('glb', 'model/gltf-binary'),
+    'stl': ('stl', 'model/stl'),
+    'ply': ('ply', 'application/x-ply')
+}
+
+# Levels of detail, see LOD_FACE_BUDGETS in config.py
+MESH_LODS = ('low', 'medium', 'high')
+
+# ?format=progressive: all levels of detail as GLB files in one download,
+# coarsest first (see exports.progressive_mesh). The viewer shows the first
+# one while the rest is still arriving.
+PROGRESSIVE_MIMETYPE = 'model/x-glb-sequence'
+
+def requested_format():
+    # ?format= wins, otherwise GLB for clients that say they accept it
+    mesh_format = request.args.get('format')
+    if mesh_format:
+        return mesh_format.lower()
+    if 'model/gltf-binary' in request.headers.get('Accept', ''):
+        return 'glb'
+    return 'obj'
+
+# Finished meshes stay on disk after the job table forgets them (or after a
+# restart), so serving only needs the job directory. A job's files never
+# change, so job-scoped URLs can be cached for good (immutable=True).
+def send_job_mesh(job_id, immutable=False):
+    mesh_format = requested_format()
+    if mesh_format not in MESH_FORMATS and mesh_format != 'progressive':
+        return jsonify({'error': f"Unknown format: {mesh_format}"}), 400
+        
+    # A progressive mesh has every level, ?lod= is ignored
+    lod = request.args.get('lod', 'high').lower() if mesh_format != 'progressive' else 'high'
+    if lod not in MESH_LODS:
+        return jsonify({'error': f"Unknown level of detail: {lod}"}), 400
+        
+    if not is_valid_job_id(job_id) or not os.path.exists(workspaces.mesh_path(job_id, lod_file_name(lod, 'obj'))):
+        return jsonify({'error': 'Model file not found'}), 404
         
-        animate();
+    try:
+        on_written = lambda written: register_artifact(job_id, written)
+        if mesh_format == 'progressive':
+            mimetype = PROGRESSIVE_MIMETYPE
+            path = progressive_mesh(workspaces.job_dir(job_id), on_written=on_written)
+        else:
+            extension, mimetype = MESH_FORMATS[mesh_format]
+            path = export_mesh(workspaces.job_dir(job_id), extension, lod, on_written=on_written)
+    except (OSError, ValueError) as e:
+        print(f"Failed to export job {job_id} as {mesh_format}: {e}")
+        return jsonify({'error': f"Could not convert the model to {mesh_format}"}), 500
+    
+    response = send_cached_file(path, mimetype, immutable=immutable, on_written=on_written)
+    if 'format' not in request.args:
+        response.vary.add('Accept')
+    return response
+
+def register_artifact(job_id, path):
+    # Converted downloads and their compressed copies count towards the job's size for cleanup
+    try:
+        job_registry.add_artifact(job_id, path)
+    except Exception as e:
+        print(f"Failed to register {path}: {e}")
+
+def resolve_job_id():
+    # ?job=<id> picks a job, otherwise the most recent result is used
+    global latest_job_id
+    job_id = request.args.get('job')
+    if job_id:
+        return job_id
+    if latest_job_id is None:
+        latest_job_id = job_registry.latest_job_id()
+    return latest_job_id
+
+# Add static route to serve the obj file specifically
+@app.route('/get_model')
+def get_model():
+    job_id = resolve_job_id()
+    if job_id is None:
+        print("ERROR: No model has been generated yet")
+        return jsonify({'error': 'Model file not found'}), 404
         
-        // Auto-detect if coming from Flutter by checking for a specific URL parameter
-        window.addEventListener('load', function() {
-            const params = new URLSearchParams(window.location.search);
-            if (params.get('fromFlutter') === 'true') {
-                // If coming from Flutter, automatically go fullscreen after a short delay
-                setTimeout(() => {
-                    toggleFullScreen();
-                }, 1000);
-            }
-        });
-    </script>
-</body>
-</html>""")
+    print(f"Serving OBJ file for job {job_id}")
+    # Without ?job= the URL means "latest", which has to be revalidated
+    return send_job_mesh(job_id, immutable='job' in request.args)
+
+# Hit/miss counters of the result cache and of the foreground cache
+@app.route('/cache/stats')
+def cache_stats():
+    data = dict(mesh_cache.stats(), enabled=True) if mesh_cache is not None else {'enabled': False}
+    stats = foreground_cache_stats()
+    data['foreground'] = dict(stats, enabled=True) if stats is not None else {'enabled': False}
+    return jsonify(data)
 
+# Cold start vs. per-job timings and load of the worker pool
+@app.route('/worker/stats')
+def worker_stats():
+    return jsonify(get_pool().stats())
+
+# Add route for the 3D viewer
+@app.route('/Tviewer')
+def viewer():
+    job_id = resolve_job_id()
+    
+    # A job that is still running: the page shows its progress and loads the
+    # mesh once it is done
+    job = job_store.get(job_id) if job_id else None
+    pending = job is not None and not job.finished
+    
+    # Check if the file exists
+    if not pending and (job_id is None or not is_valid_job_id(job_id) or not os.path.exists(workspaces.mesh_path(job_id))):
+        return "Model file not found. Process an image first.", 404
+        
+    # ?lod=low|medium gives slow phones a lighter mesh
+    lod = request.args.get('lod', 'high').lower()
+    if lod not in MESH_LODS:
+        return f"Unknown level of detail: {lod}", 400
+        
+    assets = viewer_assets()
+    if assets is None:
+        return "Viewer files are not built. Run python build_assets.py on the server.", 503
+        
+    viewer_config = {
+        # The full mesh is streamed coarse to fine, a chosen level is loaded on its own
+        'progressive_url': f"/get_model?job={job_id}&format=progressive" if lod == 'high' else None,
+        'glb_url': f"/get_model?job={job_id}&format=glb&lod={lod}",
+        'obj_url': f"/get_model?job={job_id}&format=obj&lod={lod}",
+        'events_url': f"/jobs/{job_id}/events" if pending else None
+    }
+    response = make_response(render_template('viewer.html', assets=assets, viewer_config=viewer_config))
+    return conditional_page(response)
+
+# The viewer's JavaScript and CSS and three.js, built by build_assets.py.
+# Their names contain a hash of the content, so they are cached for a year.
+ASSET_TYPES = {'.js': 'text/javascript', '.css': 'text/css'}
+asset_manifest = None
+
+def viewer_assets():
+    # Names used in the viewer template -> URLs, None until the assets are built
+    global asset_manifest
+    if asset_manifest is None:
+        try:
+            with open(os.path.join(config.ASSET_DIR, MANIFEST_NAME)) as f:
+                asset_manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+    return asset_manifest
+
+@app.route('/assets/<path:filename>')
+def get_asset(filename):
+    mimetype = ASSET_TYPES.get(os.path.splitext(filename)[1])
+    path = safe_join(config.ASSET_DIR, filename)
+    if mimetype is None or path is None or not os.path.isfile(path):
+        return jsonify({'error': 'Asset not found'}), 404
+    return send_cached_file(path, mimetype, immutable=True)
+
+# Development server. For production use serve.py (any OS) or
+# gunicorn -c gunicorn.conf.py server:app (Linux)
 if __name__ == '__main__':
     print(f"Starting Flask server. TripoSR path: {triposr_path}")
     
-    # Option 1: Run with HTTP but with CORS headers (already added above)
-    # app.run(host='0.0.0.0', port=5000, debug=True)
+    # Load the model before accepting requests so the first upload doesn't pay for it
+    get_pool().ready.wait()
     
-    # Option 2: Run with HTTPS
-    # Generate certificates with:
-    # openssl req -x509 -newkey rsa:4096 -keyout key.pem -out cert.pem -days 365 -nodes
-    # Place these files in the same directory as this script
+    # Production servers get their viewer files from a build step, the
+    # development server builds them when they are missing
+    if viewer_assets() is None:
+        try:
+            build_assets()
+        except Exception as e:
+            print(f"WARNING: Could not build the viewer files, the viewer won't work: {e}")
     
-    # Check if certificate files exist
-    cert_path = os.path.join(os.path.dirname(__file__), 'cert.pem')
-    key_path = os.path.join(os.path.dirname(__file__), 'key.pem')
+    # The reloader is disabled because it would start a second process that
+    # loads its own copy of the model
     
-    if os.path.exists(cert_path) and os.path.exists(key_path):
+    if config.TLS_ENABLED:
         # Run with HTTPS
         print("Using HTTPS with SSL certificates")
         context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
-        context.load_cert_chain(cert_path, key_path)
-        app.run(host='0.0.0.0', port=5000, ssl_context=context, debug=True)
+        context.load_cert_chain(config.TLS_CERT_FILE, config.TLS_KEY_FILE)
+        app.run(host=config.SERVER_HOST, port=config.SERVER_PORT, ssl_context=context, debug=config.DEBUG, use_reloader=False)
     else:
         # Run with HTTP
         print("WARNING: Running without HTTPS. Generate certificates for secure connection.")
-        app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+        app.run(host=config.SERVER_HOST, port=config.SERVER_PORT, debug=config.DEBUG, use_reloader=False)
\ No newline at end of file
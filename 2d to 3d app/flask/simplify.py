@@ -0,0 +1,138 @@
+import numpy as np
+
+import config
+from mesh_io import Mesh
+
+
+def lod_file_name(lod, extension):
+    # mesh.obj for the full mesh, mesh_low.obj, mesh_medium.obj, ... for the others
+    return f"mesh.{extension}" if lod == 'high' else f"mesh_{lod}.{extension}"
+
+
+def face_quadrics(mesh):
+    """Area-weighted plane quadric of every face, as the 10 unique entries of the symmetric 4x4 matrix."""
+    v0, v1, v2 = (mesh.vertices[mesh.faces[:, i]].astype(np.float64) for i in range(3))
+    normals = np.cross(v1 - v0, v2 - v0)
+    double_area = np.linalg.norm(normals, axis=1)
+    normals /= np.where(double_area > 0, double_area, 1.0)[:, None]
+    planes = np.hstack([normals, -np.einsum("ij,ij->i", normals, v0)[:, None]])
+
+    rows, cols = np.triu_indices(4)
+    return (planes[:, rows] * planes[:, cols]) * (double_area / 2)[:, None]
+
+
+def cluster_vertices(mesh, quadrics, resolution):
+    """Merge all vertices that fall in the same cell of a resolution^3 grid.
+
+    resolution is the number of cells along the longest side of the bounding
+    box and doesn't have to be a whole number. Each merged vertex is placed where it minimises the summed quadric error of
+    the faces around it, like an edge collapse would, but for all cells at once.
+    """
+    lower = mesh.vertices.min(axis=0).astype(np.float64)
+    cell_size = max(float((mesh.vertices.max(axis=0) - lower).max()), 1e-12) / resolution
+    cells_per_axis = int(np.ceil(resolution))
+    cells = np.minimum(((mesh.vertices - lower) / cell_size).astype(np.int64), cells_per_axis - 1)
+    cell_keys = (cells[:, 0] * cells_per_axis + cells[:, 1]) * cells_per_axis + cells[:, 2]
+    keys, cluster = np.unique(cell_keys, return_inverse=True)
+    cluster = cluster.ravel()
+    count = len(keys)
+
+    # Sum the face quadrics into the clusters of their three corners
+    corner_cluster = cluster[mesh.faces].ravel()
+    summed = np.stack([
+        np.bincount(corner_cluster, weights=np.repeat(quadrics[:, k], 3), minlength=count)
+        for k in range(quadrics.shape[1])
+    ], axis=1)
+    q = np.zeros((count, 4, 4))
+    rows, cols = np.triu_indices(4)
+    q[:, rows, cols] = summed
+    q[:, cols, rows] = summed
+
+    # Mean position, used to regularise flat or degenerate clusters
+    members = np.bincount(cluster, minlength=count).astype(np.float64)[:, None]
+    mean = np.stack([np.bincount(cluster, weights=mesh.vertices[:, axis], minlength=count)
+                     for axis in range(3)], axis=1) / members
+
+    a = q[:, :3, :3]
+    b = -q[:, :3, 3]
+    regularise = 1e-3 * np.trace(a, axis1=1, axis2=2)[:, None, None] / 3 + 1e-12
+    a = a + regularise * np.eye(3)
+    b = b + regularise[:, :, 0] * mean
+    position = np.linalg.solve(a, b[:, :, None])[:, :, 0]
+
+    # Never let a vertex leave its cell, that is where spikes come from
+    cell_lower = lower + np.stack([keys // cells_per_axis ** 2, keys // cells_per_axis % cells_per_axis,
+                                   keys % cells_per_axis], axis=1) * cell_size
+    # The last cell reaches past the bounding box when resolution is fractional
+    position = np.clip(position, cell_lower, np.minimum(cell_lower + cell_size, mesh.vertices.max(axis=0)))
+
+    colors = None
+    if mesh.colors is not None:
+        colors = np.stack([np.bincount(cluster, weights=mesh.colors[:, channel], minlength=count)
+                           for channel in range(3)], axis=1) / members
+        colors = np.round(colors)
+
+    # Drop faces that collapsed to a line or point and faces merged into duplicates
+    faces = cluster[mesh.faces]
+    faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 0] != faces[:, 2])]
+    _, first = np.unique(np.sort(faces, axis=1), axis=0, return_index=True)
+    faces = faces[np.sort(first)]
+
+    # Only keep vertices that are still used by a face
+    used, faces = np.unique(faces, return_inverse=True)
+    faces = faces.reshape(-1, 3)
+    return Mesh(position[used], faces, None if colors is None else colors[used])
+
+
+def simplify(mesh, max_faces, max_steps=16):
+    """Reduce mesh to at most max_faces triangles (the original mesh if it already fits).
+
+    The face count of a clustered surface grows roughly with the square of the
+    grid resolution, which gives the first guesses. Noisy surfaces don't follow
+    that closely, so once there is a resolution under and one over the budget
+    the search bisects between them. The largest result that fits is returned.
+    """
+    if mesh.face_count <= max_faces:
+        return mesh
+
+    quadrics = face_quadrics(mesh)
+    # Largest result under the budget and the lowest resolution over it
+    best = best_resolution = None
+    over = over_resolution = None
+    resolution = 64.0
+    for _ in range(max_steps):
+        simplified = cluster_vertices(mesh, quadrics, resolution)
+        if simplified.face_count <= max_faces:
+            if best is None or simplified.face_count > best.face_count:
+                best, best_resolution = simplified, resolution
+        elif over is None or resolution < over_resolution:
+            over, over_resolution = simplified, resolution
+        if best is not None and best.face_count >= 0.9 * max_faces:
+            break
+
+        if best is not None and over is not None:
+            if over_resolution - best_resolution < 0.01 * best_resolution:
+                break
+            resolution = (best_resolution + over_resolution) / 2
+        else:
+            # Aim a little under the budget, the estimate is not exact
+            scale = np.sqrt(0.95 * max_faces / max(simplified.face_count, 1))
+            guess = max(2.0, resolution * scale)
+            if guess == resolution:
+                break
+            resolution = guess
+
+    return best if best is not None else over
+
+
+def build_lods(mesh, budgets=None):
+    """Simplified copies of mesh, one per level of detail: {lod: Mesh}.
+
+    "high" is always the full mesh.
+    """
+    if budgets is None:
+        budgets = config.LOD_FACE_BUDGETS
+    lods = {'high': mesh}
+    for lod, max_faces in budgets.items():
+        lods[lod] = simplify(mesh, max_faces)
+    return lods
@@ -0,0 +1,75 @@
+"""Tests run against the stub model, with every server directory in a
+temporary TRIPOSR_PATH:
+
+    cd "2d to 3d app/flask"
+    python -m pytest tests
+"""
+import io
+import os
+import sys
+import time
+import atexit
+import shutil
+import tempfile
+
+import numpy as np
+import pytest
+from PIL import Image
+
+FLASK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, FLASK_DIR)
+
+# Before config is imported by anything: outputs, caches, the registry and the
+# stub's weights all go to the temporary directory
+TEST_DIR = tempfile.mkdtemp(prefix="triposr_tests_")
+atexit.register(shutil.rmtree, TEST_DIR, ignore_errors=True)
+os.environ.update({
+    'TRIPOSR_PATH': TEST_DIR,
+    'RECON_MODE': 'persistent',
+    'RECON_BACKEND': 'stub',
+    'STUB_WEIGHTS_MB': '4',
+    'MESH_CACHE_ENABLED': '0',
+    'THUMBNAIL_SIZE': '64',
+    'TLS_CERT_FILE': os.path.join(TEST_DIR, "no-cert.pem"),
+})
+
+
+def sample_image(size=(256, 192), seed=0, image_format="JPEG"):
+    # Smooth colour gradients, enough for the stub to build a relief from
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:1:size[1] * 1j, 0:1:size[0] * 1j]
+    phase = rng.uniform(0, 2 * np.pi, 3)
+    rgb = np.stack([np.sin(3 * x + 2 * y + p) for p in phase], axis=-1) * 0.4 + 0.5
+    buffer = io.BytesIO()
+    Image.fromarray((rgb * 255).astype(np.uint8)).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+@pytest.fixture(scope="session")
+def server():
+    import server
+
+    pool = server.get_pool()
+    assert pool.ready.wait(60) and pool.load_error is None
+    return server
+
+
+@pytest.fixture
+def client(server):
+    return server.app.test_client()
+
+
+def run_job(server, client, data, quality="preview"):
+    """Uploads data to POST /jobs and returns the job ID once the job is
+    finished and in the registry."""
+    response = client.post('/jobs', data={'image': (io.BytesIO(data), "image.jpg"), 'quality': quality})
+    assert response.status_code == 202, response.get_json()
+    job_id = response.get_json()['job_id']
+    assert server.job_store.get(job_id).wait(60)
+
+    # The registry row is written right after the job is marked finished
+    deadline = time.time() + 10
+    while server.job_registry.get(job_id) is None:
+        assert time.time() < deadline
+        time.sleep(0.01)
+    return job_id
@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+
+import file_locks
+from file_locks import atomic_path, write_atomic, write_once
+
+
+def test_atomic_path_replaces_the_file(tmp_path):
+    target = tmp_path / "mesh.obj"
+    target.write_text("old")
+    with atomic_path(str(target)) as tmp:
+        with open(tmp, "w") as f:
+            f.write("new")
+        # Readers still see the old file until the block ends
+        assert target.read_text() == "old"
+    assert target.read_text() == "new"
+    assert [p.name for p in tmp_path.iterdir()] == ["mesh.obj"]
+
+
+def test_atomic_path_cleans_up_after_errors(tmp_path):
+    target = tmp_path / "mesh.obj"
+    with pytest.raises(OSError):
+        with atomic_path(str(target)) as tmp:
+            with open(tmp, "w") as f:
+                f.write("partial")
+            raise OSError("disk full")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_write_atomic(tmp_path):
+    write_atomic(str(tmp_path / "a.bin"), b"\x00\x01")
+    write_atomic(str(tmp_path / "a.json"), "{}")
+    assert (tmp_path / "a.bin").read_bytes() == b"\x00\x01"
+    assert (tmp_path / "a.json").read_text() == "{}"
+
+
+def test_write_once_writes_one_copy(tmp_path):
+    target = str(tmp_path / "mesh.stl")
+    writes, written = [], []
+    start = threading.Barrier(4)
+
+    def write(tmp):
+        writes.append(tmp)
+        with open(tmp, "w") as f:
+            f.write("solid")
+
+    def request():
+        start.wait()
+        assert write_once(target, write, written.append) == target
+
+    threads = [threading.Thread(target=request) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(writes) == 1 and written == [target]
+    assert file_locks.path_locks == {}
+
+
+def test_write_once_leaves_nothing_after_errors(tmp_path):
+    def write(tmp):
+        with open(tmp, "w") as f:
+            f.write("partial")
+        raise ValueError("bad mesh")
+
+    with pytest.raises(ValueError):
+        write_once(str(tmp_path / "mesh.ply"), write)
+    assert list(tmp_path.iterdir()) == []
+    assert file_locks.path_locks == {}
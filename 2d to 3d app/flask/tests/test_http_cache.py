@@ -0,0 +1,103 @@
+import gzip
+
+import pytest
+from flask import Flask
+
+import http_cache
+from http_cache import send_cached_file, file_etag, IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL
+
+CONTENT = bytes(range(256)) * 64
+
+
+@pytest.fixture
+def served(tmp_path):
+    # A tiny app serving one file the way the job routes do
+    path = tmp_path / "mesh.glb"
+    path.write_bytes(CONTENT)
+    written = []
+    app = Flask(__name__)
+
+    @app.route('/file')
+    def get_file():
+        return send_cached_file(str(path), 'model/gltf-binary', immutable=True, on_written=written.append)
+
+    @app.route('/latest')
+    def get_latest():
+        return send_cached_file(str(path), 'application/octet-stream')
+
+    return app.test_client(), path, written
+
+
+def test_full_response(served):
+    client, _, _ = served
+    response = client.get('/file')
+    assert response.status_code == 200
+    assert response.data == CONTENT
+    assert response.headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+    assert response.headers['ETag']
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert client.get('/latest').headers['Cache-Control'] == REVALIDATE_CACHE_CONTROL
+
+
+def test_if_none_match(served):
+    client, _, _ = served
+    etag = client.get('/file').headers['ETag']
+    response = client.get('/file', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert client.get('/file', headers={'If-None-Match': '"other"'}).status_code == 200
+
+
+@pytest.mark.parametrize("range_header, start, stop", [
+    ("bytes=0-99", 0, 100),
+    ("bytes=1000-1999", 1000, 2000),
+    ("bytes=-500", len(CONTENT) - 500, len(CONTENT)),
+    ("bytes=16000-", 16000, len(CONTENT)),
+])
+def test_range(served, range_header, start, stop):
+    client, _, _ = served
+    response = client.get('/file', headers={'Range': range_header})
+    assert response.status_code == 206
+    assert response.data == CONTENT[start:stop]
+    assert response.headers['Content-Range'] == f"bytes {start}-{stop - 1}/{len(CONTENT)}"
+    assert int(response.headers['Content-Length']) == stop - start
+
+
+def test_range_not_satisfiable(served):
+    client, _, _ = served
+    response = client.get('/file', headers={'Range': f"bytes={len(CONTENT) + 10}-"})
+    assert response.status_code == 416
+
+
+def test_if_range_with_stale_etag_sends_everything(served):
+    client, _, _ = served
+    response = client.get('/file', headers={'Range': "bytes=0-99", 'If-Range': '"stale"'})
+    assert response.status_code == 200
+    assert response.data == CONTENT
+
+
+def test_gzip_copy_is_made_once(served):
+    client, path, written = served
+    for _ in range(2):
+        response = client.get('/file', headers={'Accept-Encoding': 'gzip'})
+        assert response.status_code == 200
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(response.data) == CONTENT
+    # The compressed copy has its own ETag, and on_written saw it once
+    assert response.headers['ETag'] != client.get('/file').headers['ETag']
+    assert written == [str(path) + ".gz"]
+
+
+def test_etag_cache_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(http_cache, 'ETAG_CACHE_SIZE', 3)
+    monkeypatch.setattr(http_cache, 'etags', http_cache.OrderedDict())
+    paths = []
+    for i in range(5):
+        paths.append(tmp_path / f"{i}.bin")
+        paths[-1].write_bytes(bytes([i]) * 10)
+    first = file_etag(str(paths[0]))
+    for path in paths[1:]:
+        file_etag(str(path))
+        # Used again, so the first file's entry stays while the others age out
+        assert file_etag(str(paths[0])) == first
+    assert sorted(key[0] for key in http_cache.etags) == sorted(str(path) for path in (paths[0], paths[3], paths[4]))
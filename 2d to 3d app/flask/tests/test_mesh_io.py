@@ -0,0 +1,107 @@
+import json
+import struct
+
+import numpy as np
+import pytest
+
+from mesh_io import Mesh, write_obj, read_obj, write_glb, write_stl, write_ply, write_mesh_store, read_mesh_store
+
+
+@pytest.fixture(params=[True, False], ids=["colors", "no-colors"])
+def mesh(request):
+    rng = np.random.default_rng(0)
+    vertices = rng.uniform(-1, 1, (50, 3))
+    faces = rng.integers(0, 50, (80, 3))
+    colors = rng.integers(0, 256, (50, 3)) if request.param else None
+    return Mesh(vertices, faces, colors)
+
+
+def test_obj_round_trip(mesh, tmp_path):
+    path = tmp_path / "mesh.obj"
+    write_obj(mesh, str(path))
+    loaded = read_obj(str(path))
+
+    np.testing.assert_allclose(loaded.vertices, mesh.vertices, atol=1e-6)
+    np.testing.assert_array_equal(loaded.faces, mesh.faces)
+    if mesh.colors is None:
+        assert loaded.colors is None
+    else:
+        # Colours are written as 0..1 with four decimals
+        assert np.abs(loaded.colors.astype(int) - mesh.colors).max() <= 1
+
+
+def test_mesh_store_round_trip(mesh, tmp_path):
+    path = tmp_path / "mesh.npmesh"
+    write_mesh_store(mesh, str(path))
+    loaded = read_mesh_store(str(path))
+
+    np.testing.assert_array_equal(loaded.vertices, mesh.vertices)
+    np.testing.assert_array_equal(loaded.faces, mesh.faces)
+    if mesh.colors is None:
+        assert loaded.colors is None
+    else:
+        np.testing.assert_array_equal(loaded.colors, mesh.colors)
+
+
+def test_mesh_store_rejects_other_files(tmp_path):
+    path = tmp_path / "mesh.npmesh"
+    path.write_bytes(b"not a mesh store" * 4)
+    with pytest.raises(ValueError):
+        read_mesh_store(str(path))
+
+
+def test_stl_layout(mesh, tmp_path):
+    path = tmp_path / "mesh.stl"
+    write_stl(mesh, str(path))
+    data = path.read_bytes()
+
+    count, = struct.unpack_from("<I", data, 80)
+    assert count == mesh.face_count
+    assert len(data) == 84 + 50 * count
+    records = np.frombuffer(data, offset=84, dtype=np.dtype(
+        [('normal', '<f4', 3), ('corners', '<f4', (3, 3)), ('attributes', '<u2')]))
+    np.testing.assert_array_equal(records['corners'], mesh.vertices[mesh.faces])
+
+    # Degenerate faces (repeated corners) have a zero normal, the others unit length
+    lengths = np.linalg.norm(records['normal'], axis=1)
+    degenerate = np.linalg.norm(np.cross(*(mesh.vertices[mesh.faces[:, i]] - mesh.vertices[mesh.faces[:, 0]]
+                                          for i in (1, 2))), axis=1) < 1e-12
+    np.testing.assert_allclose(lengths[~degenerate], 1.0, atol=1e-5)
+
+
+def test_ply_round_trip(mesh, tmp_path):
+    path = tmp_path / "mesh.ply"
+    write_ply(mesh, str(path))
+    data = path.read_bytes()
+
+    end = data.index(b"end_header\n") + len(b"end_header\n")
+    header = data[:end].decode("ascii").splitlines()
+    assert header[:2] == ["ply", "format binary_little_endian 1.0"]
+    assert f"element vertex {mesh.vertex_count}" in header
+    assert f"element face {mesh.face_count}" in header
+    assert ("property uchar red" in header) == (mesh.colors is not None)
+
+    layout = [('position', '<f4', 3)] + ([('color', 'u1', 3)] if mesh.colors is not None else [])
+    vertices = np.frombuffer(data, dtype=np.dtype(layout), count=mesh.vertex_count, offset=end)
+    faces = np.frombuffer(data, dtype=np.dtype([('count', 'u1'), ('indices', '<i4', 3)]),
+                          offset=end + vertices.nbytes)
+    np.testing.assert_array_equal(vertices['position'], mesh.vertices)
+    if mesh.colors is not None:
+        np.testing.assert_array_equal(vertices['color'], mesh.colors)
+    assert (faces['count'] == 3).all()
+    np.testing.assert_array_equal(faces['indices'], mesh.faces)
+
+
+def test_glb_container(mesh, tmp_path):
+    path = tmp_path / "mesh.glb"
+    write_glb(mesh, str(path))
+    data = path.read_bytes()
+
+    magic, version, length = struct.unpack_from("<4sII", data)
+    assert (magic, version, length) == (b"glTF", 2, len(data))
+    json_length, chunk_type = struct.unpack_from("<I4s", data, 12)
+    assert chunk_type == b"JSON"
+    gltf = json.loads(data[20:20 + json_length])
+    attributes = gltf['meshes'][0]['primitives'][0]['attributes']
+    assert gltf['accessors'][attributes['POSITION']]['count'] == mesh.vertex_count
+    assert ('COLOR_0' in attributes) == (mesh.colors is not None)
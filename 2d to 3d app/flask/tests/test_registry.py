@@ -0,0 +1,79 @@
+import uuid
+
+import pytest
+
+from jobs import Job
+from registry import JobRegistry
+
+
+def finished_job(finished_at, error=None):
+    job = Job(uuid.uuid4().hex)
+    job.finish({'vertices': 10, 'faces': 20, 'timings': {}}, error)
+    job.created_at = job.finished_at = finished_at
+    return job
+
+
+def add_job(registry, tmp_path, finished_at, size=100, error=None):
+    job = finished_job(finished_at, error)
+    job_dir = tmp_path / job.id
+    job_dir.mkdir()
+    (job_dir / "mesh.obj").write_bytes(b"v" * size)
+    registry.add(job, str(job_dir))
+    return job.id
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return JobRegistry(str(tmp_path / "registry.sqlite3"))
+
+
+def test_add_and_get(registry, tmp_path):
+    job_id = add_job(registry, tmp_path, 1000.0, size=123)
+    record = registry.get(job_id)
+    assert record['status'] == 'done'
+    assert (record['vertices'], record['faces'], record['output_bytes']) == (10, 20, 123)
+    assert registry.artifacts(job_id) == ["mesh.obj"]
+    assert registry.get(uuid.uuid4().hex) is None
+
+
+def test_add_artifact_updates_output_bytes(registry, tmp_path):
+    job_id = add_job(registry, tmp_path, 1000.0, size=100)
+    extra = tmp_path / job_id / "mesh.obj.gz"
+    extra.write_bytes(b"z" * 40)
+    registry.add_artifact(job_id, str(extra))
+    assert registry.get(job_id)['output_bytes'] == 140
+    assert registry.artifacts(job_id) == ["mesh.obj", "mesh.obj.gz"]
+
+
+def test_expired_by_age(registry, tmp_path):
+    old = add_job(registry, tmp_path, 1000.0)
+    add_job(registry, tmp_path, 5000.0)
+    assert registry.expired(max_age_seconds=3000, max_total_bytes=10 ** 9, now=6000.0) == [old]
+
+
+def test_expired_by_size_oldest_first(registry, tmp_path):
+    ids = [add_job(registry, tmp_path, 1000.0 + i, size=100) for i in range(5)]
+    # 500 bytes in total, 250 allowed: the three oldest go
+    assert registry.expired(max_age_seconds=10 ** 6, max_total_bytes=250, now=2000.0) == ids[:3]
+
+
+def test_list_jobs_pages(registry, tmp_path):
+    ids = [add_job(registry, tmp_path, 1000.0 + i, error="boom" if i % 2 else None) for i in range(7)]
+    newest_first = ids[::-1]
+
+    first = registry.list_jobs(limit=3)
+    assert [record['job_id'] for record in first] == newest_first[:3]
+    second = registry.list_jobs(limit=3, before=first[-1]['job_id'])
+    assert [record['job_id'] for record in second] == newest_first[3:6]
+    assert registry.list_jobs(before=uuid.uuid4().hex) == []
+
+    failed = registry.list_jobs(status='failed')
+    assert [record['job_id'] for record in failed] == [ids[5], ids[3], ids[1]]
+    assert registry.latest_job_id() == ids[6]
+
+
+def test_remove(registry, tmp_path):
+    ids = [add_job(registry, tmp_path, 1000.0 + i, size=10) for i in range(3)]
+    registry.remove(ids[:2])
+    assert registry.get(ids[0]) is None and registry.artifacts(ids[0]) == []
+    assert registry.stats() == {'jobs': 1, 'output_bytes': 10}
@@ -0,0 +1,137 @@
+import io
+import json
+import shutil
+import struct
+import zipfile
+
+import pytest
+
+import config
+from conftest import sample_image, run_job
+from mesh_io import read_obj
+from simplify import lod_file_name
+
+
+@pytest.fixture(scope="module")
+def job_id(server):
+    return run_job(server, server.app.test_client(), sample_image())
+
+
+def test_job_status(client, job_id):
+    data = client.get(f'/jobs/{job_id}').get_json()
+    assert data['status'] == 'done' and data['progress'] == 1.0
+    assert data['faces'] > 0
+    assert set(data['lod_urls']) == {'low', 'medium', 'high'}
+
+
+def test_unknown_job(client):
+    assert client.get('/jobs/0123456789abcdef0123456789abcdef').status_code == 404
+    assert client.get('/jobs/not-a-job/mesh').status_code == 404
+
+
+def test_truncated_upload(client):
+    # A PNG cut off halfway fails when it is decoded
+    truncated = sample_image(image_format="PNG")[:2000]
+    response = client.post('/jobs', data={'image': (io.BytesIO(truncated), "image.png")})
+    assert response.status_code == 400
+
+
+def test_unknown_quality(client):
+    response = client.post('/jobs', data={'image': (io.BytesIO(sample_image()), "image.jpg"), 'quality': 'ultra'})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("mesh_format, magic", [
+    ('obj', None), ('glb', b"glTF"), ('stl', None), ('ply', b"ply\n"),
+])
+def test_mesh_formats(client, job_id, mesh_format, magic):
+    response = client.get(f'/jobs/{job_id}/mesh?format={mesh_format}')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+    if magic is not None:
+        assert response.data.startswith(magic)
+    if mesh_format == 'stl':
+        assert len(response.data) == 84 + 50 * struct.unpack_from("<I", response.data, 80)[0]
+
+
+def test_converted_downloads_are_registered(server, client, job_id):
+    client.get(f'/jobs/{job_id}/mesh?format=ply')
+    assert "mesh.ply" in server.job_registry.artifacts(job_id)
+
+
+def test_lod_face_budgets(server, client, job_id):
+    high = read_obj(server.workspaces.mesh_path(job_id, lod_file_name('high', 'obj'))).face_count
+    for lod, budget in config.LOD_FACE_BUDGETS.items():
+        assert client.get(f'/jobs/{job_id}/mesh?format=glb&lod={lod}').status_code == 200
+        mesh = read_obj(server.workspaces.mesh_path(job_id, lod_file_name(lod, 'obj')))
+        # Preview meshes have more faces than the low budget, so that level is simplified
+        assert 0.8 * min(budget, high) <= mesh.face_count <= min(budget, high)
+    assert client.get(f'/jobs/{job_id}/mesh?format=obj&lod=huge').status_code == 400
+
+
+def test_mesh_range_request(client, job_id):
+    full = client.get(f'/jobs/{job_id}/mesh?format=glb').data
+    response = client.get(f'/jobs/{job_id}/mesh?format=glb', headers={'Range': "bytes=12-19"})
+    assert response.status_code == 206
+    assert response.data == full[12:20]
+    assert response.headers['Content-Range'] == f"bytes 12-19/{len(full)}"
+
+
+def test_thumbnail(client, job_id):
+    response = client.get(f'/jobs/{job_id}/thumbnail')
+    assert response.status_code == 200
+    assert response.mimetype.startswith('image/')
+
+
+def zip_archive(compress_type=None, encrypted=False):
+    # One-image zip, with its header fields patched where Python can't write them
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        zf.writestr("image.jpg", sample_image())
+    data = bytearray(buffer.getvalue())
+    central = data.index(b"PK\x01\x02")
+    if encrypted:
+        data[6] |= 1
+        data[central + 8] |= 1
+    if compress_type is not None:
+        struct.pack_into("<H", data, 8, compress_type)
+        struct.pack_into("<H", data, central + 10, compress_type)
+    return bytes(data)
+
+
+@pytest.mark.parametrize("archive", [
+    zip_archive(encrypted=True), zip_archive(compress_type=99), b"not a zip",
+], ids=["encrypted", "unknown-compression", "not-a-zip"])
+def test_unreadable_batch_archive(client, archive):
+    response = client.post('/batches', data={'archive': (io.BytesIO(archive), "images.zip")})
+    assert response.status_code == 400
+    assert response.get_json()['error']
+
+
+def events(client, job_id):
+    # (event, data) of every message on the job's event stream
+    messages = []
+    for block in client.get(f'/jobs/{job_id}/events').get_data(as_text=True).split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if 'event' in fields:
+            messages.append((fields['event'], json.loads(fields['data'])))
+    return messages
+
+
+def test_removed_outputs_are_reported_expired(server, client):
+    job_id = run_job(server, client, sample_image(seed=1))
+    assert events(client, job_id)[-1][0] == 'done'
+
+    shutil.rmtree(server.workspaces.job_dir(job_id))
+    data = client.get(f'/jobs/{job_id}').get_json()
+    assert data['status'] == 'expired' and 'mesh_url' not in data
+    assert events(client, job_id)[-1][0] == 'expired'
+
+
+def test_cleanup_forgets_jobs(server, client):
+    job_id = run_job(server, client, sample_image(seed=2))
+    server.workspaces.cleanup(max_age_seconds=0, on_removed=server.job_store.remove)
+    assert server.job_store.get(job_id) is None
+    assert server.job_registry.get(job_id) is None
+    assert client.get(f'/jobs/{job_id}').status_code == 404
+    assert client.get(f'/jobs/{job_id}/mesh').status_code == 404
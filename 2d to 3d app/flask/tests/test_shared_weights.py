@@ -0,0 +1,69 @@
+import sys
+import types
+
+import pytest
+
+from reconstruction import TripoSRReconstructor
+
+
+class FakeTorch:
+    """torch.load() that raises mmap_error for mmap=True, like an old torch
+    (no mmap argument) or a legacy-format checkpoint. None maps the file."""
+    __version__ = "2.0.1"
+
+    def __init__(self, mmap_error):
+        self.mmap_error = mmap_error
+
+    def load(self, path, map_location=None, **kwargs):
+        if kwargs.get('mmap'):
+            if self.mmap_error is None:
+                return {'weight': path, 'mmap': True}
+            raise self.mmap_error
+        if kwargs:
+            raise TypeError(f"load() got unexpected arguments {sorted(kwargs)}")
+        return {'weight': path}
+
+
+class FakeModel:
+    # torch older than 2.1 has no assign argument
+    supports_assign = False
+
+    def __init__(self, cfg):
+        self.loaded = self.assigned = None
+
+    def load_state_dict(self, state_dict, **kwargs):
+        if kwargs and not self.supports_assign:
+            raise TypeError(f"load_state_dict() got unexpected arguments {sorted(kwargs)}")
+        self.loaded = state_dict
+        self.assigned = kwargs.get('assign', False)
+
+
+class FakeNewModel(FakeModel):
+    supports_assign = True
+
+
+@pytest.fixture
+def reconstructor(monkeypatch):
+    omegaconf = types.SimpleNamespace(OmegaConf=types.SimpleNamespace(load=lambda path: {}, resolve=lambda cfg: None))
+    monkeypatch.setitem(sys.modules, 'omegaconf', omegaconf)
+    reconstructor = TripoSRReconstructor()
+    monkeypatch.setattr(reconstructor, 'prepare_weights', lambda: ("config.yaml", "model.ckpt"))
+    return reconstructor
+
+
+@pytest.mark.parametrize("mmap_error", [
+    TypeError("load() got an unexpected keyword argument 'mmap'"),
+    RuntimeError("mmap can only be used with files saved with torch.save(_use_new_zipfile_serialization=True)"),
+], ids=["torch-2.0", "legacy-checkpoint"])
+def test_private_copy_fallback(reconstructor, mmap_error):
+    reconstructor.torch = FakeTorch(mmap_error)
+    model = reconstructor.load_shared_model(FakeModel)
+    assert model.loaded == {'weight': "model.ckpt"} and not model.assigned
+    assert not reconstructor.weights_shared
+
+
+def test_mapped_checkpoint_is_assigned(reconstructor):
+    reconstructor.torch = FakeTorch(None)
+    model = reconstructor.load_shared_model(FakeNewModel)
+    assert model.loaded == {'weight': "model.ckpt", 'mmap': True} and model.assigned
+    assert reconstructor.weights_shared
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from reconstruction import relief_mesh
+from simplify import simplify, build_lods, lod_file_name
+
+
+def relief(height):
+    return relief_mesh(height, np.full(height.shape + (3,), 0.5))
+
+
+@pytest.fixture(scope="module")
+def smooth_mesh():
+    y, x = np.mgrid[0:200, 0:200]
+    return relief(np.sin(x / 20) * np.cos(y / 25))
+
+
+@pytest.fixture(scope="module")
+def noisy_mesh():
+    # Noise fills the grid cells in depth too, the face count no longer
+    # follows the square of the grid resolution
+    return relief(np.random.default_rng(1).random((200, 200)))
+
+
+@pytest.mark.parametrize("budget", [500, 2000, 10000])
+@pytest.mark.parametrize("surface", ["smooth_mesh", "noisy_mesh"])
+def test_face_budget_is_filled(surface, budget, request):
+    mesh = request.getfixturevalue(surface)
+    simplified = simplify(mesh, budget)
+    # Face counts jump between neighbouring grids on a few hundred faces,
+    # so the budget can't always be filled to the last percent
+    assert 0.8 * budget <= simplified.face_count <= budget
+    # Every face points at an existing vertex and none collapsed
+    assert simplified.faces.max() < simplified.vertex_count
+    assert (simplified.faces[:, 0] != simplified.faces[:, 1]).all()
+    assert simplified.colors is not None and len(simplified.colors) == simplified.vertex_count
+
+
+def test_mesh_within_budget_is_kept(smooth_mesh):
+    assert simplify(smooth_mesh, smooth_mesh.face_count) is smooth_mesh
+
+
+def test_simplified_mesh_keeps_its_bounds(smooth_mesh):
+    simplified = simplify(smooth_mesh, 2000)
+    lower, upper = smooth_mesh.vertices.min(axis=0), smooth_mesh.vertices.max(axis=0)
+    assert (simplified.vertices >= lower - 1e-6).all() and (simplified.vertices <= upper + 1e-6).all()
+
+
+def test_build_lods(smooth_mesh):
+    lods = build_lods(smooth_mesh, {'low': 1000, 'medium': 5000})
+    assert lods['high'] is smooth_mesh
+    assert lods['low'].face_count <= 1000 < lods['medium'].face_count <= 5000
+
+
+def test_lod_file_names():
+    assert lod_file_name('high', 'obj') == "mesh.obj"
+    assert lod_file_name('low', 'glb') == "mesh_low.glb"
@@ -0,0 +1,92 @@
+import time
+import threading
+
+import pytest
+
+from worker import WorkerPool
+
+
+class FakeReconstructor:
+    """Stands in for the model: each job's result echoes its mc_resolution,
+    the first fail_batches batches raise instead."""
+    name = "fake"
+    max_batch_size = None
+    weights_shared = False
+
+    def __init__(self, fail_batches=0, release=None, seconds=0.0):
+        self.fail_batches = fail_batches
+        self.seconds = seconds
+        # When given, every batch waits for this event
+        self.release = release
+
+    def load(self):
+        pass
+
+    def reconstruct_batch(self, jobs):
+        if self.release is not None:
+            self.release.wait(10)
+        time.sleep(self.seconds)
+        if self.fail_batches:
+            self.fail_batches -= 1
+            raise RuntimeError("out of memory")
+        return [{'timings': {}, 'mc_resolution': mc_resolution} for _, _, mc_resolution, _, _ in jobs]
+
+
+def started_pool(reconstructor, **kwargs):
+    pool = WorkerPool(reconstructor, **dict({'workers': 1, 'queue_size': 8, 'max_batch_wait_ms': 0}, **kwargs))
+    pool.start()
+    assert pool.ready.wait(5)
+    return pool
+
+
+def test_failed_batch_fails_its_jobs_and_the_worker_goes_on():
+    pool = started_pool(FakeReconstructor(fail_batches=1))
+    with pytest.raises(RuntimeError, match="out of memory"):
+        pool.submit(None, None, 64).result(5)
+
+    assert pool.submit(None, None, 64).result(5)['mc_resolution'] == 64
+    stats = pool.stats()
+    assert (stats['busy'], stats['jobs_failed'], stats['jobs_completed']) == (0, 1, 1)
+    assert pool.shutdown(5)
+
+
+def test_shutdown_timeout_fails_queued_jobs():
+    release = threading.Event()
+    pool = started_pool(FakeReconstructor(release=release), queue_size=3, max_batch_size=1)
+    running = pool.submit(None, None, 64)
+    while pool.stats()['busy'] == 0:
+        time.sleep(0.01)
+    # Fills the queue, the stop markers must not wait behind these
+    queued = [pool.submit(None, None, 64) for _ in range(3)]
+
+    start = time.perf_counter()
+    assert not pool.shutdown(0.2)
+    assert time.perf_counter() - start < 2
+    for future in queued:
+        with pytest.raises(RuntimeError, match="shut down"):
+            future.result(1)
+
+    release.set()
+    assert running.result(5)['mc_resolution'] == 64
+    for thread in pool.threads:
+        thread.join(5)
+        assert not thread.is_alive()
+
+
+def test_timings_are_per_batch():
+    pool = started_pool(FakeReconstructor(seconds=0.1), max_batch_size=4, max_batch_wait_ms=2000)
+    futures = [pool.submit(None, None, resolution) for resolution in (64, 64, 128, 256)]
+    for future in futures:
+        future.result(5)
+
+    stats = pool.stats()
+    assert (stats['jobs_completed'], stats['batches_completed']) == (4, 1)
+    assert stats['batching']['batch_size']['count'] == 1
+    # One sample, keyed by the batch's largest resolution
+    assert list(stats['batch_seconds_by_resolution']) == ['256']
+    assert 0.1 <= stats['avg_batch_seconds'] < 0.5
+    # Nothing queued: a job takes one batch time, scaled for other resolutions
+    assert pool.estimate_latency(256) == pytest.approx(stats['avg_batch_seconds'])
+    assert pool.estimate_latency(128) == pytest.approx(stats['avg_batch_seconds'] / 4)
+    assert pool.retry_after() == 1
+    assert pool.shutdown(5)
@@ -0,0 +1,170 @@
+import os
+import numpy as np
+from PIL import Image, features
+
+import config
+from exports import load_mesh
+from file_locks import path_lock, atomic_path
+from mesh_io import vertex_normals
+from simplify import lod_file_name
+
+# Content type of each thumbnail format. WebP is a fraction of the PNG size,
+# Pillow builds without libwebp fall back to PNG.
+THUMBNAIL_TYPES = {
+    'webp': 'image/webp',
+    'png': 'image/png'
+}
+
+# Light from the upper left, in front of the model (camera space)
+LIGHT_DIRECTION = np.array([-0.4, 0.6, 1.0]) / np.linalg.norm([-0.4, 0.6, 1.0])
+AMBIENT = 0.35
+# Camera elevation above the model, in degrees
+ELEVATION = 15.0
+# Colour of meshes without vertex colours
+DEFAULT_COLOR = np.array([200, 200, 200], dtype=np.float32)
+
+# Candidate pixels tested per rasterization step, bounds the memory used
+MAX_SAMPLES = 2_000_000
+
+
+def thumbnail_format():
+    return config.THUMBNAIL_FORMAT if config.THUMBNAIL_FORMAT != 'webp' or features.check('webp') else 'png'
+
+
+def thumbnail_file_name(frame, image_format=None):
+    return f"thumbnail_{frame}.{image_format or thumbnail_format()}"
+
+
+def render(mesh, size, yaw=0.0, supersample=2):
+    """RGBA image of the mesh turned yaw degrees around the vertical axis.
+
+    Looks at the mesh the way the viewer first shows it (y up, camera on +z,
+    orthographic), a little from above. Rendered at supersample times the
+    size and scaled down, which smooths the edges.
+    """
+    full_size = size * supersample
+    vertices = mesh.vertices.astype(np.float64)
+    normals = vertex_normals(mesh).astype(np.float64)
+
+    # Turn around y, then tilt towards the camera
+    yaw, pitch = np.radians(yaw), np.radians(ELEVATION)
+    rotation = (np.array([[1, 0, 0], [0, np.cos(pitch), -np.sin(pitch)], [0, np.sin(pitch), np.cos(pitch)]]) @
+                np.array([[np.cos(yaw), 0, np.sin(yaw)], [0, 1, 0], [-np.sin(yaw), 0, np.cos(yaw)]]))
+    # Centred on the bounding box and scaled by the bounding sphere, so the
+    # model keeps its size in every frame
+    center = (vertices.min(axis=0) + vertices.max(axis=0)) / 2
+    points = (vertices - center) @ rotation.T
+    normals = normals @ rotation.T
+    radius = max(np.linalg.norm(points, axis=1).max(), 1e-9)
+    scale = full_size * 0.45 / radius
+    screen_x = full_size / 2 + points[:, 0] * scale
+    screen_y = full_size / 2 - points[:, 1] * scale
+
+    # Two-sided diffuse lighting per vertex, interpolated over the triangles
+    shade = AMBIENT + (1 - AMBIENT) * np.abs(normals @ LIGHT_DIRECTION)
+    colors = mesh.colors.astype(np.float32) if mesh.colors is not None else np.tile(DEFAULT_COLOR, (mesh.vertex_count, 1))
+    lit = colors * shade[:, None].astype(np.float32)
+
+    depth_buffer = np.full(full_size * full_size, -np.inf)
+    color_buffer = np.zeros((full_size * full_size, 3), dtype=np.float32)
+    rasterize(mesh.faces, screen_x, screen_y, points[:, 2], lit, full_size, depth_buffer, color_buffer)
+
+    covered = np.isfinite(depth_buffer)
+    pixels = np.zeros((full_size * full_size, 4), dtype=np.uint8)
+    pixels[:, :3] = np.clip(color_buffer, 0, 255)
+    pixels[:, 3] = covered * 255
+    image = Image.fromarray(pixels.reshape(full_size, full_size, 4), "RGBA")
+    return image.resize((size, size), Image.LANCZOS) if supersample > 1 else image
+
+
+def rasterize(faces, x, y, z, colors, size, depth_buffer, color_buffer):
+    # Every pixel centre in each triangle's bounding box is tested at once,
+    # a few thousand triangles at a time; the nearest one wins each pixel
+    x0, x1, x2 = (x[faces[:, i]] for i in range(3))
+    y0, y1, y2 = (y[faces[:, i]] for i in range(3))
+    area = (x1 - x0) * (y2 - y0) - (x2 - x0) * (y1 - y0)
+
+    min_x = np.clip(np.floor(np.minimum(np.minimum(x0, x1), x2)), 0, size - 1).astype(np.int64)
+    max_x = np.clip(np.ceil(np.maximum(np.maximum(x0, x1), x2)), 0, size - 1).astype(np.int64)
+    min_y = np.clip(np.floor(np.minimum(np.minimum(y0, y1), y2)), 0, size - 1).astype(np.int64)
+    max_y = np.clip(np.ceil(np.maximum(np.maximum(y0, y1), y2)), 0, size - 1).astype(np.int64)
+    widths = max_x - min_x + 1
+    counts = widths * (max_y - min_y + 1)
+    # Triangles seen edge-on cover no pixels
+    visible = np.flatnonzero(np.abs(area) > 1e-12)
+
+    start = 0
+    cumulative = np.cumsum(counts[visible])
+    while start < len(visible):
+        done = cumulative[start - 1] if start else 0
+        end = max(int(np.searchsorted(cumulative, done + MAX_SAMPLES, side='right')), start + 1)
+        chunk = visible[start:end]
+        start = end
+
+        chunk_counts = counts[chunk]
+        face = np.repeat(chunk, chunk_counts)
+        offset = np.arange(len(face)) - np.repeat(np.cumsum(chunk_counts) - chunk_counts, chunk_counts)
+        px = min_x[face] + offset % widths[face]
+        py = min_y[face] + offset // widths[face]
+        cx, cy = px + 0.5, py + 0.5
+
+        # Barycentric coordinates of the pixel centre
+        b0 = ((x1[face] - cx) * (y2[face] - cy) - (x2[face] - cx) * (y1[face] - cy)) / area[face]
+        b1 = ((x2[face] - cx) * (y0[face] - cy) - (x0[face] - cx) * (y2[face] - cy)) / area[face]
+        b2 = 1.0 - b0 - b1
+        inside = (b0 >= 0) & (b1 >= 0) & (b2 >= 0)
+        face, b0, b1, b2 = face[inside], b0[inside], b1[inside], b2[inside]
+        pixel = (py * size + px)[inside]
+        corners = faces[face]
+        depth = b0 * z[corners[:, 0]] + b1 * z[corners[:, 1]] + b2 * z[corners[:, 2]]
+
+        # Nearest sample per pixel in this chunk, then against what is already drawn
+        order = np.lexsort((-depth, pixel))
+        first = order[np.r_[True, pixel[order][1:] != pixel[order][:-1]]] if len(order) else order
+        nearer = first[depth[first] > depth_buffer[pixel[first]]]
+        depth_buffer[pixel[nearer]] = depth[nearer]
+        corners = corners[nearer]
+        color_buffer[pixel[nearer]] = (b0[nearer, None] * colors[corners[:, 0]] +
+                                       b1[nearer, None] * colors[corners[:, 1]] +
+                                       b2[nearer, None] * colors[corners[:, 2]])
+
+
+def write_thumbnails(mesh, output_dir, size=None, frames=None):
+    """Renders frames turntable images of the mesh into output_dir (frame 0
+    from the front) and returns their paths."""
+    size = size or config.THUMBNAIL_SIZE
+    frames = frames or config.THUMBNAIL_FRAMES
+    image_format = thumbnail_format()
+    paths = []
+    for frame in range(frames):
+        image = render(mesh, size, yaw=360.0 * frame / frames)
+        path = os.path.join(output_dir, thumbnail_file_name(frame, image_format))
+        with atomic_path(path) as tmp_path:
+            image.save(tmp_path, format=image_format.upper(), **({'quality': 80, 'method': 4} if image_format == 'webp' else {}))
+        paths.append(path)
+    return paths
+
+
+def thumbnail_lod(job_dir):
+    # The lightest level of detail there is, plenty for a few hundred pixels
+    for lod in ('low', 'medium', 'high'):
+        if os.path.exists(os.path.join(job_dir, lod_file_name(lod, "obj"))):
+            return lod
+    raise FileNotFoundError(f"No mesh in {job_dir}")
+
+
+def thumbnail_path(job_dir, frame, on_written=None):
+    """Path of a finished job's thumbnail frame, rendered first if the job
+    has none yet (it finished before thumbnails existed, or the settings
+    changed). on_written(path) is called for each new file."""
+    target = os.path.join(job_dir, thumbnail_file_name(frame))
+    if os.path.exists(target):
+        return target
+
+    # One lock per job, all frames are rendered together
+    with path_lock(job_dir):
+        if not os.path.exists(target):
+            for path in write_thumbnails(load_mesh(job_dir, thumbnail_lod(job_dir)), job_dir):
+                if on_written is not None:
+                    on_written(path)
+    return target
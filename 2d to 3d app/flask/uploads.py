@@ -0,0 +1,45 @@
+import io
+from flask import Request
+from PIL import Image, ImageOps
+
+import config
+
+
+class UploadRequest(Request):
+    """Keeps uploaded files in memory.
+
+    werkzeug spools anything over 500 KB to a temporary file, which means
+    every phone photo was written to disk once before we even read it.
+    Single uploads are capped by MAX_UPLOAD_BYTES, so a BytesIO is safe for
+    them; bigger requests (batch uploads) still go to a temporary file.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if total_content_length is not None and total_content_length <= config.MAX_UPLOAD_BYTES:
+            return io.BytesIO()
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+
+def decode_image(data, max_side=None):
+    """Decode an uploaded image once and shrink it to fit in max_side x max_side.
+
+    Raises ValueError when the data is not an image PIL can read.
+    """
+    try:
+        image = Image.open(io.BytesIO(data))
+        if max_side:
+            # JPEGs are decoded straight at 1/2, 1/4 or 1/8 scale when that is
+            # still larger than max_side, much cheaper than a full 12 MP decode
+            image.draft("RGB", (max_side, max_side))
+        # Phones store the orientation in EXIF instead of rotating the pixels
+        image = ImageOps.exif_transpose(image)
+        if max_side:
+            image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+        # Keep the alpha channel, TripoSR skips background removal for cut-out
+        # images. Inside the try: PIL decodes lazily, so a truncated file only
+        # fails here.
+        has_alpha = "A" in image.getbands() or "transparency" in image.info
+        return image.convert("RGBA" if has_alpha else "RGB")
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise ValueError("The uploaded file is not a valid image") from e
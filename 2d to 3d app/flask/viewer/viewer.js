@@ -0,0 +1,693 @@
+import * as THREE from 'three';
+import { OrbitControls } from 'three/addons/controls/OrbitControls.js';
+import { OBJLoader } from 'three/addons/loaders/OBJLoader.js';
+import { GLTFLoader } from 'three/addons/loaders/GLTFLoader.js';
+
+// Debug element
+const debugElement = document.getElementById('debug');
+const notificationElement = document.getElementById('notification');
+
+// Initialize Three.js scene
+const scene = new THREE.Scene();
+scene.background = new THREE.Color(0x111111);
+
+// Add ambient light
+const ambientLight = new THREE.AmbientLight(0xffffff, 0.5);
+scene.add(ambientLight);
+
+// Add directional lights
+const directionalLight = new THREE.DirectionalLight(0xffffff, 0.8);
+directionalLight.position.set(1, 1, 1);
+scene.add(directionalLight);
+
+const directionalLight2 = new THREE.DirectionalLight(0xffffff, 0.5);
+directionalLight2.position.set(-1, -1, -1);
+scene.add(directionalLight2);
+
+// Add point lights for better illumination
+const pointLight1 = new THREE.PointLight(0xffffff, 0.5);
+pointLight1.position.set(5, 5, 5);
+scene.add(pointLight1);
+
+const pointLight2 = new THREE.PointLight(0xffffff, 0.3);
+pointLight2.position.set(-5, -3, 2);
+scene.add(pointLight2);
+
+// Store all lights in an array for easy manipulation
+const lights = [ambientLight, directionalLight, directionalLight2, pointLight1, pointLight2];
+
+// Set up camera
+const camera = new THREE.PerspectiveCamera(75, window.innerWidth / window.innerHeight, 0.1, 1000);
+camera.position.z = 5;
+
+// Set up renderer
+const renderer = new THREE.WebGLRenderer({ antialias: true, preserveDrawingBuffer: true });
+renderer.setSize(window.innerWidth, window.innerHeight);
+renderer.setPixelRatio(window.devicePixelRatio);
+document.body.appendChild(renderer.domElement);
+
+// Add orbit controls for rotation and zoom
+const controls = new OrbitControls(camera, renderer.domElement);
+controls.enableDamping = true;
+controls.dampingFactor = 0.25;
+controls.enableZoom = true;
+
+// Variable to store the loaded model
+let model;
+let modelMeshes = [];
+
+// Add a grid helper for reference
+const gridHelper = new THREE.GridHelper(10, 10);
+scene.add(gridHelper);
+
+// Add axes helper
+const axesHelper = new THREE.AxesHelper(5);
+scene.add(axesHelper);
+
+// Per-page settings, rendered into the page by the server (this file is
+// the same for every job so browsers cache it)
+const viewerConfig = JSON.parse(document.getElementById('viewer-config').textContent);
+
+// Model file paths: the progressive mesh (every level of detail, coarsest
+// first) if there is one, then the compact binary GLB, OBJ as a fallback
+const progressiveFilePath = viewerConfig.progressive_url;
+const glbFilePath = viewerConfig.glb_url;
+const objFilePath = viewerConfig.obj_url;
+
+// Set while the job is still running
+const eventsUrl = viewerConfig.events_url;
+
+if (eventsUrl) {
+    followJob(eventsUrl);
+} else {
+    loadModel();
+}
+
+// Download a file, continuing with a Range request from the last byte
+// received when the connection drops instead of starting over. onChunk, if
+// given, gets the bytes as they arrive (and null when the download restarts).
+async function fetchResumable(url, onProgress, onChunk = null, maxRetries = 5) {
+    const chunks = [];
+    let received = 0;
+    let total = 0;
+    let etag = null;
+
+    for (let attempt = 0; ; attempt++) {
+        const headers = {};
+        if (received > 0) {
+            headers['Range'] = `bytes=${received}-`;
+            // Only an ETag of the uncompressed file matches the bytes we have
+            if (etag) {
+                headers['If-Range'] = etag;
+            }
+        }
+
+        let response;
+        try {
+            response = await fetch(url, { headers });
+        } catch (error) {
+            if (attempt >= maxRetries) throw error;
+            await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** attempt));
+            continue;
+        }
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status} for ${url}`);
+        }
+
+        if (response.status === 206) {
+            total = Number(response.headers.get('Content-Range').split('/')[1]);
+        } else {
+            // A full response (first request, or the file changed): start over
+            chunks.length = 0;
+            received = 0;
+            if (onChunk) onChunk(null);
+            total = response.headers.get('Content-Encoding') ? 0 : Number(response.headers.get('Content-Length') || 0);
+        }
+        etag = response.headers.get('Content-Encoding') ? null : response.headers.get('ETag');
+
+        try {
+            const reader = response.body.getReader();
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                chunks.push(value);
+                received += value.length;
+                onProgress({ loaded: received, total: total });
+                if (onChunk) onChunk(value);
+            }
+            break;
+        } catch (error) {
+            // Connection dropped mid-download: keep what we have
+            if (attempt >= maxRetries) throw error;
+            console.warn(`Download interrupted after ${received} bytes, resuming`, error);
+            await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** attempt));
+        }
+    }
+
+    const data = new Uint8Array(received);
+    let offset = 0;
+    for (const chunk of chunks) {
+        data.set(chunk, offset);
+        offset += chunk.length;
+    }
+    return data.buffer;
+}
+
+// Splits the progressive mesh into its GLB files as the bytes arrive. Each
+// GLB starts with a 12-byte header whose last uint32 is the file's length.
+function glbSplitter(onGlb) {
+    let chunks = [];
+    let buffered = 0;
+
+    // Copies the first count buffered bytes, removing them if consume is set
+    function read(count, consume) {
+        const out = new Uint8Array(count);
+        let offset = 0;
+        let index = 0;
+        while (offset < count) {
+            const chunk = chunks[index];
+            const n = Math.min(chunk.length, count - offset);
+            out.set(chunk.subarray(0, n), offset);
+            offset += n;
+            if (n === chunk.length) {
+                index++;
+            } else if (consume) {
+                chunks[index] = chunk.subarray(n);
+            }
+        }
+        if (consume) {
+            chunks = chunks.slice(index);
+            buffered -= count;
+        }
+        return out;
+    }
+
+    return function(chunk) {
+        if (chunk === null) {
+            chunks = [];
+            buffered = 0;
+            return;
+        }
+        chunks.push(chunk);
+        buffered += chunk.length;
+        while (buffered >= 12) {
+            const length = new DataView(read(12, false).buffer).getUint32(8, true);
+            if (buffered < length) break;
+            onGlb(read(length, true).buffer);
+        }
+    };
+}
+
+// Shows the coarsest level as soon as it has arrived and swaps in each finer
+// one, parsing every level while the next is still downloading
+async function loadProgressive() {
+    let levels = 0;
+    let parsing = Promise.resolve();
+    const split = glbSplitter(function(glb) {
+        const level = ++levels;
+        parsing = parsing.then(async () => {
+            const gltf = await new GLTFLoader().parseAsync(glb, '');
+            if (level === 1) {
+                onModelLoaded(gltf.scene);
+            } else {
+                replaceModel(gltf.scene);
+            }
+            console.log(`Showing level of detail ${level}`);
+        });
+    });
+
+    try {
+        await fetchResumable(progressiveFilePath, onLoadProgress, split);
+    } finally {
+        // Whatever arrived is shown even if the rest of the download failed
+        await parsing;
+    }
+    if (levels === 0) {
+        throw new Error('Progressive mesh is empty');
+    }
+}
+
+async function loadModel() {
+    if (progressiveFilePath) {
+        console.log(`Attempting to load model from: ${progressiveFilePath}`);
+        debugElement.textContent = `Attempting to load model from: ${progressiveFilePath}`;
+        try {
+            await loadProgressive();
+            return;
+        } catch (error) {
+            // A coarser level on screen is better than starting over
+            if (model) {
+                console.warn('Progressive mesh incomplete, keeping the level shown:', error);
+                return;
+            }
+            console.warn('Progressive mesh not available, falling back to GLB:', error);
+        }
+    }
+
+    console.log(`Attempting to load model from: ${glbFilePath}`);
+    debugElement.textContent = `Attempting to load model from: ${glbFilePath}`;
+
+    // Load GLB file
+    try {
+        const data = await fetchResumable(glbFilePath, onLoadProgress);
+        const gltf = await new GLTFLoader().parseAsync(data, '');
+        onModelLoaded(gltf.scene);
+        return;
+    } catch (error) {
+        // Load OBJ file
+        console.warn('GLB not available, falling back to OBJ:', error);
+        debugElement.textContent = `Attempting to load model from: ${objFilePath}`;
+    }
+
+    try {
+        const data = await fetchResumable(objFilePath, onLoadProgress);
+        onModelLoaded(new OBJLoader().parse(new TextDecoder().decode(data)));
+    } catch (error) {
+        onLoadError(error);
+    }
+}
+
+// Show the reconstruction progress pushed by the server, then load the model
+function followJob(url) {
+    const infoElement = document.getElementById('info');
+    const source = new EventSource(url);
+
+    source.addEventListener('stage', function(event) {
+        const job = JSON.parse(event.data);
+        infoElement.textContent = `Reconstructing: ${job.stage} (${Math.round(job.progress * 100)}%)`;
+        debugElement.textContent = Object.entries(job.stage_timings)
+            .map(([stage, seconds]) => `${stage}: ${seconds.toFixed(2)}s`)
+            .join(' | ');
+    });
+
+    source.addEventListener('done', function(event) {
+        source.close();
+        infoElement.textContent = 'Three.js OBJ Viewer';
+        loadModel();
+    });
+
+    // Failed, or finished so long ago that the outputs were cleaned up
+    for (const finalEvent of ['failed', 'expired']) {
+        source.addEventListener(finalEvent, function(event) {
+            source.close();
+            onLoadError(new Error(JSON.parse(event.data).error));
+        });
+    }
+
+    source.onerror = function() {
+        // The server forgot the job (e.g. restarted): try the mesh directly
+        if (source.readyState === EventSource.CLOSED) {
+            loadModel();
+        }
+    };
+}
+
+// Success callback
+function onModelLoaded(object) {
+    console.log('Model loaded successfully');
+    debugElement.textContent = 'Model loaded successfully';
+    model = object;
+
+    // Center the model
+    const box = new THREE.Box3().setFromObject(object);
+    const center = box.getCenter(new THREE.Vector3());
+    const size = box.getSize(new THREE.Vector3());
+
+    console.log('Model dimensions:', size);
+    console.log('Model center:', center);
+
+    // Set model position to center
+    object.position.x = -center.x;
+    object.position.y = -center.y;
+    object.position.z = -center.z;
+
+    // Add a default material if none exists and store meshes
+    object.traverse(function(child) {
+        if (child instanceof THREE.Mesh) {
+            modelMeshes.push(child);
+
+            if (!child.material) {
+                child.material = new THREE.MeshStandardMaterial({
+                    color: 0xcccccc,
+                    metalness: 0.1,
+                    roughness: 0.7,
+                });
+            }
+
+            // Store the original material for switching between view modes
+            child.userData.originalMaterial = child.material.clone();
+
+            console.log('Mesh found in model:', child);
+        }
+    });
+
+    // Add to scene
+    scene.add(object);
+
+    // Adjust camera position based on model size
+    const maxDim = Math.max(size.x, size.y, size.z);
+    camera.position.z = maxDim * 2;
+    camera.lookAt(0, 0, 0);
+
+    // Update controls
+    controls.update();
+
+    // Enable export buttons
+    document.querySelectorAll('.export-button, .dropdown-content a').forEach(button => {
+        button.classList.add('active');
+    });
+}
+
+// A finer level of detail takes the place of the one on screen, keeping
+// its position, scale and view mode
+function replaceModel(object) {
+    object.position.copy(model.position);
+    object.scale.copy(model.scale);
+
+    scene.remove(model);
+    model.traverse(function(child) {
+        if (child instanceof THREE.Mesh) {
+            child.geometry.dispose();
+        }
+    });
+
+    modelMeshes = [];
+    object.traverse(function(child) {
+        if (child instanceof THREE.Mesh) {
+            modelMeshes.push(child);
+            child.userData.originalMaterial = child.material.clone();
+        }
+    });
+    model = object;
+    scene.add(object);
+
+    if (document.getElementById('wireframeBtn').classList.contains('active')) {
+        setWireframeView();
+    } else if (document.getElementById('hybridBtn').classList.contains('active')) {
+        setHybridView();
+    } else {
+        setNormalView();
+    }
+    debugElement.textContent = 'Model loaded successfully';
+}
+
+// Progress callback
+function onLoadProgress(progress) {
+    // Compressed downloads have no known total
+    if (!progress.total) {
+        debugElement.textContent = `Loading: ${(progress.loaded / 1048576).toFixed(1)} MB`;
+        return;
+    }
+    const percentComplete = progress.loaded / progress.total * 100;
+    console.log(`Loading: ${Math.round(percentComplete)}%`);
+    debugElement.textContent = `Loading: ${Math.round(percentComplete)}%`;
+}
+
+// Error callback
+function onLoadError(error) {
+    console.error('Error loading model:', error);
+    debugElement.textContent = `Error loading model: ${error.message || 'Unknown error'}`;
+    document.getElementById('info').textContent = 'Error loading model';
+    document.getElementById('info').style.color = 'red';
+}
+
+// Handle window resize
+window.addEventListener('resize', function() {
+    camera.aspect = window.innerWidth / window.innerHeight;
+    camera.updateProjectionMatrix();
+    renderer.setSize(window.innerWidth, window.innerHeight);
+});
+
+// Handle scale control
+const scaleSlider = document.getElementById('scale');
+const scaleValue = document.getElementById('scaleValue');
+
+scaleSlider.addEventListener('input', function() {
+    const value = parseFloat(this.value);
+    scaleValue.textContent = value.toFixed(1);
+
+    if (model) {
+        model.scale.set(value, value, value);
+    }
+});
+
+// View mode control functions
+function setNormalView() {
+    if (!modelMeshes.length) return;
+
+    modelMeshes.forEach(mesh => {
+        mesh.material = mesh.userData.originalMaterial.clone();
+    });
+
+    // Update buttons
+    document.getElementById('normalBtn').classList.add('active');
+    document.getElementById('wireframeBtn').classList.remove('active');
+    document.getElementById('hybridBtn').classList.remove('active');
+}
+
+function setWireframeView() {
+    if (!modelMeshes.length) return;
+
+    modelMeshes.forEach(mesh => {
+        mesh.material = new THREE.MeshBasicMaterial({
+            color: 0x00ff00,
+            wireframe: true
+        });
+    });
+
+    // Update buttons
+    document.getElementById('normalBtn').classList.remove('active');
+    document.getElementById('wireframeBtn').classList.add('active');
+    document.getElementById('hybridBtn').classList.remove('active');
+}
+
+function setHybridView() {
+    if (!modelMeshes.length) return;
+
+    modelMeshes.forEach(mesh => {
+        // Clone the original material
+        const material = mesh.userData.originalMaterial.clone();
+
+        // Create a wireframe material
+        const wireframeMaterial = new THREE.MeshBasicMaterial({
+            color: 0x00ff00,
+            wireframe: true,
+            transparent: true,
+            opacity: 0.3
+        });
+
+        // Create a multi-material
+        mesh.material = [material, wireframeMaterial];
+    });
+
+    // Update buttons
+    document.getElementById('normalBtn').classList.remove('active');
+    document.getElementById('wireframeBtn').classList.remove('active');
+    document.getElementById('hybridBtn').classList.add('active');
+}
+
+// Add event listeners for view mode buttons
+document.getElementById('normalBtn').addEventListener('click', setNormalView);
+document.getElementById('wireframeBtn').addEventListener('click', setWireframeView);
+document.getElementById('hybridBtn').addEventListener('click', setHybridView);
+
+// Lighting control
+const lightingBtn = document.getElementById('lightingBtn');
+const lightIntensity = document.getElementById('lightIntensity');
+const lightValue = document.getElementById('lightValue');
+
+// Toggle lighting on/off
+lightingBtn.addEventListener('click', function() {
+    const isActive = this.classList.contains('active');
+
+    if (isActive) {
+        // Turn off lights
+        lights.forEach(light => {
+            light.intensity = 0;
+        });
+        this.classList.remove('active');
+    } else {
+        // Turn on lights
+        const intensity = parseFloat(lightIntensity.value);
+        updateLightIntensity(intensity);
+        this.classList.add('active');
+    }
+});
+
+// Update light intensity
+function updateLightIntensity(value) {
+    lightValue.textContent = value.toFixed(1);
+
+    if (lightingBtn.classList.contains('active')) {
+        ambientLight.intensity = value * 0.5;
+        directionalLight.intensity = value * 0.8;
+        directionalLight2.intensity = value * 0.5;
+        pointLight1.intensity = value * 0.5;
+        pointLight2.intensity = value * 0.3;
+    }
+}
+
+lightIntensity.addEventListener('input', function() {
+    const value = parseFloat(this.value);
+    updateLightIntensity(value);
+});
+
+// Reset button
+document.getElementById('resetBtn').addEventListener('click', function() {
+    if (model) {
+        model.scale.set(1, 1, 1);
+        scaleSlider.value = 1;
+        scaleValue.textContent = "1.0";
+
+        // Reset lighting
+        lightIntensity.value = 1;
+        updateLightIntensity(1);
+        lightingBtn.classList.add('active');
+
+        // Reset to normal view
+        setNormalView();
+
+        // Reset camera and controls
+        controls.reset();
+    }
+});
+
+// Fullscreen handling
+const fullscreenBtn = document.getElementById('fullscreenBtn');
+const fullscreenIcon = document.getElementById('fullscreenIcon');
+
+fullscreenBtn.addEventListener('click', toggleFullScreen);
+
+function toggleFullScreen() {
+    if (!document.fullscreenElement) {
+        document.documentElement.requestFullscreen().catch(err => {
+            console.error(`Error attempting to enable full-screen mode: ${err.message}`);
+        });
+        fullscreenIcon.textContent = '⛶';
+    } else {
+        if (document.exitFullscreen) {
+            document.exitFullscreen();
+            fullscreenIcon.textContent = '⛶';
+        }
+    }
+}
+
+// Handle fullscreen change
+document.addEventListener('fullscreenchange', function() {
+    if (document.fullscreenElement) {
+        fullscreenIcon.textContent = '✕';
+    } else {
+        fullscreenIcon.textContent = '⛶';
+    }
+});
+
+// Show notification
+function showNotification(message, type = 'success') {
+    const notification = document.getElementById('notification');
+    notification.textContent = message;
+    notification.className = `notification ${type}`;
+    notification.style.display = 'block';
+
+    setTimeout(() => {
+        notification.style.display = 'none';
+    }, 3000);
+}
+
+// Exports are converted on the server (once per job and format), so
+// the phone only downloads the file
+function downloadExport(format, fileName) {
+    if (!model) {
+        showNotification('No model loaded to export', 'error');
+        return;
+    }
+
+    const url = new URL(objFilePath, window.location.href);
+    url.searchParams.set('format', format);
+    const link = document.createElement('a');
+    link.href = url.toString();
+    link.download = fileName;
+    link.click();
+    showNotification(`Downloading ${format.toUpperCase()} file`);
+}
+
+// Export functions
+function exportOBJ() {
+    downloadExport('obj', 'model.obj');
+}
+
+function exportSTL() {
+    downloadExport('stl', 'model.stl');
+}
+
+function exportGLTF() {
+    downloadExport('glb', 'model.glb');
+}
+
+function exportPLY() {
+    downloadExport('ply', 'model.ply');
+}
+
+function exportScreenshot() {
+    try {
+        // Temporarily hide UI elements
+        const infoElement = document.getElementById('info');
+        const debugElement = document.getElementById('debug');
+        const controlsElement = document.getElementById('controls');
+        const fullscreenBtn = document.getElementById('fullscreenBtn');
+
+        infoElement.style.display = 'none';
+        debugElement.style.display = 'none';
+        controlsElement.style.display = 'none';
+        fullscreenBtn.style.display = 'none';
+
+        // Render the scene
+        renderer.render(scene, camera);
+
+        // Create a screenshot
+        const dataURL = renderer.domElement.toDataURL('image/png');
+
+        // Create a link and trigger download
+        const link = document.createElement('a');
+        link.href = dataURL;
+        link.download = 'screenshot.png';
+        link.click();
+
+        // Show elements again
+        infoElement.style.display = 'block';
+        debugElement.style.display = 'block';
+        controlsElement.style.display = 'block';
+        fullscreenBtn.style.display = 'block';
+
+        showNotification('Screenshot exported successfully');
+    } catch (error) {
+        console.error('Error exporting screenshot:', error);
+        showNotification('Error exporting screenshot: ' + error.message, 'error');
+    }
+}
+
+// Attach export event listeners
+document.getElementById('exportOBJ').addEventListener('click', exportOBJ);
+document.getElementById('exportSTL').addEventListener('click', exportSTL);
+document.getElementById('exportGLTF').addEventListener('click', exportGLTF);
+document.getElementById('exportPLY').addEventListener('click', exportPLY);
+document.getElementById('exportScreenshot').addEventListener('click', exportScreenshot);
+
+// Animation loop
+function animate() {
+    requestAnimationFrame(animate);
+    controls.update();
+    renderer.render(scene, camera);
+}
+
+animate();
+
+// Auto-detect if coming from Flutter by checking for a specific URL parameter
+window.addEventListener('load', function() {
+    const params = new URLSearchParams(window.location.search);
+    if (params.get('fromFlutter') === 'true') {
+        // If coming from Flutter, automatically go fullscreen after a short delay
+        setTimeout(() => {
+            toggleFullScreen();
+        }, 1000);
+    }
+});
@@ -0,0 +1,116 @@
+"""Model weights shared by every server process, and what each process uses.
+
+The weights are memory-mapped read-only from a file instead of being read
+into each process. The kernel keeps one copy in the page cache for all the
+processes mapping it, so running N server processes (SERVER_PROCESSES,
+gunicorn workers) costs one copy of the weights plus N times the working
+memory, not N copies.
+
+    python weights.py PID [PID ...]
+
+prints the memory of the given processes and their children, e.g. the
+gunicorn arbiter's PID for every worker.
+"""
+import os
+import sys
+import numpy as np
+
+import config
+from file_locks import atomic_path
+
+SMAPS_ROLLUP = "/proc/{pid}/smaps_rollup"
+
+
+def shared_array(name, build, weights_dir=None):
+    """NumPy array mapped read-only from WEIGHTS_DIR/<name>.npy. build() makes
+    the array the first time, later calls and other processes map the file."""
+    weights_dir = weights_dir or config.WEIGHTS_DIR
+    path = os.path.join(weights_dir, f"{name}.npy")
+    if not os.path.exists(path):
+        os.makedirs(weights_dir, exist_ok=True)
+        # A process starting at the same time never maps half a file
+        with atomic_path(path) as tmp_path:
+            with open(tmp_path, "wb") as f:
+                np.save(f, build())
+    return np.load(path, mmap_mode="r")
+
+
+def load_checkpoint(torch, path):
+    """State dict whose tensors point into the checkpoint file itself.
+
+    load_state_dict(..., assign=True) then uses these tensors as the model's
+    parameters. Needs torch 2.1 or newer (TypeError otherwise) and a
+    checkpoint saved in torch's zip format, the default since torch 1.6
+    (RuntimeError for the legacy format).
+    """
+    return torch.load(path, map_location="cpu", mmap=True)
+
+
+def memory_usage(pid="self"):
+    """Resident memory of a process in bytes: 'uss' is only in this process
+    (what stopping it frees), 'shared' is mapped by other processes too (the
+    weights), 'pss' counts shared pages divided by the number of processes
+    using them, so the pss of all processes adds up to what they use together.
+
+    None where /proc/<pid>/smaps_rollup is missing (Windows, macOS, Linux
+    before 4.14) or the process is gone.
+    """
+    try:
+        with open(SMAPS_ROLLUP.format(pid=pid)) as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+
+    fields = {}
+    for line in lines:
+        parts = line.split()
+        if len(parts) == 3 and parts[2] == "kB":
+            fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'uss': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+        'shared': fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0)
+    }
+
+
+def child_pids(pid):
+    # Processes whose parent is pid, from /proc/<child>/stat
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The name in brackets can contain spaces, the parent PID is
+                # the second field after it
+                parent = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if parent == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def main():
+    pids = [int(pid) for pid in sys.argv[1:]]
+    if not pids:
+        print(__doc__.strip())
+        sys.exit(2)
+
+    print(f"{'PID':>8} {'RSS MB':>10} {'USS MB':>10} {'PSS MB':>10} {'Shared MB':>10}")
+    total_uss = total_pss = 0
+    for pid in [p for parent in pids for p in [parent] + child_pids(parent)]:
+        usage = memory_usage(pid)
+        if usage is None:
+            print(f"{pid:>8} no memory information")
+            continue
+        total_uss += usage['uss']
+        total_pss += usage['pss']
+        print(f"{pid:>8} " + " ".join(f"{usage[key] / 1024 ** 2:>10.1f}" for key in ('rss', 'uss', 'pss', 'shared')))
+    # The sum of PSS is the real memory of the whole group
+    print(f"{'total':>8} {'':>10} {total_uss / 1024 ** 2:>10.1f} {total_pss / 1024 ** 2:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
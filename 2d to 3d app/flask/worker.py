@@ -0,0 +1,265 @@
+import os
+import math
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+import config
+from metrics import Histogram
+from weights import memory_usage
+
+
+class WorkerPool:
+    """Fixed number of reconstruction threads behind one bounded admission queue.
+
+    The model is loaded once, before any worker starts, and shared by all of
+    them. When the queue is full submit() raises queue.Full so the server can
+    answer 429 instead of letting work (and memory) pile up.
+
+    Each worker takes up to max_batch_size queued jobs at a time, waiting at
+    most max_batch_wait_ms for more to arrive, and runs them through one
+    forward pass.
+    """
+
+    def __init__(self, reconstructor, workers=config.WORKER_COUNT, queue_size=config.QUEUE_SIZE,
+                 max_batch_size=config.MAX_BATCH_SIZE, max_batch_wait_ms=config.MAX_BATCH_WAIT_MS):
+        self.reconstructor = reconstructor
+        self.worker_count = workers
+        self.max_batch_size = min(max_batch_size, reconstructor.max_batch_size or max_batch_size)
+        self.max_batch_wait = max_batch_wait_ms / 1000.0
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.ready = threading.Event()
+        self.load_error = None
+        self.threads = []
+        self.lock = threading.Lock()
+
+        # Jobs submitted but not finished yet, shutdown() waits for them
+        self.pending = 0
+        self.idle = threading.Condition(self.lock)
+        self.closing = False
+
+        # Cold start (model load) vs. per-job timings
+        self.cold_start_seconds = None
+        self.busy = 0
+        self.jobs_completed = 0
+        self.jobs_failed = 0
+        # Timed per batch, not per job: its jobs all finish when it does
+        self.batches_completed = 0
+        self.total_batch_seconds = 0.0
+        self.last_batch_seconds = None
+        # Moving average of the batch time by the largest mc_resolution in
+        # the batch, for estimate_latency()
+        self.service_seconds = {}
+
+        # For tuning the batch window
+        self.batch_sizes = Histogram(buckets=range(1, max(self.max_batch_size, 1) + 1))
+        self.batch_latency = Histogram()
+
+    def start(self):
+        threading.Thread(target=self.load, name="reconstruction-loader", daemon=True).start()
+
+    def load(self):
+        print(f"Loading reconstruction model: {self.reconstructor.name}")
+        start = time.perf_counter()
+        try:
+            self.reconstructor.load()
+        except Exception as e:
+            print(f"Failed to load reconstruction model: {e}")
+            self.load_error = e
+            self.ready.set()
+            return
+        self.cold_start_seconds = time.perf_counter() - start
+        print(f"Model loaded in {self.cold_start_seconds:.2f}s, starting {self.worker_count} workers")
+
+        for i in range(self.worker_count):
+            thread = threading.Thread(target=self.run, name=f"reconstruction-worker-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        self.ready.set()
+
+    def next_batch(self):
+        # Block for the first job, then keep collecting until the batch is
+        # full or the batch window has passed
+        item = self.jobs.get()
+        if item is None:
+            return None
+        batch = [item]
+        deadline = time.perf_counter() + self.max_batch_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self.jobs.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Stop request: finish this batch, then exit
+                self.jobs.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            if batch is None:
+                break
+            collected = len(batch)
+            batch = [item for item in batch if item[0].set_running_or_notify_cancel()]
+            try:
+                if batch:
+                    self.run_batch(batch)
+            except Exception as e:
+                # The worker outlives a failed batch: its jobs fail, the next batch runs
+                print(f"Reconstruction batch failed: {e}")
+                unresolved = [future for future, _, _ in batch if not future.done()]
+                with self.lock:
+                    self.jobs_failed += len(unresolved)
+                for future in unresolved:
+                    future.set_exception(e)
+            finally:
+                self.job_finished(collected)
+
+    def run_batch(self, batch):
+        with self.lock:
+            self.busy += 1
+        start = time.perf_counter()
+        try:
+            results = self.reconstructor.reconstruct_batch([args for _, args, _ in batch])
+        finally:
+            batch_seconds = time.perf_counter() - start
+            with self.lock:
+                self.busy -= 1
+        self.batch_sizes.observe(len(batch))
+        self.batch_latency.observe(batch_seconds)
+
+        with self.lock:
+            resolutions = [args[2] for (_, args, _), result in zip(batch, results) if not isinstance(result, Exception)]
+            self.jobs_completed += len(resolutions)
+            self.jobs_failed += len(batch) - len(resolutions)
+            if resolutions:
+                # One sample per batch, the slowest resolution sets its time
+                self.batches_completed += 1
+                self.total_batch_seconds += batch_seconds
+                self.last_batch_seconds = batch_seconds
+                mc_resolution = max(resolutions)
+                previous = self.service_seconds.get(mc_resolution, batch_seconds)
+                self.service_seconds[mc_resolution] = 0.8 * previous + 0.2 * batch_seconds
+
+        for (future, _, queued_at), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+                continue
+            result['timings']['queue_wait'] = start - queued_at
+            result['timings']['job'] = batch_seconds
+            future.set_result(result)
+
+    def job_finished(self, count):
+        with self.lock:
+            self.pending -= count
+            self.idle.notify_all()
+
+    # Raises queue.Full when the admission queue is already full
+    def submit(self, image, output_dir, mc_resolution, progress=None, chunk_size=None):
+        if self.load_error is not None:
+            raise RuntimeError(f"Reconstruction model failed to load: {self.load_error}")
+
+        future = Future()
+        with self.lock:
+            # Shutting down counts as full, the client retries against the next server
+            if self.closing:
+                raise queue.Full
+            self.jobs.put_nowait((future, (image, output_dir, mc_resolution, chunk_size, progress), time.perf_counter()))
+            self.pending += 1
+        return future
+
+    def retry_after(self):
+        # Seconds until a queue slot is likely to free up, for the Retry-After
+        # header: with every worker busy, a batch finishes every avg / workers seconds
+        with self.lock:
+            if not self.batches_completed:
+                return 5
+            avg_batch_seconds = self.total_batch_seconds / self.batches_completed
+        return max(1, math.ceil(avg_batch_seconds / self.worker_count))
+
+    def estimate_latency(self, mc_resolution):
+        """Seconds a job submitted now at mc_resolution is expected to take,
+        queue wait included, or None until some job has finished."""
+        with self.lock:
+            if not self.service_seconds:
+                return None
+            avg_batch_seconds = self.total_batch_seconds / self.batches_completed
+            # Every worker takes up to max_batch_size jobs per round, and a
+            # round takes one batch time
+            rounds_ahead = math.ceil(self.pending / (self.worker_count * self.max_batch_size))
+            service = self.service_seconds.get(mc_resolution)
+            if service is None:
+                # Not run at this resolution yet: scale the nearest one by the
+                # number of faces, which grows with the square of the resolution
+                known = min(self.service_seconds, key=lambda resolution: abs(resolution - mc_resolution))
+                service = self.service_seconds[known] * (mc_resolution / known) ** 2
+        return rounds_ahead * avg_batch_seconds + service
+
+    def stop(self):
+        # Jobs still queued fail straight away, then every worker gets a stop
+        # marker. Nothing here blocks, so a full queue can't hold up a shutdown.
+        while True:
+            try:
+                item = self.jobs.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                continue
+            future = item[0]
+            if future.set_running_or_notify_cancel():
+                future.set_exception(RuntimeError("Server shut down before the job started"))
+            self.job_finished(1)
+        for _ in self.threads:
+            try:
+                self.jobs.put_nowait(None)
+            except queue.Full:
+                # Only with a queue smaller than the worker count; the
+                # threads are daemons and end with the process
+                break
+
+    def shutdown(self, timeout=None):
+        # Graceful stop: refuse new jobs, let queued and running ones finish,
+        # then stop the workers. Returns False if jobs were still left after
+        # timeout: the queued ones have failed, running ones are abandoned.
+        with self.lock:
+            self.closing = True
+            drained = self.idle.wait_for(lambda: self.pending == 0, timeout)
+        self.stop()
+        return drained
+
+    def stats(self):
+        with self.lock:
+            return {
+                'model': self.reconstructor.name,
+                'ready': self.ready.is_set() and self.load_error is None,
+                'closing': self.closing,
+                'cold_start_seconds': self.cold_start_seconds,
+                'workers': self.worker_count,
+                'busy': self.busy,
+                'utilisation': self.busy / self.worker_count,
+                'queued': self.jobs.qsize(),
+                'queue_size': self.jobs.maxsize,
+                'jobs_completed': self.jobs_completed,
+                'jobs_failed': self.jobs_failed,
+                'batches_completed': self.batches_completed,
+                'last_batch_seconds': self.last_batch_seconds,
+                'avg_batch_seconds': self.total_batch_seconds / self.batches_completed if self.batches_completed else None,
+                'batch_seconds_by_resolution': {str(resolution): seconds for resolution, seconds in self.service_seconds.items()},
+                # This process only: with several server processes each one answers for itself
+                'pid': os.getpid(),
+                'shared_weights': self.reconstructor.weights_shared,
+                'memory': memory_usage(),
+                'batching': {
+                    'max_batch_size': self.max_batch_size,
+                    'max_batch_wait_ms': self.max_batch_wait * 1000,
+                    'batch_size': self.batch_sizes.snapshot(),
+                    'batch_seconds': self.batch_latency.snapshot()
+                }
+            }
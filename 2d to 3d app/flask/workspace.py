@@ -0,0 +1,89 @@
+import os
+import re
+import time
+import shutil
+import threading
+
+import config
+
+# Job IDs are uuid4 hex strings, anything else is rejected before it gets near a path
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+def is_valid_job_id(job_id):
+    return bool(job_id) and JOB_ID_PATTERN.match(job_id) is not None
+
+
+class Workspaces:
+    """Job-scoped directories.
+
+    A job writes its input and outputs into staging/<job_id> and the directory
+    is moved to output/<job_id> in one os.replace() once the job succeeds, so
+    readers never see a half-written mesh and concurrent jobs never share files.
+    Finished jobs are looked up and cleaned up through the job registry.
+    """
+
+    def __init__(self, registry, output_dir=config.OUTPUT_DIR, staging_dir=config.STAGING_DIR):
+        self.registry = registry
+        self.output_dir = output_dir
+        self.staging_dir = staging_dir
+        os.makedirs(self.output_dir, exist_ok=True)
+        os.makedirs(self.staging_dir, exist_ok=True)
+
+    def create(self, job_id):
+        path = os.path.join(self.staging_dir, job_id)
+        os.makedirs(path)
+        return path
+
+    def commit(self, job_id):
+        final_path = self.job_dir(job_id)
+        os.replace(os.path.join(self.staging_dir, job_id), final_path)
+        return final_path
+
+    def discard(self, job_id):
+        shutil.rmtree(os.path.join(self.staging_dir, job_id), ignore_errors=True)
+
+    def job_dir(self, job_id):
+        if not is_valid_job_id(job_id):
+            raise ValueError(f"Invalid job ID: {job_id}")
+        return os.path.join(self.output_dir, job_id)
+
+    def mesh_path(self, job_id, file_name="mesh.obj"):
+        return os.path.join(self.job_dir(job_id), file_name)
+
+    def cleanup(self, max_age_seconds=config.WORKSPACE_MAX_AGE_SECONDS, max_total_bytes=config.WORKSPACE_MAX_BYTES,
+                on_removed=None):
+        # on_removed(job_id) is called for every finished job that is deleted
+        now = time.time()
+
+        # Staging directories left behind by crashed jobs
+        for entry in os.scandir(self.staging_dir):
+            if entry.is_dir() and now - entry.stat().st_mtime > max_age_seconds:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+        # Finished jobs: expired ones, then more, oldest first, until the total
+        # size fits the budget
+        expired = self.registry.expired(max_age_seconds, max_total_bytes, now)
+        for job_id in expired:
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+        self.registry.remove(expired)
+        if on_removed is not None:
+            for job_id in expired:
+                on_removed(job_id)
+
+        if expired:
+            print(f"Workspace cleanup removed {len(expired)} old jobs")
+        return len(expired)
+
+    def start_cleanup_thread(self, interval_seconds=config.CLEANUP_INTERVAL_SECONDS, on_removed=None):
+        def run():
+            while True:
+                try:
+                    self.cleanup(on_removed=on_removed)
+                except Exception as e:
+                    print(f"Workspace cleanup failed: {e}")
+                time.sleep(interval_seconds)
+
+        thread = threading.Thread(target=run, name="workspace-cleanup", daemon=True)
+        thread.start()
+        return thread
@@ -81,13 +81,17 @@ class _MyHomePageState extends State<MyHomePage> {
   String _resultText = '';
   List<String> _outputFiles = [];
   bool _hasProcessedImage = false;
+  String? _jobId;
 
   // Update these with your actual server domain/IP
   final String serverHost = '192.168.225.144:5000'.trim();
 
   // Construct URLs without spaces
-  String get serverUrl => 'https://$serverHost/process_image';
-  String get viewerUrl => 'https://$serverHost/Tviewer';
+  String get serverUrl => 'https://$serverHost/jobs';
+  String get viewerUrl =>
+      _jobId == null
+          ? 'https://$serverHost/Tviewer'
+          : 'https://$serverHost/Tviewer?job=$_jobId';
 
   Future<void> _getImage(ImageSource source) async {
     final ImagePicker picker = ImagePicker();
@@ -102,6 +106,7 @@ class _MyHomePageState extends State<MyHomePage> {
         _resultText = '';
         _outputFiles = [];
         _hasProcessedImage = false;
+        _jobId = null;
       });
     }
   }
@@ -119,20 +124,25 @@ class _MyHomePageState extends State<MyHomePage> {
       _resultText = 'Processing...';
     });
 
-    // Create multipart request
-    final request = http.MultipartRequest('POST', Uri.parse(serverUrl));
-
-    // Add file to request
-    request.files.add(await http.MultipartFile.fromPath('image', _image!.path));
-
     try {
-      final response = await request.send();
+      // The server answers straight away with a job ID
+      final response = await _submitJob();
       final responseBody = await response.stream.bytesToString();
 
-      if (response.statusCode == 200) {
-        final jsonResponse = json.decode(responseBody);
+      if (response.statusCode != 202) {
+        setState(() {
+          _resultText = 'Error: $responseBody';
+          _isProcessing = false;
+        });
+        return;
+      }
+
+      final String jobId = json.decode(responseBody)['job_id'];
+      final jsonResponse = await _waitForJob(jobId);
 
+      if (jsonResponse['status'] == 'done') {
         setState(() {
+          _jobId = jobId;
           _resultText = 'Processing complete!';
 
           if (jsonResponse['output_files'] != null) {
@@ -141,16 +151,17 @@ class _MyHomePageState extends State<MyHomePage> {
             _hasProcessedImage = true;
           }
 
-          if (jsonResponse['message'] != null &&
-              jsonResponse['message'].toString().isNotEmpty) {
-            _resultText += '\n\nOutput message: ${jsonResponse['message']}';
+          if (jsonResponse['faces'] != null) {
+            _resultText +=
+                '\n\nMesh: ${jsonResponse['vertices']} vertices, '
+                '${jsonResponse['faces']} faces';
           }
 
           _isProcessing = false;
         });
       } else {
         setState(() {
-          _resultText = 'Error: $responseBody';
+          _resultText = 'Error: ${jsonResponse['error']}';
           _isProcessing = false;
         });
       }
@@ -162,6 +173,128 @@ class _MyHomePageState extends State<MyHomePage> {
     }
   }
 
+  // Upload the image as a new job. When the server is busy it answers 429
+  // with a Retry-After header, wait that long and try again a few times.
+  Future<http.StreamedResponse> _submitJob() async {
+    for (int attempt = 1; ; attempt++) {
+      // Create multipart request
+      final request = http.MultipartRequest('POST', Uri.parse(serverUrl));
+
+      // Add file to request
+      request.files.add(
+        await http.MultipartFile.fromPath('image', _image!.path),
+      );
+
+      final response = await request.send();
+      if (response.statusCode != 429 || attempt == 5) {
+        return response;
+      }
+
+      await response.stream.drain();
+      final int wait =
+          int.tryParse(response.headers['retry-after'] ?? '') ?? 5;
+      if (mounted) {
+        setState(() {
+          _resultText = 'Server busy, retrying in $wait s...';
+        });
+      }
+      await Future.delayed(Duration(seconds: wait));
+    }
+  }
+
+  // Wait until the reconstruction is done or has failed. The server pushes
+  // every stage change over Server-Sent Events; polling is the fallback when
+  // the event stream can't be used (e.g. a proxy buffering the response).
+  Future<Map<String, dynamic>> _waitForJob(String jobId) async {
+    try {
+      final status = await _streamJob(jobId);
+      if (status != null) {
+        return status;
+      }
+    } catch (e) {
+      print('Event stream failed, polling instead: $e');
+    }
+    return _pollJob(jobId);
+  }
+
+  Future<Map<String, dynamic>?> _streamJob(String jobId) async {
+    final request = http.Request(
+      'GET',
+      Uri.parse('https://$serverHost/jobs/$jobId/events'),
+    );
+    request.headers['Accept'] = 'text/event-stream';
+
+    final client = http.Client();
+    try {
+      final response = await client.send(request);
+      if (response.statusCode != 200) {
+        throw Exception('Event stream failed: ${response.statusCode}');
+      }
+
+      // An event is a few "field: value" lines followed by an empty line
+      String data = '';
+      await for (final line in response.stream
+          .transform(utf8.decoder)
+          .transform(const LineSplitter())) {
+        if (line.startsWith('data:')) {
+          data += line.substring(5).trim();
+          continue;
+        }
+        if (line.isNotEmpty || data.isEmpty) {
+          continue;
+        }
+
+        final Map<String, dynamic> status = json.decode(data);
+        data = '';
+        if (const ['done', 'failed', 'expired'].contains(status['status'])) {
+          return status;
+        }
+        _showProgress(status);
+      }
+
+      // Stream ended before the job finished
+      return null;
+    } finally {
+      client.close();
+    }
+  }
+
+  // Poll the job status until the reconstruction is done or has failed
+  Future<Map<String, dynamic>> _pollJob(String jobId) async {
+    final statusUrl = Uri.parse('https://$serverHost/jobs/$jobId');
+
+    while (true) {
+      final response = await http.get(statusUrl);
+      if (response.statusCode != 200) {
+        throw Exception('Status check failed: ${response.body}');
+      }
+
+      final Map<String, dynamic> status = json.decode(response.body);
+      if (const ['done', 'failed', 'expired'].contains(status['status'])) {
+        return status;
+      }
+      _showProgress(status);
+
+      await Future.delayed(const Duration(seconds: 2));
+    }
+  }
+
+  // Current stage plus the time taken by each finished stage
+  void _showProgress(Map<String, dynamic> status) {
+    if (!mounted) {
+      return;
+    }
+
+    final int percent = ((status['progress'] as num) * 100).round();
+    final Map<String, dynamic> timings = status['stage_timings'] ?? {};
+    setState(() {
+      _resultText = 'Processing... ${status['stage']} ($percent%)';
+      timings.forEach((stage, seconds) {
+        _resultText += '\n$stage: ${(seconds as num).toStringAsFixed(1)}s';
+      });
+    });
+  }
+
   Future<bool> _checkServerConnectivity() async {
     try {
       print("Checking connectivity to: $viewerUrl");
@@ -184,7 +317,7 @@ class _MyHomePageState extends State<MyHomePage> {
 
   // Method to open external browser for 3D viewer in full screen
   Future<void> _openExternalBrowser() async {
-    final Uri url = Uri.parse('https://$serverHost/Tviewer');
+    final Uri url = Uri.parse(viewerUrl);
     print('Attempting to launch URL: $url');
 
     try {